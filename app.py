@@ -8,23 +8,163 @@ Objetivo:
 - Prever a probabilidade de um cliente realizar churn (abandono).
 - Facilitar integrações com sistemas e plataformas empresariais.
 
+Rotas:
+- POST /predict/       -> previsão para um único cliente.
+- POST /predict/batch  -> previsão vetorizada para um lote de clientes
+                          (lista de registros ou JSON colunar).
+- POST /predict/raw    -> previsão em lote a partir dos campos brutos da sessão; as
+                          features são calculadas pela mesma transformação do treino.
+- GET  /predict/stats  -> métricas do micro-batching e do cache de previsões (quando habilitados).
+- GET  /health/live    -> processo no ar (liveness).
+- GET  /health/ready   -> 200 apenas com o modelo carregado e aquecido (readiness).
+- GET  /admin/memory   -> memória (RSS) deste worker e dos demais workers.
+- GET  /admin/model    -> versão do modelo em produção, metadados do registro e trocas.
+- GET  /visitors/{id}  -> atributos agregados do visitante (recência, frequência, sessões
+                          por janela, receita acumulada), ver visitor_features.py.
+- GET  /metrics        -> métricas no formato Prometheus (ver metrics.py).
+- POST /admin/profiler/start, /admin/profiler/stop, GET /admin/profiler[/collapsed]
+                       -> profiler por amostragem, ligado sob demanda.
+
+Probabilidade e limiar de decisão:
+- As rotas de previsão devolvem a probabilidade de churn junto com a classe. A classe
+  vem da probabilidade comparada ao limiar (`?threshold=0.3` por requisição; padrão
+  CHURN_THRESHOLD, 0.5), então reclassificar os mesmos clientes em outro limiar não
+  exige uma nova inferência: basta comparar as probabilidades já devolvidas.
+
+Carregamento do modelo (CHURN_MODEL_LOADING):
+- 'background' (padrão): inicia em segundo plano na subida do servidor.
+- 'lazy': carrega na primeira requisição.
+- 'eager': carrega na importação do módulo (comportamento anterior).
+
+Registro de modelos (CHURN_MODEL_REGISTRY, padrão 'models/registry'):
+- A API serve a versão apontada por LATEST e verifica o ponteiro a cada
+  CHURN_MODEL_WATCH_INTERVAL segundos (padrão 10; 0 desativa). Uma nova versão é carregada
+  e aquecida em segundo plano e trocada sem reiniciar o worker.
+
+Atributos por visitante (CHURN_VISITOR_INDEX, padrão 'data/visitor_state'):
+- Índice compacto em disco (ids ordenados + colunas .npy mapeadas em memória), consultado
+  por busca binária; um novo snapshot gerado por visitor_features.py é aberto na próxima
+  consulta, sem reiniciar o worker.
+
+Métricas e profiler (CHURN_METRICS, padrão 1):
+- Cada rota de previsão mede as etapas validação, features, modelo, espera do
+  micro-batching e resposta, além de contagens de requisições, linhas e classes.
+- O profiler por amostragem fica desligado até `POST /admin/profiler/start`
+  (ou CHURN_PROFILER=1 na subida); desligado, não custa nada.
+
+Vários workers (CHURN_SHARED_MODEL_DIR, ex.: /dev/shm/churn-model):
+- Os arrays do modelo são gravados uma vez nesse diretório e abertos somente leitura,
+  mapeados em memória, por todos os workers.
+
+Micro-batching (opcional):
+- Com CHURN_MICROBATCH=1, requisições concorrentes de /predict/ são agrupadas por até
+  CHURN_MICROBATCH_MAX_WAIT_MS milissegundos ou CHURN_MICROBATCH_MAX_SIZE linhas
+  e pontuadas com uma única chamada ao modelo.
+
+Cache de previsões (opcional, ver prediction_cache.py):
+- Com CHURN_PREDICTION_CACHE=1, /predict/ guarda a probabilidade de cada vetor de
+  features (arredondado a CHURN_PREDICTION_CACHE_DECIMALS casas, padrão 4) por até
+  CHURN_PREDICTION_CACHE_TTL_S segundos (padrão 3600; 0 sem validade), em no máximo
+  CHURN_PREDICTION_CACHE_SIZE entradas (padrão 10000). Trocar o modelo esvazia o cache.
+
 Impacto:
 - Permite que empresas identifiquem clientes em risco de abandono.
 - Ajuda a direcionar estratégias de retenção e campanhas de marketing personalizadas.
+- Jobs noturnos de retenção pontuam milhões de sessões com uma única chamada
+  ao modelo por lote, sem o custo de HTTP/pydantic/DataFrame por linha.
 """
 
 
 
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
-import pandas as pd
+import os
+import warnings
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+import numpy as np
+from pydantic import BaseModel, Field, create_model
+
+from feature_transform import RAW_FIELDS
+from inference import DEFAULT_THRESHOLD, FEATURES, RowBuilder, apply_threshold, churn_probability, inference_dtype
+from metrics import METRICS, MetricsMiddleware, SamplingProfiler, record_predictions, span
+from microbatch import MicroBatcher
+from model_loader import get_loader
+from prediction_cache import PredictionCache
+from shared_model import process_memory, start_worker_reporter, worker_reports
+from visitor_features import STATE_DIR, VisitorIndex
+
+# O modelo foi treinado com DataFrame; na inferência enviamos matrizes NumPy já na
+# ordem correta das colunas, então o aviso de nomes de features é esperado.
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+# Tamanho máximo de lote aceito em /predict/batch
+MAX_BATCH_SIZE = int(os.getenv('CHURN_MAX_BATCH_SIZE', '10000'))
+
+# Configuração do micro-batching de /predict/ (desabilitado por padrão)
+MICROBATCH_ENABLED = os.getenv('CHURN_MICROBATCH', '0') == '1'
+MICROBATCH_MAX_WAIT_MS = float(os.getenv('CHURN_MICROBATCH_MAX_WAIT_MS', '5'))
+MICROBATCH_MAX_SIZE = int(os.getenv('CHURN_MICROBATCH_MAX_SIZE', '64'))
+
+# Cache de probabilidades de /predict/ (desabilitado por padrão)
+PREDICTION_CACHE_ENABLED = os.getenv('CHURN_PREDICTION_CACHE', '0') == '1'
+PREDICTION_CACHE_SIZE = int(os.getenv('CHURN_PREDICTION_CACHE_SIZE', '10000'))
+PREDICTION_CACHE_TTL_S = float(os.getenv('CHURN_PREDICTION_CACHE_TTL_S', '3600'))
+PREDICTION_CACHE_DECIMALS = int(os.getenv('CHURN_PREDICTION_CACHE_DECIMALS', '4'))
+
+# Limiar de decisão padrão (sobrescrito por requisição com ?threshold=)
+THRESHOLD = float(os.getenv('CHURN_THRESHOLD', str(DEFAULT_THRESHOLD)))
+
+# Estratégia de carregamento do modelo: 'background', 'lazy' ou 'eager'
+MODEL_LOADING = os.getenv('CHURN_MODEL_LOADING', 'background')
+
+# Profiler por amostragem: ligado na subida apenas com CHURN_PROFILER=1
+PROFILER_AT_STARTUP = os.getenv('CHURN_PROFILER', '0') == '1'
+PROFILER_INTERVAL_MS = float(os.getenv('CHURN_PROFILER_INTERVAL_MS', '5'))
 
 # Inicializar o app
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+profiler = SamplingProfiler()
+
+@app.exception_handler(RequestValidationError)
+async def batch_too_large(request: Request, exc: RequestValidationError):
+    """Lotes acima de CHURN_MAX_BATCH_SIZE, recusados já na validação, mantêm o status 413."""
+    for error in exc.errors():
+        loc = tuple(error.get('loc', ()))
+        if error.get('type') == 'too_long' and loc[:2] in (('body', 'records'), ('body', 'columns')):
+            return JSONResponse(status_code=413, content={
+                "detail": f"Lote excede o máximo de {MAX_BATCH_SIZE} registros."
+            })
+    return await request_validation_exception_handler(request, exc)
+
+# Carregador do modelo treinado (compilado, se disponível, e mapeado em memória)
+loader = get_loader()
+if MODEL_LOADING == 'eager':
+    loader.get()
+
+# Índice de atributos por visitante (vazio até o primeiro `python visitor_features.py`)
+visitors = VisitorIndex(os.getenv('CHURN_VISITOR_INDEX', STATE_DIR))
 
-# Carregar o modelo treinado
-model = joblib.load('models/churn_model.pkl')
+# Montadores de linhas NumPy (caminho rápido, sem pandas), um por dtype de entrada.
+# O dtype de cada montador é fixo: trocar de modelo escolhe outro montador em vez de
+# alterar um objeto compartilhado pelas threads do threadpool.
+row_builders = {}
+
+def row_builder(model) -> RowBuilder:
+    """Montador de linhas no dtype de entrada do modelo (float64 se ainda não houver modelo)."""
+    dtype = np.dtype(inference_dtype(model))
+    builder = row_builders.get(dtype)
+    if builder is None:
+        builder = row_builders.setdefault(dtype, RowBuilder(FEATURES, dtype=dtype))
+    return builder
+
+def get_model():
+    """Modelo carregado; aguarda o carregamento em andamento, se necessário."""
+    return loader.get()
 
 # Definir o esquema completo de entrada de dados
 class CustomerData(BaseModel):
@@ -41,21 +181,316 @@ class CustomerData(BaseModel):
     via_organica: int
     via_pago: int
 
+def columns_model(name, types: dict):
+    """Esquema colunar: uma lista opcional por campo (campo -> tipo dos valores), limitada a
+    MAX_BATCH_SIZE valores.
+
+    Chaves desconhecidas são ignoradas sem validação; os limites valem já na validação,
+    antes de o lote inteiro ser convertido.
+    """
+    return create_model(name, **{
+        field: (Optional[List[value_type]], Field(None, max_length=MAX_BATCH_SIZE))
+        for field, value_type in types.items()
+    })
+
+FeatureColumns = columns_model('FeatureColumns', {name: float for name in FEATURES})
+
+# Esquema de lote: lista de registros ou colunas (nome da feature -> valores)
+class BatchData(BaseModel):
+    records: Optional[List[CustomerData]] = Field(None, max_length=MAX_BATCH_SIZE)
+    columns: Optional[FeatureColumns] = None
+
+# Campos brutos da sessão (mesmos de fetch_data.py); nulos são tratados como zero
+class RawSessionData(BaseModel):
+    pageviews: Optional[int] = None
+    timeOnSite: Optional[float] = None
+    transactions: Optional[int] = None
+    transactionRevenue: Optional[float] = None
+    device: Optional[str] = None
+    traffic_medium: Optional[str] = None
+
+# Mesmos tipos do formato por registro: contagens e valores numéricos, device e
+# traffic_medium como texto; nulos são aceitos em todos os campos
+RawColumns = columns_model('RawColumns', {name: RawSessionData.model_fields[name].annotation for name in RAW_FIELDS})
+
+class RawBatchData(BaseModel):
+    records: Optional[List[RawSessionData]] = Field(None, max_length=MAX_BATCH_SIZE)
+    columns: Optional[RawColumns] = None
+
+def batch_columns(batch) -> dict:
+    """Colunas enviadas no lote colunar (campo -> valores), sem cópia das listas."""
+    return {field: values for field, values in batch.columns if values is not None}
+
+def check_batch_size(batch) -> int:
+    """Valida o formato do lote (registros ou colunas) e o tamanho máximo; retorna o tamanho.
+
+    No formato colunar, todas as colunas do esquema precisam estar presentes e ter o mesmo
+    tamanho; o tamanho do lote vem só delas.
+    """
+    if (batch.records is None) == (batch.columns is None):
+        raise HTTPException(status_code=422, detail="Envie 'records' ou 'columns' (apenas um deles).")
+
+    if batch.records is not None:
+        size = len(batch.records)
+    else:
+        columns = batch_columns(batch)
+        missing = [f for f in type(batch.columns).model_fields if f not in columns]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Colunas ausentes: {missing}")
+        sizes = {len(values) for values in columns.values()}
+        if len(sizes) > 1:
+            raise HTTPException(status_code=422, detail="Todas as colunas devem ter o mesmo tamanho.")
+        size = sizes.pop()
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote com {size} registros excede o máximo de {MAX_BATCH_SIZE}."
+        )
+    return size
+
+def batch_to_matrix(batch: BatchData, rows: RowBuilder):
+    """Monta uma matriz NumPy (n_amostras x n_features) na ordem de treino."""
+    if batch.records is not None:
+        return rows.from_records(batch.records)
+    try:
+        return rows.from_columns(batch_columns(batch))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+def predict_one(data: CustomerData) -> float:
+    """Probabilidade de churn de um único cliente, chamada direta ao modelo."""
+    model = get_model()
+    # Mapear os campos direto para a linha pré-alocada e calcular a probabilidade
+    with span("/predict/", "features"):
+        row = row_builder(model).row(data)
+    return predict_row(model, row)
+
+def predict_row(model, row) -> float:
+    with span("/predict/", "model"):
+        return churn_probability(model, row)[0]
+
+def resolve_threshold(threshold: Optional[float]) -> float:
+    """Limiar da requisição ou, se ausente, o padrão do servidor."""
+    return THRESHOLD if threshold is None else threshold
+
+def scored(route: str, probabilities, threshold: float) -> dict:
+    """Resposta de lote: classes no limiar pedido e as probabilidades que as geraram."""
+    with span(route, "postprocess"):
+        predictions = apply_threshold(probabilities, threshold)
+        record_predictions(route, predictions)
+        return {
+            "predictions": predictions.tolist(),
+            "probabilities": probabilities.astype(float).tolist(),
+            "threshold": threshold,
+            "count": int(len(probabilities)),
+        }
+
+def batch_probability(X):
+    """Inferência de um lote do micro-batching (fora do contexto das requisições)."""
+    with span("/predict/", "model"):
+        return churn_probability(get_model(), X)
+
+# Agrupador de requisições concorrentes (apenas se habilitado); devolve probabilidades,
+# e cada requisição aplica o próprio limiar
+batcher = MicroBatcher(
+    batch_probability,
+    max_batch_size=MICROBATCH_MAX_SIZE,
+    max_wait_ms=MICROBATCH_MAX_WAIT_MS
+) if MICROBATCH_ENABLED else None
+# Cache de probabilidades por vetor de features e versão do modelo (apenas se habilitado)
+cache = PredictionCache(
+    max_size=PREDICTION_CACHE_SIZE,
+    ttl_s=PREDICTION_CACHE_TTL_S,
+    decimals=PREDICTION_CACHE_DECIMALS
+) if PREDICTION_CACHE_ENABLED else None
+if cache is not None:
+    METRICS.callback('churn_prediction_cache_lookups_total', "Consultas ao cache de previsões por resultado.",
+                     lambda: {('hit',): cache.hits, ('miss',): cache.misses}, 'counter', ('result',))
+    METRICS.callback('churn_prediction_cache_removals_total', "Entradas removidas do cache de previsões por motivo.",
+                     lambda: {('eviction',): cache.evictions, ('expiration',): cache.expirations,
+                              ('invalidation',): cache.invalidations}, 'counter', ('reason',))
+    METRICS.callback('churn_prediction_cache_entries', "Entradas no cache de previsões.", lambda: {(): len(cache)})
+
+if batcher is not None:
+    METRICS.register_histograms('churn_microbatch_batch_size', "Linhas por lote do micro-batching.",
+                                {(): batcher.batch_sizes})
+    METRICS.register_histograms('churn_microbatch_queue_depth', "Fila do micro-batching em cada disparo.",
+                                {(): batcher.queue_depths})
+
+@app.on_event("startup")
+def start_model_loading():
+    if MODEL_LOADING == 'background':
+        loader.start()
+    if loader.shared_dir:
+        start_worker_reporter(loader.shared_dir)
+    loader.start_watcher()
+    if PROFILER_AT_STARTUP:
+        profiler.start(PROFILER_INTERVAL_MS)
+
+@app.on_event("shutdown")
+def stop_model_watcher():
+    loader.stop_watcher()
+    profiler.stop()
+
+@app.on_event("startup")
+async def start_batcher():
+    if batcher is not None:
+        await batcher.start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    if batcher is not None:
+        await batcher.stop()
+
 # Rota principal
 @app.get("/")
 def read_root():
     return {"message": "API Churn v2.0 rodando!"}
 
+# Sondas de saúde (liveness/readiness)
+@app.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def health_ready():
+    status = loader.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Memória por worker (confirma o compartilhamento do modelo entre processos)
+@app.get("/admin/memory")
+def admin_memory():
+    workers = worker_reports(loader.shared_dir) if loader.shared_dir else []
+    return {"pid": os.getpid(), "memory": process_memory(), "workers": workers}
+
+# Versão do modelo em produção (registro de modelos)
+@app.get("/admin/model")
+def admin_model():
+    return loader.model_info()
+
+# Métricas no formato Prometheus
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# Profiler por amostragem, ligado e desligado com o servidor no ar
+@app.post("/admin/profiler/start")
+def profiler_start(interval_ms: float = Query(PROFILER_INTERVAL_MS, ge=1.0, le=1000.0),
+                   duration_s: Optional[float] = Query(None, gt=0.0)):
+    started = profiler.start(interval_ms, duration_s)
+    return {"started": started, **profiler.status()}
+
+@app.post("/admin/profiler/stop")
+def profiler_stop():
+    return profiler.stop()
+
+@app.get("/admin/profiler")
+def profiler_report(limit: int = Query(20, ge=1, le=1000)):
+    return {**profiler.status(), "top": profiler.top(limit)}
+
+@app.get("/admin/profiler/collapsed")
+def profiler_collapsed():
+    return PlainTextResponse(profiler.collapsed())
+
+# Atributos agregados de um visitante
+@app.get("/visitors/{visitor_id}")
+def visitor_features(visitor_id: str):
+    # Leitura do ponteiro CURRENT: troca para um snapshot novo, se houver
+    visitors.refresh()
+    if not visitors.ready:
+        raise HTTPException(status_code=503, detail="Índice de atributos por visitante não disponível.")
+    features = visitors.lookup(visitor_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"Visitante {visitor_id} não encontrado (até {visitors.as_of}).")
+    return features
+
+async def predict_cached(data: CustomerData) -> float:
+    """Probabilidade pelo cache; em caso de falta, pontua o vetor quantizado e guarda o resultado."""
+    # Modelo já carregado (loader.ready): não bloqueia o event loop
+    model, _, version = loader.snapshot()
+    rows = row_builder(model)
+    with span("/predict/", "features"):
+        row = cache.quantize(rows.row(data, out=rows.new_row()))
+        key = cache.key(row)
+    with span("/predict/", "cache"):
+        probability = cache.get(version, key)
+    if probability is None:
+        if batcher is not None:
+            with span("/predict/", "batch_wait"):
+                probability = await batcher.submit(row)
+        else:
+            probability = await run_in_threadpool(predict_row, model, row)
+        cache.put(version, key, probability)
+    return probability
+
 # Rota de previsão
 @app.post("/predict/")
-def predict(data: CustomerData):
-    # Transformar os dados recebidos em DataFrame
-    input_data = pd.DataFrame([data.dict()])
-
-    # Fazer a previsão
-    prediction = model.predict(input_data)[0]
+async def predict(data: CustomerData, threshold: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    threshold = resolve_threshold(threshold)
+    if cache is not None and loader.ready:
+        probability = await predict_cached(data)
+    elif batcher is not None:
+        # A linha fica na fila até o disparo do lote, então não usa o buffer compartilhado
+        with span("/predict/", "features"):
+            rows = row_builder(loader.snapshot()[0])
+            row = rows.row(data, out=rows.new_row())
+        with span("/predict/", "batch_wait"):
+            probability = await batcher.submit(row)
+    else:
+        probability = await run_in_threadpool(predict_one, data)
+    prediction = int(apply_threshold(probability, threshold))
+    record_predictions("/predict/", (prediction,))
 
     # Interpretar o resultado
     result = "Cliente deve permanecer" if prediction == 0 else "Cliente com risco de churn"
 
-    return {"prediction": int(prediction), "message": result}
+    return {"prediction": prediction, "probability": float(probability), "threshold": threshold, "message": result}
+
+# Rota de previsão em lote
+@app.post("/predict/batch")
+def predict_batch(batch: BatchData, threshold: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    threshold = resolve_threshold(threshold)
+    if check_batch_size(batch) == 0:
+        return {"predictions": [], "probabilities": [], "threshold": threshold, "count": 0}
+
+    # Uma única chamada vetorizada ao modelo; a saída segue a ordem de entrada
+    model = get_model()
+    with span("/predict/batch", "features"):
+        X = batch_to_matrix(batch, row_builder(model))
+    with span("/predict/batch", "model"):
+        probabilities = churn_probability(model, X)
+    return scored("/predict/batch", probabilities, threshold)
+
+# Rota de previsão a partir dos campos brutos da sessão
+@app.post("/predict/raw")
+def predict_raw(batch: RawBatchData, threshold: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    threshold = resolve_threshold(threshold)
+    if check_batch_size(batch) == 0:
+        return {"predictions": [], "probabilities": [], "threshold": threshold, "count": 0}
+
+    # Modelo e transformação da mesma versão, mesmo se houver uma troca em andamento
+    model, transform, _ = loader.snapshot()
+    if transform is None:
+        raise HTTPException(status_code=503, detail="Transformação de features não disponível.")
+
+    if batch.records is not None:
+        columns = {f: [getattr(record, f) for record in batch.records] for f in RAW_FIELDS}
+    else:
+        columns = batch_columns(batch)
+
+    # Mesma transformação vetorizada do treino, aplicada ao lote inteiro
+    try:
+        with span("/predict/raw", "features"):
+            X = transform.transform_matrix(columns)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    with span("/predict/raw", "model"):
+        probabilities = churn_probability(model, X)
+    return scored("/predict/raw", probabilities, threshold)
+
+# Métricas do micro-batching
+@app.get("/predict/stats")
+def predict_stats():
+    stats = {"enabled": False} if batcher is None else {"enabled": True, **batcher.stats()}
+    stats["cache"] = {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+    return stats
@@ -0,0 +1,112 @@
+"""
+balancing.py
+-------------
+Estratégias de balanceamento de classes para o pipeline de churn.
+
+Objetivo:
+- Substituir a SMOTE completa (busca k-NN sobre toda a base) por uma etapa plugável:
+  - 'smote': SMOTE sobre toda a base (comportamento anterior);
+  - 'smote_chunked': SMOTE em blocos estratificados processados em paralelo; os vizinhos
+    são buscados apenas dentro do bloco (aproximação), então memória e tempo da busca
+    ficam limitados pelo tamanho do bloco;
+  - 'undersample': subamostragem aleatória da classe majoritária (mais barata de todas);
+  - 'class_weight': nenhuma linha nova; o peso das classes vai para o estimador;
+  - 'none': sem balanceamento.
+- Permitir aplicar o balanceamento dentro dos folds do treino (`resample` na seleção e
+  na busca de hiperparâmetros), sem gravar uma base sintética e inflada em disco.
+
+Impacto:
+- O balanceamento deixa de ser a etapa mais lenta e que mais consome memória do
+  pipeline, e a validação cruzada deixa de avaliar em linhas sintéticas.
+"""
+
+
+
+import math
+
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from imblearn.under_sampling import RandomUnderSampler
+from joblib import Parallel, delayed
+
+STRATEGIES = ('smote', 'smote_chunked', 'undersample', 'class_weight', 'none')
+CHUNK_SIZE = 50_000
+
+
+def _smote_chunk(X, y, seed, k_neighbors=5):
+    """Linhas sintéticas da SMOTE em um bloco (blocos com minoria < 2 não geram linhas)."""
+    minority = int(np.bincount(y).min()) if len(np.unique(y)) > 1 else 0
+    if minority < 2:
+        return X[:0], y[:0]
+    X_res, y_res = SMOTE(random_state=seed, k_neighbors=min(k_neighbors, minority - 1)).fit_resample(X, y)
+    # A SMOTE devolve as linhas originais seguidas das sintéticas
+    return X_res[len(y):], y_res[len(y):]
+
+
+def chunked_smote(X, y, chunk_size=CHUNK_SIZE, k_neighbors=5, n_jobs=-1, random_state=42):
+    """SMOTE aproximada: blocos estratificados de até `chunk_size` linhas, em paralelo."""
+    rng = np.random.default_rng(random_state)
+    labels = np.asarray(y)
+    n_chunks = max(math.ceil(len(labels) / chunk_size), 1)
+
+    # Cada bloco recebe a mesma fração de cada classe (blocos estratificados)
+    chunks = [[] for _ in range(n_chunks)]
+    for label in np.unique(labels):
+        index = rng.permutation(np.flatnonzero(labels == label))
+        for i, part in enumerate(np.array_split(index, n_chunks)):
+            chunks[i].append(part)
+    chunks = [np.concatenate(parts) for parts in chunks]
+
+    def chunk_values(index):
+        # Cada bloco é convertido para float64 só quando despachado, sem copiar X inteiro
+        if isinstance(X, pd.DataFrame):
+            return X.iloc[index].to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64)[index]
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_smote_chunk)(chunk_values(index), labels[index], random_state + i, k_neighbors)
+        for i, index in enumerate(chunks)
+    )
+    # Só as linhas sintéticas voltam dos blocos; as originais são reaproveitadas de X.
+    # Cada bloco volta aos dtypes de X antes da concatenação única (sem cópia float64 de tudo)
+    y_new = np.concatenate([y_chunk for _, y_chunk in results])
+    if isinstance(X, pd.DataFrame):
+        dtypes = X.dtypes.to_dict()
+        parts = [pd.DataFrame(X_chunk, columns=X.columns).astype(dtypes) for X_chunk, _ in results]
+        del results
+        X_res = pd.concat([X.reset_index(drop=True), *parts], ignore_index=True)
+    else:
+        dtype = np.asarray(X).dtype
+        parts = [X_chunk.astype(dtype, copy=False) for X_chunk, _ in results]
+        del results
+        X_res = np.concatenate([np.asarray(X), *parts])
+    del parts
+    if isinstance(y, pd.Series):
+        y_res = pd.concat([y.reset_index(drop=True), pd.Series(y_new, name=y.name).astype(y.dtype)], ignore_index=True)
+    else:
+        y_res = np.concatenate([labels, y_new])
+    return X_res, y_res
+
+
+def resample(strategy, X, y, random_state=42, n_jobs=-1, chunk_size=CHUNK_SIZE):
+    """Aplica a estratégia a (X, y); 'class_weight' e 'none' devolvem os dados intactos."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estratégia de balanceamento desconhecida: {strategy!r} (opções: {STRATEGIES})")
+    if strategy in ('class_weight', 'none') or len(np.unique(y)) < 2:
+        return X, y
+    if strategy == 'smote':
+        return SMOTE(random_state=random_state).fit_resample(X, y)
+    if strategy == 'smote_chunked':
+        return chunked_smote(X, y, chunk_size=chunk_size, n_jobs=n_jobs, random_state=random_state)
+    return RandomUnderSampler(random_state=random_state).fit_resample(X, y)
+
+
+def estimator_params(strategy, name, y):
+    """Hiperparâmetros extras do estimador `name` para a estratégia (pesos de classe)."""
+    if strategy != 'class_weight':
+        return {}
+    if name == "XGBoost":
+        counts = np.bincount(np.asarray(y), minlength=2)
+        return {'scale_pos_weight': float(counts[0]) / max(float(counts[1]), 1.0)}
+    return {'class_weight': 'balanced'}
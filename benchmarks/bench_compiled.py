@@ -0,0 +1,90 @@
+"""
+bench_compiled.py
+------------------
+Benchmark do modelo compilado (compiled_model.py) por tamanho de lote.
+
+Compara, para lotes de 1 a `--max-rows` linhas:
+- o modelo original (`predict_proba` do scikit-learn/XGBoost/LightGBM);
+- o avaliador NumPy (`CompiledEnsemble`);
+- o modelo servido em CHURN_MODEL_FORMAT=auto (`HybridModel`: compilado até
+  CHURN_COMPILED_MAX_ROWS linhas, original acima disso).
+
+Sem `--model`, treina uma Random Forest com profundidade padrão (sem limite) sobre dados
+sintéticos ruidosos, o caso mais desfavorável para o avaliador NumPy (árvores profundas).
+
+Uso:
+    python benchmarks/bench_compiled.py [--model models/churn_model.pkl] [--repeats 5]
+"""
+
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled_model import COMPILED_MAX_ROWS, HybridModel, compile_model, verify_parity
+from inference import FEATURES
+
+
+def session_features(rows, seed=1):
+    """Features de sessões sintéticas (entrada realista para um modelo treinado no projeto)."""
+    from feature_transform import FeatureTransform
+    from synthetic import make_sessions
+    sessions = make_sessions(rows, seed=seed)
+    return FeatureTransform().fit(sessions).transform_matrix(sessions)
+
+
+def deep_forest(rows=60_000, seed=0):
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(seed)
+    X = rng.random((rows, len(FEATURES)))
+    y = (X[:, 0] + rng.normal(0, 0.5, rows) > 0.5).astype(int)
+    return RandomForestClassifier(n_estimators=100, random_state=seed, n_jobs=-1).fit(X, y)
+
+
+def best_ms(fn, X, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def run(model_path, repeats, max_rows):
+    if model_path:
+        import joblib
+        model = joblib.load(model_path)
+        X_all = session_features(max_rows)
+    else:
+        model = deep_forest()
+        X_all = np.random.default_rng(1).random((max_rows, len(FEATURES)))
+    if hasattr(model, 'n_jobs'):
+        model.set_params(n_jobs=1)
+    compiled = compile_model(model, feature_names=list(FEATURES))
+    hybrid = HybridModel(compiled, lambda: model)
+    hybrid.wait_native()
+
+    verify_parity(model, compiled, X_all[:1000])
+    print(f"\n{type(model).__name__}: {compiled.meta['n_trees']} árvores, {compiled.meta['n_nodes']} nós, "
+          f"profundidade máxima {compiled.max_depth} | limite do compilado: {COMPILED_MAX_ROWS} linhas")
+    print(f"{'linhas':>8} {'original (ms)':>14} {'compilado (ms)':>15} {'auto (ms)':>10}")
+    sizes = [n for n in (1, 16, 64, 128, 256, 1000, 10_000, 100_000) if n <= max_rows]
+    for n in sizes:
+        X = X_all[:n]
+        print(f"{n:>8} {best_ms(model.predict_proba, X, repeats):>14.2f} "
+              f"{best_ms(compiled.predict_proba, X, repeats):>15.2f} {best_ms(hybrid.predict_proba, X, repeats):>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help="Pickle do modelo (padrão: Random Forest profunda sintética).")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-rows', type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.model, args.repeats, args.max_rows)
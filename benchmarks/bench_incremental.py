@@ -0,0 +1,67 @@
+"""
+bench_incremental.py
+---------------------
+Benchmark do retreino incremental (incremental_training.py) vs retreino completo.
+
+Gera `--days` dias de sessões sintéticas: os primeiros formam a base já treinada, o
+penúltimo é a partição nova e o último é o conjunto de teste. Para cada candidato,
+compara o tempo do ajuste completo (base + partição nova) com o tempo de continuar o
+modelo da base só com a partição nova, e o F1 de cada um no dia de teste.
+
+Uso:
+    python benchmarks/bench_incremental.py [--rows 1000000] [--days 30] [--new-estimators 50]
+"""
+
+
+
+import argparse
+import os
+import sys
+import time
+
+from sklearn.metrics import f1_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incremental_training import continue_training
+from model_selection import CANDIDATES, make_estimator
+from process_data import build_features
+from storage import RAW_DTYPES
+from synthetic import make_sessions
+
+
+def run(rows, days, new_estimators):
+    sessions = make_sessions(rows, days=days)
+    features, _ = build_features(sessions.astype(RAW_DTYPES))
+    X, y = features.drop(columns='churn'), features['churn']
+    dates = sorted(sessions['date'].unique())
+    base, new, test = (sessions['date'] < dates[-2]).to_numpy(), (sessions['date'] == dates[-2]).to_numpy(), \
+        (sessions['date'] == dates[-1]).to_numpy()
+    print(f"Base: {base.sum()} linhas | partição nova: {new.sum()} linhas | teste: {test.sum()} linhas")
+
+    print(f"{'modelo':<14}{'completo (s)':>14}{'incremental (s)':>17}{'ganho':>8}{'F1 completo':>13}{'F1 incr.':>10}")
+    for name in CANDIDATES:
+        params = {'verbose': -1} if name == "LightGBM" else {}
+
+        start = time.perf_counter()
+        full = make_estimator(name, params, n_jobs=-1).fit(X[base | new], y[base | new])
+        full_time = time.perf_counter() - start
+
+        model = make_estimator(name, params, n_jobs=-1).fit(X[base], y[base])
+        start = time.perf_counter()
+        model = continue_training(model, X[new], y[new], new_estimators)
+        incremental_time = time.perf_counter() - start
+
+        full_f1 = f1_score(y[test], full.predict(X[test]))
+        incremental_f1 = f1_score(y[test], model.predict(X[test]))
+        print(f"{name:<14}{full_time:>14.2f}{incremental_time:>17.2f}{full_time / incremental_time:>7.1f}x"
+              f"{full_f1:>13.4f}{incremental_f1:>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--new-estimators', type=int, default=50)
+    args = parser.parse_args()
+    run(args.rows, args.days, args.new_estimators)
@@ -0,0 +1,104 @@
+"""
+bench_inference.py
+-------------------
+Benchmark de latência do caminho de inferência de uma linha da API.
+
+Compara:
+- Caminho anterior: `pd.DataFrame([data.dict()])` + `model.predict`.
+- Caminho rápido: linha NumPy pré-alocada (`inference.RowBuilder`) + `model.predict`.
+
+Uso:
+    python benchmarks/bench_inference.py [--iterations 2000]
+
+Se 'models/churn_model.pkl' não existir, treina uma Random Forest pequena sobre dados
+sintéticos apenas para a medição.
+"""
+
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import FEATURES, RowBuilder, check_feature_order, inference_dtype
+
+
+class CustomerData(BaseModel):
+    pageviews: int
+    timeOnSite: float
+    tempo_por_pagina: float
+    ticket_medio: float
+    engajamento_baixo: int
+    visitante_rapido: int
+    cliente_ticket_alto: int
+    device_mobile: int
+    device_tablet: int
+    device_desktop: int
+    via_organica: int
+    via_pago: int
+
+
+def load_or_train_model():
+    """Carrega o modelo salvo ou treina um modelo sintético equivalente."""
+    if os.path.exists('models/churn_model.pkl'):
+        import joblib
+        return joblib.load('models/churn_model.pkl')
+
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.random((5000, len(FEATURES))) * 100, columns=list(FEATURES))
+    y = (X['pageviews'] > 50).astype(int)
+    return RandomForestClassifier(random_state=42).fit(X, y)
+
+
+def percentiles(samples):
+    arr = np.asarray(samples) * 1e6
+    return {p: float(np.percentile(arr, p)) for p in (50, 90, 99)}
+
+
+def run(iterations):
+    import warnings
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    model = load_or_train_model()
+    check_feature_order(model)
+    rows = RowBuilder(FEATURES, dtype=inference_dtype(model))
+    data = CustomerData(
+        pageviews=8, timeOnSite=350.0, tempo_por_pagina=43.75, ticket_medio=1200.0,
+        engajamento_baixo=0, visitante_rapido=0, cliente_ticket_alto=1, device_mobile=1,
+        device_tablet=0, device_desktop=0, via_organica=1, via_pago=0
+    )
+
+    cases = {
+        'dataframe': lambda: pd.DataFrame([data.dict()]),
+        'numpy': lambda: rows.row(data),
+    }
+
+    print(f"{'caminho':<12}{'etapa':<12}{'p50 (us)':>12}{'p90 (us)':>12}{'p99 (us)':>12}")
+    for name, build in cases.items():
+        build_times, total_times = [], []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            X = build()
+            built = time.perf_counter()
+            model.predict(X)
+            done = time.perf_counter()
+            build_times.append(built - start)
+            total_times.append(done - start)
+
+        for stage, samples in (('montagem', build_times), ('total', total_times)):
+            p = percentiles(samples)
+            print(f"{name:<12}{stage:<12}{p[50]:>12.1f}{p[90]:>12.1f}{p[99]:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    run(parser.parse_args().iterations)
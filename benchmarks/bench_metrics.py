@@ -0,0 +1,90 @@
+"""
+bench_metrics.py
+-----------------
+Benchmark do custo da instrumentação (metrics.py) no caminho de inferência.
+
+Mede:
+- o custo de um span isolado, com as métricas ligadas e desligadas;
+- a latência de `POST /predict/` (TestClient, em processo) com métricas desligadas,
+  ligadas e ligadas com o profiler por amostragem rodando.
+
+Requer o modelo treinado ('models/churn_model.pkl' ou o registro), como a API.
+
+Uso:
+    python benchmarks/bench_metrics.py [--iterations 2000] [--interval-ms 5]
+"""
+
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from metrics import SamplingProfiler, span
+
+
+def span_cost(iterations):
+    token = metrics._request.set(metrics._RequestTimer(time.perf_counter()))
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with span('/bench', 'stage'):
+                pass
+        return (time.perf_counter() - start) / iterations * 1e6
+    finally:
+        metrics._request.reset(token)
+
+
+def request_latencies(client, payload, iterations):
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        client.post('/predict/', json=payload)
+        latencies[i] = time.perf_counter() - start
+    return latencies * 1000
+
+
+def run(iterations, interval_ms):
+    from fastapi.testclient import TestClient
+
+    import app
+
+    results = {}
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        results[enabled] = span_cost(iterations * 50)
+    print(f"\nSpan isolado: desligado {results[False]:.2f} µs | ligado {results[True]:.2f} µs")
+
+    payload = {name: 1 for name in app.FEATURES}
+    profiler = SamplingProfiler()
+    with TestClient(app.app) as client:
+        app.get_model()
+        request_latencies(client, payload, 200)  # aquecimento
+
+        print(f"\n/predict/ ({iterations} requisições)      p50 (ms)   p99 (ms)")
+        for label, enabled, profiled in (("métricas desligadas", False, False),
+                                         ("métricas ligadas", True, False),
+                                         (f"ligadas + profiler {interval_ms:g} ms", True, True)):
+            metrics.ENABLED = enabled
+            if profiled:
+                profiler.start(interval_ms)
+            latencies = request_latencies(client, payload, iterations)
+            if profiled:
+                profiler.stop()
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{label:<32} {p50:>8.3f}   {p99:>8.3f}")
+    print(f"\nAmostras do profiler: {profiler.samples} | pilhas distintas: {len(profiler.stacks)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--interval-ms', type=float, default=5.0)
+    args = parser.parse_args()
+    run(args.iterations, args.interval_ms)
@@ -0,0 +1,86 @@
+"""
+bench_prediction_cache.py
+--------------------------
+Benchmark do cache de previsões de /predict/ (prediction_cache.py) sob tráfego enviesado.
+
+Monta um conjunto de vetores de features distintos a partir de sessões sintéticas
+(as sessões de rejeição, com `pageviews=1` e flags zeradas, colapsam em poucos vetores),
+ordena pela frequência e sorteia as requisições com pesos de Zipf (1/posição^s).
+Sobe a API com o cache desligado e ligado e mede vazão, p50/p99 e taxa de acerto, com
+o mesmo gerador de carga de run_benchmarks.py.
+
+Requer o modelo treinado ('models/churn_model.pkl' ou o registro), como a API.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_prediction_cache.py [--sessions 200000] [--requests 20000]
+        [--zipf-s 1.1] [--concurrency 16] [--duration 10]
+"""
+
+
+
+import argparse
+import http.client
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_transform import FeatureTransform
+from inference import FEATURES
+from run_benchmarks import load_test, start_server
+from synthetic import make_sessions
+
+
+def zipf_payloads(sessions, requests, s, seed=3):
+    """Corpos de /predict/ sorteados com pesos de Zipf sobre os vetores distintos."""
+    features = FeatureTransform().fit(make_sessions(sessions, seed=seed)).transform(make_sessions(sessions, seed=seed + 1))
+    counts = features[list(FEATURES)].value_counts()  # ordenado do mais frequente ao menos
+    distinct = counts.index.to_frame(index=False)
+    weights = 1.0 / np.arange(1, len(distinct) + 1) ** s
+    picks = np.random.default_rng(seed).choice(len(distinct), requests, p=weights / weights.sum())
+    records = distinct.to_dict('records')
+    bodies = [{name: value.item() if hasattr(value, 'item') else value for name, value in records[i].items()}
+              for i in picks]
+    return bodies, len(distinct), len(np.unique(picks))
+
+
+def cache_stats(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/predict/stats')
+    return json.loads(conn.getresponse().read())['cache']
+
+
+def run(args):
+    bodies, n_distinct, n_used = zipf_payloads(args.sessions, args.requests, args.zipf_s)
+    top_share = np.mean([body == bodies[0] for body in bodies])
+    print(f"\nVetores distintos: {n_distinct} | sorteados: {n_used} em {args.requests} requisições "
+          f"(Zipf s={args.zipf_s}; mais frequente: {top_share:.1%})")
+
+    print(f"\n/predict/ ({args.concurrency} clientes, {args.duration:g} s)   req/s   p50 (ms)   p99 (ms)   acertos")
+    for label, enabled in (("cache desligado", '0'), ("cache ligado", '1')):
+        env = {**os.environ, 'CHURN_PREDICTION_CACHE': enabled, 'CHURN_PREDICTION_CACHE_SIZE': str(args.cache_size),
+               'CHURN_MODEL_WATCH_INTERVAL': '0'}
+        server, port, _ = start_server(os.getcwd(), env, workers=1)
+        try:
+            result = load_test(port, '/predict/', None, args.concurrency, args.duration, bodies=bodies)
+            stats = cache_stats(port)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats.get('hit_rate') is not None else "-"
+        print(f"{label:<34} {result['requests_per_s']:>7.0f}   {result['p50_ms']:>8.2f}   "
+              f"{result['p99_ms']:>8.2f}   {hit_rate:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=200_000)
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--cache-size', type=int, default=10_000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    run(parser.parse_args())
@@ -0,0 +1,69 @@
+"""
+bench_startup.py
+-----------------
+Benchmark de inicialização (cold start) da API.
+
+Mede, em processos Python novos, o tempo até `import app` terminar (o servidor já pode
+responder à sonda de liveness) e o tempo até o modelo estar carregado e aquecido
+(sonda de readiness), para cada combinação de configuração.
+
+Uso (a partir da raiz do projeto, após rodar train_model.py):
+    python benchmarks/bench_startup.py [--repeats 5]
+"""
+
+
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.loader.start()
+app.loader.get()
+t2 = time.perf_counter()
+print(json.dumps({'import_s': t1 - t0, 'ready_s': t2 - t0}))
+"""
+
+# Configuração anterior: carregamento na importação, pickle completo, sem mmap
+SCENARIOS = {
+    'eager + pickle (anterior)': {'CHURN_MODEL_LOADING': 'eager', 'CHURN_MODEL_FORMAT': 'pickle', 'CHURN_MODEL_MMAP_MODE': ''},
+    'background + pickle + mmap': {'CHURN_MODEL_LOADING': 'background', 'CHURN_MODEL_FORMAT': 'pickle', 'CHURN_MODEL_MMAP_MODE': 'r'},
+    'background + compilado + mmap': {'CHURN_MODEL_LOADING': 'background', 'CHURN_MODEL_FORMAT': 'compiled', 'CHURN_MODEL_MMAP_MODE': 'r'},
+}
+
+
+def measure(env_overrides, repeats):
+    env = {**os.environ, **env_overrides}
+    samples = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(s[key] for s in samples) for key in ('import_s', 'ready_s')}
+
+
+def run(repeats):
+    print(f"{'cenário':<34}{'import (s)':>12}{'pronto (s)':>12}")
+    for name, env_overrides in SCENARIOS.items():
+        try:
+            result = measure(env_overrides, repeats)
+        except subprocess.CalledProcessError as exc:
+            print(f"{name:<34} falhou: {exc.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:<34}{result['import_s']:>12.3f}{result['ready_s']:>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    run(parser.parse_args().repeats)
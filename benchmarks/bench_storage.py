@@ -0,0 +1,82 @@
+"""
+bench_storage.py
+-----------------
+Benchmark de armazenamento dos datasets intermediários: CSV (formato anterior) vs
+Parquet e Arrow IPC/Feather com os esquemas explícitos de storage.py.
+
+Para as sessões brutas e para a base processada, reporta o tamanho em disco, o tempo de
+escrita, o tempo de leitura completa e o tempo de leitura apenas das colunas usadas por
+process_data.py (melhor de `--repeats` execuções).
+
+Uso:
+    python benchmarks/bench_storage.py [--rows 1000000] [--repeats 3]
+"""
+
+
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_data import build_features
+from storage import PROCESSED_SCHEMA, RAW_COLUMNS, RAW_DTYPES, RAW_SCHEMA, read_table, write_table
+from synthetic import make_sessions
+
+FORMATS = ('.csv', '.parquet', '.feather')
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def legacy_csv_read(path, columns=None):
+    """Leitura anterior: texto reinterpretado e dtypes inferidos a cada execução."""
+    if columns is None:
+        return pd.read_csv(path)
+    return pd.read_csv(path, usecols=columns, dtype={c: RAW_DTYPES[c] for c in columns if c in RAW_DTYPES})
+
+
+def bench_dataset(name, df, schema, projection, directory, repeats):
+    print(f"\n{name}: {len(df)} linhas, {len(schema.names)} colunas (projeção: {len(projection)} colunas)")
+    print(f"{'formato':<10}{'tamanho (MB)':>14}{'escrita (s)':>13}{'leitura (s)':>13}{'projeção (s)':>14}")
+
+    for ext in FORMATS:
+        path = os.path.join(directory, name + ext)
+        _, write_s = best_of(lambda: write_table(df, path, schema), repeats)
+        if ext == '.csv':
+            full, read_s = best_of(lambda: legacy_csv_read(path), repeats)
+            _, proj_s = best_of(lambda: legacy_csv_read(path, projection), repeats)
+        else:
+            full, read_s = best_of(lambda: read_table(path), repeats)
+            _, proj_s = best_of(lambda: read_table(path, columns=projection), repeats)
+        assert len(full) == len(df)
+        print(f"{ext[1:]:<10}{os.path.getsize(path) / 1e6:>14.1f}{write_s:>13.2f}{read_s:>13.2f}{proj_s:>14.2f}")
+
+
+def run(rows, repeats):
+    raw = make_sessions(rows)
+    processed, _ = build_features(raw.astype(RAW_DTYPES))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_dataset('ga_sessions_sample', raw, RAW_SCHEMA, RAW_COLUMNS, tmp, repeats)
+        bench_dataset('processed_sessions', processed, PROCESSED_SCHEMA, ['pageviews', 'timeOnSite', 'churn'],
+                      tmp, repeats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeats)
@@ -0,0 +1,86 @@
+"""
+bench_visitor_features.py
+--------------------------
+Benchmark dos atributos por visitante (visitor_features.py).
+
+Gera `--days` partições diárias sintéticas e mede:
+- o recálculo completo do histórico (uma ordenação + `reduceat`);
+- a atualização incremental com apenas o último dia (mescla só nos visitantes afetados);
+- a latência de consulta de um visitante no índice em disco (mmap + `searchsorted`).
+
+O estado incremental é conferido contra o recálculo completo ao final.
+
+Uso:
+    python benchmarks/bench_visitor_features.py [--rows 3000000] [--days 365]
+"""
+
+
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import RAW_SCHEMA, write_table
+from synthetic import make_sessions
+from visitor_features import TOTALS, VisitorIndex, VisitorState, build_visitor_state
+
+
+def run(rows, days, lookups=20_000):
+    sessions = make_sessions(rows, days=days)
+    work = tempfile.mkdtemp(prefix='bench_visitors_')
+    raw_dir, state_dir = os.path.join(work, 'raw'), os.path.join(work, 'state')
+    os.makedirs(raw_dir)
+    try:
+        dates = sorted(sessions['date'].unique())
+        for date, day in sessions.groupby('date'):
+            write_table(day, os.path.join(raw_dir, f'ga_sessions_{date}.parquet'), RAW_SCHEMA)
+        last_path = os.path.join(raw_dir, f'ga_sessions_{dates[-1]}.parquet')
+        last_day = os.path.join(work, os.path.basename(last_path))
+        shutil.move(last_path, last_day)
+
+        start = time.perf_counter()
+        build_visitor_state(raw_dir, state_dir)
+        full_time = time.perf_counter() - start
+
+        shutil.move(last_day, last_path)
+        start = time.perf_counter()
+        incremental = build_visitor_state(raw_dir, state_dir)
+        incremental_time = time.perf_counter() - start
+
+        full = VisitorState.from_sessions(sessions)
+        assert np.array_equal(incremental.ids, full.ids)
+        for name in TOTALS:
+            assert np.allclose(incremental.totals[name], full.totals[name]), name
+
+        index = VisitorIndex(state_dir)
+        ids = np.random.default_rng(0).choice(sessions['fullVisitorId'].to_numpy(), lookups)
+        start = time.perf_counter()
+        for visitor_id in ids:
+            index.lookup(visitor_id)
+        lookup_us = (time.perf_counter() - start) / lookups * 1e6
+        size_mb = sum(
+            os.path.getsize(os.path.join(index.snapshot, name)) for name in os.listdir(index.snapshot)
+        ) / 1e6
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    print(f"\nSessões: {rows} | dias: {len(dates)} | visitantes: {len(index)} | índice: {size_mb:.1f} MB")
+    print(f"Recálculo completo ({len(dates) - 1} dias): {full_time:.2f} s")
+    print(f"Incremental (1 dia):              {incremental_time:.2f} s "
+          f"({full_time / incremental_time:.1f}x mais rápido) | estado confere com o recálculo")
+    print(f"Consulta por visitante:           {lookup_us:.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+    run(args.rows, args.days)
@@ -0,0 +1,352 @@
+"""
+run_benchmarks.py
+------------------
+Suíte reproduzível de benchmarks dos caminhos de treino e de serviço.
+
+Em um diretório de trabalho isolado (nada de 'data/' ou 'models/' do projeto é tocado):
+1. Gera `--rows` sessões sintéticas no esquema do BigQuery (`synthetic.py`).
+2. Roda `process_data.py` e `train_model.py` como na produção, cada um em um processo
+   novo, medindo o tempo de parede e o pico de memória residente (ru_maxrss do processo
+   e dos processos auxiliares, como os workers do joblib).
+3. Mede a pontuação em lote dos dashboards (`scoring.score_csv_stream`) sobre um CSV de
+   `--score-rows` linhas: tempo, linhas/s e pico de memória.
+4. Sobe a API com uvicorn (`--workers`) e, após a sonda de readiness, dispara carga
+   concorrente (`--concurrency` clientes com conexões keep-alive) contra `/predict/` e
+   `/predict/batch`: latências p50/p90/p99/máx, requisições/s, linhas/s e erros.
+
+O resultado vai para `benchmarks/results/<data>-<commit>.json`, com o commit, a
+plataforma, as versões das bibliotecas e os parâmetros usados. `--compare base.json`
+mostra a variação de cada métrica em relação a uma execução anterior.
+
+O gerador de carga roda na mesma máquina que o servidor; compare apenas resultados
+obtidos no mesmo ambiente.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/run_benchmarks.py [--rows 200000] [--concurrency 16] [--duration 10]
+    python benchmarks/run_benchmarks.py --skip-train --compare benchmarks/results/<anterior>.json
+"""
+
+
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import RAW_PATH, RAW_SCHEMA, write_table
+from synthetic import make_sessions
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+MARKER = '@@BENCH@@'
+PERCENTILES = (50, 90, 99)
+
+# Executa um script do projeto como __main__ e reporta tempo e pico de memória (Linux: KB)
+STAGE_PROBE = """
+import json, resource, runpy, sys, time
+script, args = sys.argv[1], sys.argv[2:]
+sys.argv = [script] + args
+start = time.perf_counter()
+runpy.run_path(script, run_name='__main__')
+wall = time.perf_counter() - start
+usage = lambda who: resource.getrusage(who).ru_maxrss / 1024
+print('{marker}' + json.dumps({{'wall_s': wall, 'peak_rss_mb': usage(resource.RUSAGE_SELF),
+                                'children_peak_rss_mb': usage(resource.RUSAGE_CHILDREN)}}))
+"""
+
+# Pontuação em lote dos dashboards sobre um CSV já gerado
+SCORING_PROBE = """
+import json, resource, sys, time
+from model_loader import get_loader
+from scoring import score_csv_stream
+loader = get_loader()
+model = loader.get()
+start = time.perf_counter()
+summary = score_csv_stream(sys.argv[1], model, sys.argv[2], transform=loader.transform)
+wall = time.perf_counter() - start
+print('{marker}' + json.dumps({{'wall_s': wall, 'rows': summary.n_rows, 'rows_per_s': summary.n_rows / wall,
+                                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def _probe_result(stdout):
+    lines = [line for line in stdout.splitlines() if line.startswith(MARKER)]
+    return json.loads(lines[-1][len(MARKER):])
+
+
+def run_stage(name, script, args, workdir, env):
+    """Roda um script do projeto em um processo novo (cwd = diretório de trabalho)."""
+    print(f"[{name}] python {script} {' '.join(args)}")
+    out = subprocess.run(
+        [sys.executable, '-c', STAGE_PROBE.format(marker=MARKER), os.path.join(ROOT, script), *args],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"Etapa {name} falhou:\n{out.stderr[-2000:]}")
+    result = _probe_result(out.stdout)
+    print(f"[{name}] {result['wall_s']:.2f} s | pico {result['peak_rss_mb']:.0f} MB "
+          f"(auxiliares {result['children_peak_rss_mb']:.0f} MB)")
+    return result
+
+
+def run_scoring(rows, workdir, env, seed=7):
+    """Pontuação em lote a partir dos campos brutos (mesmo caminho do upload nos dashboards)."""
+    path = os.path.join(workdir, 'score_input.csv')
+    raw = make_sessions(rows, seed=seed)
+    raw[['pageviews', 'timeOnSite', 'transactions', 'transactionRevenue', 'device', 'traffic_medium']].to_csv(
+        path, index=False)
+    out = subprocess.run(
+        [sys.executable, '-c', SCORING_PROBE.format(marker=MARKER), path, os.path.join(workdir, 'score_output.csv')],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"Pontuação em lote falhou:\n{out.stderr[-2000:]}")
+    result = _probe_result(out.stdout)
+    print(f"[scoring] {result['rows']} linhas em {result['wall_s']:.2f} s "
+          f"({result['rows_per_s']:.0f} linhas/s) | pico {result['peak_rss_mb']:.0f} MB")
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, env, workers, timeout=120.0):
+    """Sobe o uvicorn e espera a sonda de readiness (modelo carregado e aquecido)."""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port), '--workers', str(workers),
+         '--log-level', 'warning', '--app-dir', ROOT],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn encerrou:\n{server.stderr.read().decode()[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health/ready')
+            if conn.getresponse().status == 200:
+                return server, port, time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("API não ficou pronta dentro do tempo limite.")
+
+
+def load_test(port, path, body, concurrency, duration, rows_per_request=1, warmup=1.0, bodies=None):
+    """`concurrency` clientes em laço fechado por `duration` segundos; latências em ms.
+
+    Com `bodies` (lista de corpos), os clientes percorrem a lista intercalados, em vez de
+    repetir sempre `body`.
+    """
+    payloads = [json.dumps(b).encode() for b in (bodies if bodies is not None else [body])]
+    headers = {'Content-Type': 'application/json'}
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    begin = time.perf_counter() + warmup
+    stop = begin + duration
+
+    def client(i):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        k = i
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop:
+                break
+            payload = payloads[k % len(payloads)]
+            k += concurrency
+            try:
+                conn.request('POST', path, payload, headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except OSError:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                ok = False
+            # Requisições do aquecimento não entram nas métricas
+            if sent >= begin:
+                if ok:
+                    latencies[i].append(time.perf_counter() - sent)
+                else:
+                    errors[i] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = np.array([value for values in latencies for value in values]) * 1000.0
+    result = {
+        'path': path,
+        'concurrency': concurrency,
+        'rows_per_request': rows_per_request,
+        'requests': int(samples.size),
+        'errors': int(sum(errors)),
+        'requests_per_s': samples.size / duration,
+        'rows_per_s': samples.size * rows_per_request / duration,
+    }
+    if samples.size:
+        result.update({f'p{p}_ms': float(np.percentile(samples, p)) for p in PERCENTILES})
+        result.update({'mean_ms': float(samples.mean()), 'max_ms': float(samples.max())})
+    return result
+
+
+def serving_payloads(batch_size, seed=11):
+    """Corpo de /predict/ (um cliente) e de /predict/batch (JSON colunar) a partir de sessões sintéticas."""
+    from feature_transform import FeatureTransform
+    from inference import FEATURES
+    features = FeatureTransform().fit(make_sessions(max(batch_size, 1000), seed=seed)).transform(
+        make_sessions(batch_size, seed=seed + 1))
+    record = {name: features[name].iloc[0].item() for name in FEATURES}
+    columns = {name: features[name].astype(float).tolist() for name in FEATURES}
+    return record, {'columns': columns}
+
+
+def run_serving(workdir, env, workers, concurrency, duration, batch_size):
+    server, port, ready_s = start_server(workdir, env, workers)
+    print(f"[serving] uvicorn pronto em {ready_s:.2f} s (porta {port}, {workers} worker(s))")
+    try:
+        record, batch = serving_payloads(batch_size)
+        results = {'ready_s': ready_s, 'workers': workers}
+        for name, path, body, rows in (('predict', '/predict/', record, 1),
+                                       ('predict_batch', '/predict/batch', batch, batch_size)):
+            result = load_test(port, path, body, concurrency, duration, rows_per_request=rows)
+            results[name] = result
+            print(f"[serving] {path:<16} {result['requests_per_s']:>8.0f} req/s {result['rows_per_s']:>10.0f} linhas/s "
+                  f"p50 {result.get('p50_ms', float('nan')):.1f} ms p99 {result.get('p99_ms', float('nan')):.1f} ms "
+                  f"erros {result['errors']}")
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def environment():
+    """Commit, plataforma e versões: o que é preciso para comparar duas execuções."""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    versions = {}
+    for module in ('numpy', 'pandas', 'pyarrow', 'sklearn', 'xgboost', 'lightgbm', 'fastapi', 'uvicorn'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline_path):
+    """Variação percentual de cada métrica numérica em relação a uma execução anterior."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparação com {(baseline['environment'].get('commit') or '?')[:10]} ({baseline_path}):")
+    changed = {key for key in set(baseline['params']) | set(current['params'])
+               if baseline['params'].get(key) != current['params'].get(key)}
+    if changed:
+        print(f"  Atenção: parâmetros diferentes: {sorted(changed)}")
+    old, new = _flatten(baseline['results']), _flatten(current['results'])
+    for key in sorted(set(old) & set(new)):
+        if old[key]:
+            print(f"  {key:<45}{old[key]:>14.3f}{new[key]:>14.3f}{(new[key] - old[key]) / old[key]:>+10.1%}")
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='churn_bench_')
+    os.makedirs(os.path.join(workdir, 'data'), exist_ok=True)
+    # Registro e índices ficam no diretório de trabalho; sem observar trocas durante a carga
+    pythonpath = os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))
+    env = {**os.environ, 'PYTHONPATH': pythonpath,
+           'CHURN_MODEL_WATCH_INTERVAL': '0', 'CHURN_MODEL_LOADING': 'background'}
+    report = {
+        'environment': environment(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('compare', 'workdir')},
+        'results': {},
+    }
+    results = report['results']
+    try:
+        if not args.skip_train:
+            start = time.perf_counter()
+            write_table(make_sessions(args.rows, seed=args.seed), os.path.join(workdir, RAW_PATH), RAW_SCHEMA)
+            results['generate'] = {'wall_s': time.perf_counter() - start, 'rows': args.rows}
+            results['process'] = run_stage('process', 'process_data.py', ['--balance', args.balance], workdir, env)
+            results['train'] = run_stage('train', 'train_model.py', ['--n-jobs', str(args.n_jobs), '--no-cache'],
+                                         workdir, env)
+        if args.score_rows:
+            results['scoring'] = run_scoring(args.score_rows, workdir, env)
+        if args.duration:
+            results['serving'] = run_serving(workdir, env, args.workers, args.concurrency, args.duration,
+                                             args.batch_size)
+    finally:
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    commit = (report['environment']['commit'] or 'nocommit')[:10] + ('-dirty' if report['environment']['dirty'] else '')
+    path = os.path.join(args.output_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{commit}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em: {path}")
+    if args.compare:
+        compare(report, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000, help="Sessões sintéticas para processar e treinar.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--balance', default='smote', help="Estratégia de process_data.py --balance.")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="train_model.py --n-jobs.")
+    parser.add_argument('--score-rows', type=int, default=500_000, help="Linhas da pontuação em lote (0 = pula).")
+    parser.add_argument('--workers', type=int, default=1, help="Workers do uvicorn.")
+    parser.add_argument('--concurrency', type=int, default=16, help="Clientes simultâneos na carga.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Segundos de carga por rota (0 = pula).")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Linhas por requisição em /predict/batch.")
+    parser.add_argument('--workdir', help="Diretório de trabalho (padrão: temporário, removido ao final).")
+    parser.add_argument('--keep', action='store_true', help="Mantém o diretório de trabalho temporário.")
+    parser.add_argument('--skip-train', action='store_true',
+                        help="Pula geração/processamento/treino (use com --workdir de uma execução anterior).")
+    parser.add_argument('--output-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', metavar='BASE_JSON', help="Compara com um resultado salvo anteriormente.")
+    run(parser.parse_args())
@@ -0,0 +1,56 @@
+"""
+synthetic.py
+-------------
+Gerador de sessões sintéticas no mesmo esquema da extração do BigQuery (fetch_data.py).
+
+Usado pelos benchmarks para medir o pipeline em escalas configuráveis sem acesso ao GCP.
+As proporções (poucas compras, maioria orgânica/direta, maioria desktop) imitam a base
+pública `google_analytics_sample`.
+"""
+
+
+
+import numpy as np
+import pandas as pd
+
+DEVICES = ['desktop', 'mobile', 'tablet']
+MEDIUMS = ['organic', '(none)', 'referral', 'cpc', 'affiliate', 'cpm', '(not set)']
+OPERATING_SYSTEMS = ['Windows', 'Macintosh', 'Android', 'iOS', 'Linux', 'Chrome OS']
+COUNTRIES = ['United States', 'India', 'United Kingdom', 'Canada', 'Brazil', 'Germany']
+SOURCES = ['google', '(direct)', 'youtube.com', 'facebook.com', 'mall.googleplex.com']
+
+
+def make_sessions(n_rows, seed=42, start_date='2016-08-01', days=549):
+    """Gera `n_rows` sessões com as colunas retornadas pela query de fetch_data.py."""
+    rng = np.random.default_rng(seed)
+    pageviews = rng.geometric(0.25, n_rows).astype('float64')
+    time_on_site = np.round(pageviews * rng.gamma(2.0, 30.0, n_rows))
+    bounce = pageviews == 1
+    time_on_site[bounce] = np.nan
+
+    # Compras mais prováveis em sessões com mais páginas (~1,2% no total; sessões de
+    # rejeição não compram): dá aos benchmarks de qualidade um sinal fora da receita
+    purchase_probability = np.minimum(0.004 * (pageviews - 1), 0.5)
+    transactions = np.where(rng.random(n_rows) < purchase_probability, rng.integers(1, 3, n_rows), 0).astype('float64')
+    revenue = np.where(transactions > 0, np.round(rng.lognormal(18.0, 1.0, n_rows), -4), np.nan)
+    transactions[transactions == 0] = np.nan
+
+    dates = pd.Timestamp(start_date) + pd.to_timedelta(rng.integers(0, days, n_rows), unit='D')
+    n_visitors = max(n_rows // 3, 1)
+
+    return pd.DataFrame({
+        'fullVisitorId': rng.integers(10**18, 10**19 - 1, n_visitors, dtype=np.uint64)[
+            rng.integers(0, n_visitors, n_rows)
+        ].astype(str),
+        'visitId': rng.integers(1_470_000_000, 1_517_000_000, n_rows),
+        'date': dates.strftime('%Y%m%d'),
+        'device': rng.choice(DEVICES, n_rows, p=[0.72, 0.25, 0.03]),
+        'os': rng.choice(OPERATING_SYSTEMS, n_rows),
+        'country': rng.choice(COUNTRIES, n_rows),
+        'traffic_medium': rng.choice(MEDIUMS, n_rows, p=[0.42, 0.16, 0.28, 0.03, 0.05, 0.03, 0.03]),
+        'traffic_source': rng.choice(SOURCES, n_rows),
+        'pageviews': pageviews,
+        'timeOnSite': time_on_site,
+        'transactions': transactions,
+        'transactionRevenue': revenue,
+    })
@@ -0,0 +1,343 @@
+"""
+compiled_model.py
+------------------
+Exportação do modelo vencedor para tabelas de nós achatadas e avaliador NumPy.
+
+Objetivo:
+- Converter Random Forest (scikit-learn), XGBoost ou LightGBM em arrays compactos:
+  feature, limiar, filhos esquerdo/direito e valor das folhas de todas as árvores.
+- Avaliar todas as árvores de uma vez com operações vetorizadas do NumPy.
+- Servir o modelo sem importar scikit-learn, XGBoost ou LightGBM.
+
+Formato salvo (diretório):
+- Um arquivo `.npy` por array (podem ser abertos com `mmap_mode='r'`).
+- `meta.json` com tipo de agregação, margem base, operador de decisão e features.
+
+Impacto:
+- Menor latência de previsão de uma linha e de lotes pequenos (o percurso só avança os
+  pares linha/árvore que ainda não chegaram a uma folha). Lotes grandes seguem com o
+  modelo original (`HybridModel`), cujo laço nativo é mais rápido nessa escala.
+"""
+
+
+
+import json
+import os
+import threading
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+# Acima deste número de linhas, o modelo original (laço em C/C++) é mais rápido que o
+# avaliador NumPy, cujo custo cresce com linhas x árvores x profundidade
+COMPILED_MAX_ROWS = int(os.getenv('CHURN_COMPILED_MAX_ROWS', '128'))
+
+
+class CompiledEnsemble:
+    """Ensemble de árvores achatado, com interface compatível com o scikit-learn.
+
+    - kind='mean_proba': média das probabilidades da classe positiva nas folhas (Random Forest).
+    - kind='logit_sum': soma das margens das folhas + margem base, seguida de sigmoide (boosters).
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.kind = meta['kind']
+        self.base_margin = meta.get('base_margin', 0.0)
+        self.sigmoid_scale = meta.get('sigmoid_scale', 1.0)
+        self.decision = meta['decision']
+        self.input_dtype = np.dtype(meta['input_dtype'])
+        self.max_depth = meta['max_depth']
+        self.feature_names_in_ = np.array(meta['feature_names'], dtype=object)
+        self.classes_ = np.array(meta['classes'])
+        self.is_leaf = self.left == np.arange(len(self.left))
+
+    def _as_matrix(self, X):
+        # DataFrames são reordenados pelas colunas de treino sem exigir pandas aqui
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)].to_numpy()
+        return np.asarray(X, dtype=self.input_dtype).reshape(-1, len(self.feature_names_in_))
+
+    def apply(self, X):
+        """Índice da folha alcançada em cada árvore (n_amostras x n_árvores).
+
+        Percorre os pares (linha, árvore) um nível por vez, mas só os que ainda não chegaram
+        a uma folha: o custo acompanha a profundidade média das folhas, e não a máxima.
+        """
+        X = self._as_matrix(X)
+        n_trees = len(self.roots)
+        idx = np.tile(np.asarray(self.roots, dtype=np.int64), X.shape[0])
+        active = np.flatnonzero(~self.is_leaf[idx])
+        while active.size:
+            node = idx[active]
+            x = X[active // n_trees, self.feature[node]]
+            if self.decision == 'lt':
+                go_left = x < self.threshold[node]
+            else:
+                go_left = x <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            idx[active] = node
+            active = active[~self.is_leaf[node]]
+        return idx.reshape(X.shape[0], n_trees)
+
+    def predict_proba(self, X):
+        leaf_values = self.value[self.apply(X)]
+        if self.kind == 'mean_proba':
+            positive = leaf_values.mean(axis=1)
+        else:
+            margin = leaf_values.sum(axis=1) + self.base_margin
+            positive = 1.0 / (1.0 + np.exp(-self.sigmoid_scale * margin))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(arrays, meta)
+
+
+class HybridModel:
+    """Modelo compilado para lotes pequenos e o modelo original para lotes grandes.
+
+    O modelo original é carregado em segundo plano; até ficar pronto (ou se falhar), todos
+    os lotes usam o compilado. As probabilidades dos dois são equivalentes (`verify_parity`).
+    """
+
+    def __init__(self, compiled, load_native, max_rows=COMPILED_MAX_ROWS):
+        self.compiled = compiled
+        self.max_rows = max_rows
+        self.native = None
+        self.native_error = None
+        self.input_dtype = compiled.input_dtype
+        self.feature_names_in_ = compiled.feature_names_in_
+        self.classes_ = compiled.classes_
+        self.meta = compiled.meta
+        self._loader = threading.Thread(target=self._load_native, args=(load_native,),
+                                        name='native-model-loader', daemon=True)
+        self._loader.start()
+
+    def _load_native(self, load_native):
+        try:
+            self.native = load_native()
+        except Exception as exc:
+            self.native_error = exc
+
+    def wait_native(self, timeout=None):
+        """Aguarda o carregamento do modelo original; retorna True se ele estiver disponível."""
+        self._loader.join(timeout)
+        return self.native is not None
+
+    def predict_proba(self, X):
+        native = self.native
+        if native is None or len(X) <= self.max_rows:
+            return self.compiled.predict_proba(X)
+        return native.predict_proba(X)
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+class _TableBuilder:
+    """Acumula nós de várias árvores em tabelas únicas com índices absolutos."""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right, self.value = [], [], [], [], []
+        self.roots = []
+        self.n_nodes = 0
+        self.max_depth = 0
+
+    def add_tree(self, feature, threshold, left, right, value):
+        offset = self.n_nodes
+        n = len(feature)
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        leaf = left < 0
+        own = np.arange(n)
+        # Folhas apontam para si mesmas: o percurso vetorizado para nelas naturalmente
+        left = np.where(leaf, own, left) + offset
+        right = np.where(leaf, own, right) + offset
+
+        self.feature.append(np.where(leaf, 0, feature).astype(np.int32))
+        self.threshold.append(np.asarray(threshold, dtype=np.float64))
+        self.left.append(left.astype(np.int32))
+        self.right.append(right.astype(np.int32))
+        self.value.append(np.where(leaf, value, 0.0).astype(np.float64))
+        self.roots.append(offset)
+        self.n_nodes += n
+        self.max_depth = max(self.max_depth, _depth(left - offset, right - offset, leaf))
+
+    def build(self, meta):
+        arrays = {
+            name: np.concatenate(getattr(self, name))
+            for name in ('feature', 'threshold', 'left', 'right', 'value')
+        }
+        arrays['roots'] = np.array(self.roots, dtype=np.int32)
+        meta['max_depth'] = int(self.max_depth)
+        return CompiledEnsemble(arrays, meta)
+
+
+def _depth(left, right, leaf):
+    """Profundidade máxima de uma árvore (raiz no índice 0)."""
+    depth, frontier = 0, np.array([0])
+    while True:
+        frontier = frontier[~leaf[frontier]]
+        if frontier.size == 0:
+            return depth
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        depth += 1
+
+
+def _compile_random_forest(model, builder):
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        proba = tree.value[:, 0, :] / tree.value[:, 0, :].sum(axis=1, keepdims=True)
+        builder.add_tree(tree.feature, tree.threshold, tree.children_left, tree.children_right, proba[:, 1])
+    return {'kind': 'mean_proba', 'decision': 'le', 'input_dtype': 'float32'}
+
+
+def _compile_xgboost(model, builder):
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw(raw_format='json'))
+    learner = dump['learner']
+    trees = learner['gradient_booster']['model']['trees']
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+
+    for tree in trees:
+        left = np.asarray(tree['left_children'])
+        # Nas folhas, 'split_conditions' guarda o valor da folha
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        builder.add_tree(tree['split_indices'], conditions, left, tree['right_children'], conditions)
+
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+    return {
+        'kind': 'logit_sum',
+        'decision': 'lt',
+        'input_dtype': 'float32',
+        'base_margin': float(np.log(base_score / (1.0 - base_score))),
+    }
+
+
+def _compile_lightgbm(model, builder):
+    dump = model.booster_.dump_model()
+    for info in dump['tree_info']:
+        feature, threshold, left, right, value = [], [], [], [], []
+
+        def visit(node):
+            if node.get('decision_type', '<=') != '<=':
+                raise ValueError("Apenas divisões numéricas ('<=') do LightGBM são suportadas.")
+            index = len(feature)
+            feature.append(node.get('split_feature', 0))
+            threshold.append(node.get('threshold', 0.0))
+            left.append(-1)
+            right.append(-1)
+            value.append(node.get('leaf_value', 0.0))
+            if 'leaf_value' not in node:
+                left[index] = visit(node['left_child'])
+                right[index] = visit(node['right_child'])
+            return index
+
+        visit(info['tree_structure'])
+        builder.add_tree(feature, threshold, left, right, value)
+
+    sigmoid = 1.0
+    for token in dump.get('objective', '').split():
+        if token.startswith('sigmoid:'):
+            sigmoid = float(token.split(':')[1])
+    return {'kind': 'logit_sum', 'decision': 'le', 'input_dtype': 'float64', 'sigmoid_scale': sigmoid}
+
+
+def compile_model(model, feature_names=None):
+    """Achata um RandomForestClassifier, XGBClassifier ou LGBMClassifier binário."""
+    if len(model.classes_) != 2:
+        raise ValueError("Apenas classificadores binários são suportados.")
+
+    name = type(model).__name__
+    compilers = {
+        'RandomForestClassifier': _compile_random_forest,
+        'XGBClassifier': _compile_xgboost,
+        'LGBMClassifier': _compile_lightgbm,
+    }
+    if name not in compilers:
+        raise ValueError(f"Modelo não suportado para exportação: {name}")
+
+    builder = _TableBuilder()
+    meta = compilers[name](model, builder)
+    if feature_names is None:
+        feature_names = getattr(model, 'feature_names_in_', None)
+    meta.update({
+        'source': name,
+        'feature_names': [str(f) for f in feature_names],
+        'classes': np.asarray(model.classes_).tolist(),
+        'n_trees': len(builder.roots),
+        'n_nodes': builder.n_nodes,
+    })
+    return builder.build(meta)
+
+
+def verify_parity(model, compiled, X, atol=1e-5):
+    """Compara as probabilidades do modelo original e do compilado; falha se divergirem."""
+    expected = model.predict_proba(X)[:, 1]
+    got = compiled.predict_proba(X)[:, 1]
+    max_diff = float(np.max(np.abs(expected - got))) if len(expected) else 0.0
+    if max_diff > atol:
+        raise ValueError(f"Modelo compilado diverge do original (diferença máxima {max_diff:.2e}).")
+    return max_diff
+
+
+def load_serving_model(pickle_path='models/churn_model.pkl', compiled_path='models/churn_model_compiled',
+                       mmap_mode=None, check=None):
+    """Carrega o modelo para servir.
+
+    CHURN_MODEL_FORMAT controla a escolha:
+    - 'auto' (padrão): se o modelo compilado existir e não for mais antigo que o pickle,
+      usa o compilado até CHURN_COMPILED_MAX_ROWS linhas (padrão 128) e o pickle,
+      carregado em segundo plano, para lotes maiores (`HybridModel`).
+    - 'compiled': apenas o modelo compilado.
+    - 'pickle': carrega o pickle original com joblib.
+
+    Com `mmap_mode='r'`, os arrays são mapeados em memória em vez de copiados.
+    `check(path)`, se informado, é chamado antes de ler cada artefato (ex.: conferência de
+    checksums do registro), então o pickle só é verificado quando for de fato carregado.
+    """
+    model_format = os.getenv('CHURN_MODEL_FORMAT', 'auto')
+    compiled_meta = os.path.join(compiled_path, 'meta.json')
+    use_compiled = model_format == 'compiled' or (
+        model_format == 'auto'
+        and os.path.exists(compiled_meta)
+        and (not os.path.exists(pickle_path)
+             or os.path.getmtime(compiled_meta) >= os.path.getmtime(pickle_path))
+    )
+    if use_compiled:
+        if check:
+            check(compiled_path)
+        compiled = CompiledEnsemble.load(compiled_path, mmap_mode=mmap_mode)
+        if model_format == 'compiled' or not os.path.exists(pickle_path):
+            return compiled
+
+        def load_native():
+            import joblib
+            if check:
+                check(pickle_path)
+            return joblib.load(pickle_path, mmap_mode=mmap_mode)
+        return HybridModel(compiled, load_native)
+
+    import joblib
+    if check:
+        check(pickle_path)
+    return joblib.load(pickle_path, mmap_mode=mmap_mode)
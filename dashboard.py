@@ -6,6 +6,8 @@ Aplicativo Streamlit para upload de dados e visualização de análises de Churn
 Objetivo:
 - Permitir que analistas e gestores explorem as previsões de churn de forma visual.
 - Geração automática de gráficos e insights baseados nos dados enviados.
+- Ajustar o limiar de decisão depois da pontuação: as probabilidades ficam guardadas
+  e as classes são refeitas no novo limiar sem chamar o modelo.
 
 Impacto:
 - Apoia a tomada de decisões estratégicas baseadas em dados.
@@ -13,12 +15,17 @@ Impacto:
 """
 
 
+import os
+
 import streamlit as st
 import pandas as pd
-import joblib
+from model_loader import get_loader
+from inference import DEFAULT_THRESHOLD
+from scoring import PROBABILITY_BINS, rethreshold_csv, score_csv_stream, temp_output_path
 
-# Carregar modelo treinado
-model = joblib.load('models/churn_model.pkl')
+# Carregar modelo treinado em segundo plano enquanto o usuário prepara o upload
+loader = get_loader()
+loader.start()
 
 # Título
 st.title('🔮 Dashboard de Previsão de Churn')
@@ -27,7 +34,9 @@ st.title('🔮 Dashboard de Previsão de Churn')
 st.markdown("""
 ### Como utilizar:
 1. Baixe o arquivo de exemplo clicando no botão abaixo.
-2. Preencha ou edite o arquivo mantendo exatamente as mesmas colunas.
+2. Preencha ou edite o arquivo mantendo exatamente as mesmas colunas
+   (ou envie apenas os campos brutos da sessão: pageviews, timeOnSite, transactions,
+   transactionRevenue, device e traffic_medium — as features são calculadas automaticamente).
 3. Faça upload do arquivo CSV preenchido.
 4. Clique no botão "Prever Churn" para gerar as previsões.
 """)
@@ -68,24 +77,48 @@ st.divider()
 uploaded_file = st.file_uploader("📂 Faça upload do seu arquivo CSV:", type=["csv"])
 
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    # Pré-visualização lê apenas as primeiras linhas; a pontuação é feita em blocos
+    df_preview = pd.read_csv(uploaded_file, nrows=5)
+    uploaded_file.seek(0)
     st.subheader('👀 Pré-visualização dos dados:')
-    st.dataframe(df.head())
+    st.dataframe(df_preview)
 
     if st.button('🚀 Prever Churn'):
-        predictions = model.predict(df)
-        df['churn_prediction'] = predictions
-
-        st.subheader('📊 Resultados da Previsão:')
-        st.dataframe(df[['churn_prediction']].value_counts().rename('Quantidade').reset_index())
+        model = loader.get()
+        output_path = temp_output_path(st.session_state.get('scored_path'))
+        st.session_state['scored_path'] = output_path
+        # file_id muda a cada upload, mesmo com o mesmo nome e tamanho
+        st.session_state['scored_file'] = uploaded_file.file_id
+
+        progress_bar = st.progress(0.0, text='Processando arquivo...')
+        st.session_state['summary'] = score_csv_stream(
+            uploaded_file, model, output_path, progress=progress_bar.progress, transform=loader.transform
+        )
 
-        st.subheader('📋 Dados com Previsão:')
-        st.dataframe(df)
+    # O resultado fica na sessão: mudar o limiar só reclassifica as probabilidades
+    if st.session_state.get('scored_file') == uploaded_file.file_id:
+        output_path = st.session_state['scored_path']
+        threshold = st.slider('🎚️ Limiar de decisão (probabilidade de churn)', 0.0, 1.0,
+                              DEFAULT_THRESHOLD, step=1 / PROBABILITY_BINS)
+        summary = st.session_state['summary'].at(threshold)
 
-        csv_resultado = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Baixar resultados em CSV",
-            data=csv_resultado,
-            file_name='churn_predictions.csv',
-            mime='text/csv'
-        )
+        st.subheader('📊 Resultados da Previsão:')
+        st.dataframe(summary.counts_table())
+
+        st.subheader('📋 Dados com Previsão (amostra):')
+        st.dataframe(summary.sample_frame())
+
+        # Em outro limiar, o CSV é refeito a partir da coluna churn_probability (uma vez por limiar)
+        if summary.threshold != DEFAULT_THRESHOLD:
+            previous_threshold, previous_path = st.session_state.get('rethreshold', (None, None))
+            if previous_threshold != summary.threshold or not os.path.exists(previous_path):
+                previous_path = rethreshold_csv(output_path, temp_output_path(previous_path), summary.threshold)
+                st.session_state['rethreshold'] = (summary.threshold, previous_path)
+            output_path = previous_path
+        with open(output_path, 'rb') as csv_resultado:
+            st.download_button(
+                label="📥 Baixar resultados em CSV",
+                data=csv_resultado,
+                file_name='churn_predictions.csv',
+                mime='text/csv'
+            )
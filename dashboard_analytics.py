@@ -12,6 +12,8 @@ Funcionalidades:
 - Upload de arquivo CSV com colunas específicas para análise (pageviews, timeOnSite, tempo_por_pagina, ticket_medio).
 - Geração de previsões de churn usando o modelo pré-treinado.
 - Exibição de métricas de retenção vs churn.
+- Limiar de decisão ajustável: o arquivo é pontuado uma vez (probabilidades) e as
+  contagens, gráficos e o CSV para download são refeitos no novo limiar sem o modelo.
 - Visualizações gráficas automáticas para facilitar o entendimento dos padrões de comportamento dos usuários.
 
 Impacto:
@@ -26,27 +28,133 @@ Nota:
 
 
 
+import hashlib
+import io
+import os
+
 import streamlit as st
 import pandas as pd
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
+from model_loader import get_loader
+from plot_stats import draw_boxplot
+from inference import DEFAULT_THRESHOLD
+from scoring import PROBABILITY_BINS, output_path_for, prune_outputs, rethreshold_csv, score_csv_stream
+
+# Limites dos caches (evitam crescimento sem limite em pods de longa duração)
+CACHE_TTL = int(os.getenv('CHURN_DASHBOARD_CACHE_TTL', '3600'))
+CACHE_MAX_ENTRIES = int(os.getenv('CHURN_DASHBOARD_CACHE_MAX_ENTRIES', '8'))
 
 # Configurações iniciais
 st.set_page_config(page_title="Dashboard Churn", layout="wide")
-sns.set_style("whitegrid")
 
 # Título principal
 st.title('🔮 Dashboard de Previsão e Análise de Churn')
 
-# Carregar modelo
-model = joblib.load('models/churn_model.pkl')
+# Carregar modelo em segundo plano (a página é exibida sem esperar por ele)
+get_loader().start()
+
+def versao_modelo():
+    """Versão do modelo em produção (aguarda o carregamento inicial), já em cache."""
+    loader = get_loader()
+    loader.get()
+    # Modelo, transformação e versão lidos juntos, mesmo durante uma troca
+    snapshot = loader.snapshot()
+    carregar_modelo(snapshot[2], snapshot)
+    return snapshot[2]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def carregar_modelo(model_version, _snapshot=None):
+    """Modelo e transformação de uma versão, compartilhados por todas as sessões do dashboard.
+
+    Chaveado pela versão: depois de uma troca no registro, a próxima execução usa o novo
+    modelo em vez do que ficou em cache.
+    """
+    model, transform, _ = _snapshot or get_loader().snapshot()
+    return model, transform
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ler_previa(file_hash, _uploaded_file):
+    previa = pd.read_csv(_uploaded_file, nrows=5)
+    _uploaded_file.seek(0)
+    return previa
+
+# cache_resource: o resumo (faixas de probabilidade e distribuições) é somente leitura e
+# fica compartilhado, sem ser serializado e copiado a cada rerun; `summary.at()` devolve
+# uma visão em outro limiar sem alterar o objeto em cache
+@st.cache_resource(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def pontuar_arquivo(file_hash, model_version, _uploaded_file, _progress=None):
+    """Previsões e agregados de um arquivo, chaveados pelo hash do conteúdo e versão do modelo."""
+    model, transform = carregar_modelo(model_version)
+    output_path = output_path_for(f'{file_hash[:16]}_{model_version}')
+    summary = score_csv_stream(_uploaded_file, model, output_path, progress=_progress, transform=transform)
+    _uploaded_file.seek(0)
+    prune_outputs(CACHE_MAX_ENTRIES)
+    return summary, output_path
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def reclassificar_arquivo(file_hash, model_version, threshold, _output_path):
+    """CSV pontuado com as classes em outro limiar, a partir das probabilidades já gravadas."""
+    return rethreshold_csv(_output_path, output_path_for(f'{file_hash[:16]}_{model_version}_t{threshold:.2f}'),
+                           threshold)
+
+def _png(fig):
+    import matplotlib.pyplot as plt
+    buffer = io.BytesIO()
+    fig.tight_layout()
+    fig.savefig(buffer, format='png', dpi=110)
+    plt.close(fig)
+    return buffer.getvalue()
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def gerar_graficos(file_hash, model_version, threshold, _summary):
+    """Renderiza os gráficos uma única vez por arquivo/modelo/limiar e devolve as imagens PNG."""
+    # Bibliotecas de gráficos só são importadas quando a análise é pedida
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style("whitegrid")
+
+    # Os gráficos são desenhados só a partir de resumos (contagens, quartis, bigodes e
+    # uma amostra limitada de outliers), então o tempo não cresce com o tamanho do arquivo
+    figuras = {}
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    sns.barplot(x='churn_prediction', y='Quantidade', data=_summary.counts_table(), palette='pastel', ax=ax)
+    ax.set_xlabel('Churn Prediction (0 = Permanece, 1 = Churn)', fontsize=12)
+    ax.set_ylabel('Contagem', fontsize=12)
+    ax.set_title('Distribuição de Clientes - Churn vs Permanência', fontsize=16)
+    figuras['distribuicao'] = _png(fig)
+
+    churn_percent = _summary.churn_percent()
+    fig_pie, ax_pie = plt.subplots(figsize=(4, 4))
+    ax_pie.pie([100 - churn_percent, churn_percent],
+               labels=['Permanecer', 'Churn'],
+               autopct='%1.1f%%',
+               colors=['#90ee90', '#ff9999'],
+               startangle=90,
+               explode=(0, 0.1))
+    ax_pie.axis('equal')
+    figuras['pizza'] = _png(fig_pie)
+
+    boxplots = [
+        ('tempo', 'timeOnSite', 'Tempo no Site', 'Set2', (5, 3.5)),
+        ('pageviews', 'pageviews', 'Pageviews', 'Set2', (5, 3.5)),
+        ('ticket', 'ticket_medio', 'Ticket Médio (R$)', 'Set3', (6, 4)),
+    ]
+    for nome, coluna, rotulo, paleta, tamanho in boxplots:
+        fig_box, ax_box = plt.subplots(figsize=tamanho)
+        draw_boxplot(ax_box, _summary.distributions, coluna, colors=sns.color_palette(paleta))
+        ax_box.set_xlabel('Churn Prediction')
+        ax_box.set_ylabel(rotulo)
+        figuras[nome] = _png(fig_box)
+
+    return figuras
 
 # Instruções de uso
 st.markdown("""
 ### 📋 Como utilizar:
 1. Baixe o exemplo de CSV no botão abaixo.
-2. Preencha ou edite mantendo as mesmas colunas.
+2. Preencha ou edite mantendo as mesmas colunas (ou envie apenas os campos brutos da sessão).
 3. Faça upload do seu arquivo CSV.
 4. Clique no botão para prever churn e analisar!
 """)
@@ -83,14 +191,34 @@ st.divider()
 uploaded_file = st.file_uploader("📂 Faça upload do seu arquivo CSV:", type=["csv"])
 
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    # Hash do conteúdo: chave dos caches de pré-visualização, previsões e gráficos
+    file_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
 
     st.subheader('👀 Pré-visualização dos Dados:')
-    st.dataframe(df.head())
+    st.dataframe(ler_previa(file_hash, uploaded_file))
 
+    # A análise permanece visível entre reruns até que outro arquivo seja enviado
     if st.button('🚀 Prever Churn e Analisar'):
-        predictions = model.predict(df)
-        df['churn_prediction'] = predictions
+        st.session_state['analisado'] = file_hash
+
+    if st.session_state.get('analisado') == file_hash:
+        model_version = versao_modelo()
+        progress_bar = st.progress(0.0, text='Processando arquivo...')
+        summary, output_path = pontuar_arquivo(file_hash, model_version, uploaded_file, progress_bar.progress)
+        if not os.path.exists(output_path):
+            # Resultado em disco removido pela limpeza: descarta só a entrada deste arquivo
+            # (mesma chave: hash e versão) e pontua novamente
+            pontuar_arquivo.clear(file_hash, model_version, uploaded_file)
+            summary, output_path = pontuar_arquivo(file_hash, model_version, uploaded_file, progress_bar.progress)
+        progress_bar.empty()
+
+        # Reclassificação instantânea: as contagens e distribuições por faixa de
+        # probabilidade já estão no resumo, então mudar o limiar não chama o modelo
+        threshold = st.slider('🎚️ Limiar de decisão (probabilidade de churn)', 0.0, 1.0,
+                              DEFAULT_THRESHOLD, step=1 / PROBABILITY_BINS)
+        scored_path = output_path
+        summary = summary.at(threshold)
+        figuras = gerar_graficos(file_hash, model_version, summary.threshold, summary)
 
         st.success('✅ Previsões realizadas com sucesso! Veja abaixo os resultados.')
 
@@ -102,27 +230,12 @@ if uploaded_file is not None:
         col1, col2 = st.columns([2, 1])
 
         with col1:
-            fig, ax = plt.subplots(figsize=(6, 4))
-            sns.countplot(x='churn_prediction', data=df, palette='pastel', ax=ax)
-            ax.set_xlabel('Churn Prediction (0 = Permanece, 1 = Churn)', fontsize=12)
-            ax.set_ylabel('Contagem', fontsize=12)
-            ax.set_title('Distribuição de Clientes - Churn vs Permanência', fontsize=16)
-            fig.tight_layout()
-            st.pyplot(fig, use_container_width=True)
+            st.image(figuras['distribuicao'], use_container_width=True)
 
         with col2:
-            churn_percent = (df['churn_prediction'].sum() / df.shape[0]) * 100
+            churn_percent = summary.churn_percent()
             stay_percent = 100 - churn_percent
-
-            fig_pie, ax_pie = plt.subplots(figsize=(4, 4))
-            ax_pie.pie([stay_percent, churn_percent],
-                       labels=['Permanecer', 'Churn'],
-                       autopct='%1.1f%%',
-                       colors=['#90ee90', '#ff9999'],
-                       startangle=90,
-                       explode=(0, 0.1))
-            ax_pie.axis('equal')
-            st.pyplot(fig_pie, use_container_width=True)
+            st.image(figuras['pizza'], use_container_width=True)
 
         st.divider()
 
@@ -142,53 +255,38 @@ if uploaded_file is not None:
 
         with col3:
             st.subheader('Tempo no site (segundos)')
-            fig1, ax1 = plt.subplots(figsize=(5, 3.5))
-            sns.boxplot(x='churn_prediction', y='timeOnSite', data=df, palette='Set2', ax=ax1)
-            ax1.set_xlabel('Churn Prediction')
-            ax1.set_ylabel('Tempo no Site')
-            fig1.tight_layout()
-            st.pyplot(fig1, use_container_width=True)
+            st.image(figuras['tempo'], use_container_width=True)
 
         with col4:
             st.subheader('Número de Pageviews')
-            fig2, ax2 = plt.subplots(figsize=(5, 3.5))
-            sns.boxplot(x='churn_prediction', y='pageviews', data=df, palette='Set2', ax=ax2)
-            ax2.set_xlabel('Churn Prediction')
-            ax2.set_ylabel('Pageviews')
-            fig2.tight_layout()
-            st.pyplot(fig2, use_container_width=True)
+            st.image(figuras['pageviews'], use_container_width=True)
 
         st.subheader('Ticket Médio por Grupo')
-        fig3, ax3 = plt.subplots(figsize=(6, 4))
-        sns.boxplot(x='churn_prediction', y='ticket_medio', data=df, palette='Set3', ax=ax3)
-        ax3.set_xlabel('Churn Prediction')
-        ax3.set_ylabel('Ticket Médio (R$)')
-        fig3.tight_layout()
-        st.pyplot(fig3, use_container_width=True)
-
-        churn_group = df.groupby('churn_prediction').agg({
-            'timeOnSite': 'mean',
-            'pageviews': 'mean',
-            'ticket_medio': 'mean'
-        }).reset_index()
+        st.image(figuras['ticket'], use_container_width=True)
 
         st.markdown(f"""
         ### 📋 Análises Detalhadas:
-        - Permanência: tempo médio no site de **{churn_group.loc[churn_group['churn_prediction'] == 0, 'timeOnSite'].values[0]:.2f} segundos**.
-        - Churn: tempo médio no site de **{churn_group.loc[churn_group['churn_prediction'] == 1, 'timeOnSite'].values[0]:.2f} segundos**.
-        - Permanência: média de **{churn_group.loc[churn_group['churn_prediction'] == 0, 'pageviews'].values[0]:.2f} pageviews**.
-        - Churn: média de **{churn_group.loc[churn_group['churn_prediction'] == 1, 'pageviews'].values[0]:.2f} pageviews**.
-        - Permanência: ticket médio de **R$ {churn_group.loc[churn_group['churn_prediction'] == 0, 'ticket_medio'].values[0]:.2f}**.
-        - Churn: ticket médio de **R$ {churn_group.loc[churn_group['churn_prediction'] == 1, 'ticket_medio'].values[0]:.2f}**.
+        - Permanência: tempo médio no site de **{summary.mean(0, 'timeOnSite'):.2f} segundos**.
+        - Churn: tempo médio no site de **{summary.mean(1, 'timeOnSite'):.2f} segundos**.
+        - Permanência: média de **{summary.mean(0, 'pageviews'):.2f} pageviews**.
+        - Churn: média de **{summary.mean(1, 'pageviews'):.2f} pageviews**.
+        - Permanência: ticket médio de **R$ {summary.mean(0, 'ticket_medio'):.2f}**.
+        - Churn: ticket médio de **R$ {summary.mean(1, 'ticket_medio'):.2f}**.
         """, unsafe_allow_html=True)
 
         st.divider()
 
-        # Baixar arquivo
-        csv_resultado = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Baixar Dados com Previsão e Análise",
-            data=csv_resultado,
-            file_name='churn_predictions_analise.csv',
-            mime='text/csv'
-        )
+        # Baixar arquivo (gravado em disco bloco a bloco durante a pontuação); em outro
+        # limiar, as classes são refeitas a partir da coluna churn_probability
+        if summary.threshold != DEFAULT_THRESHOLD:
+            output_path = reclassificar_arquivo(file_hash, model_version, summary.threshold, scored_path)
+            if not os.path.exists(output_path):
+                reclassificar_arquivo.clear(file_hash, model_version, summary.threshold, scored_path)
+                output_path = reclassificar_arquivo(file_hash, model_version, summary.threshold, scored_path)
+        with open(output_path, 'rb') as csv_resultado:
+            st.download_button(
+                label="📥 Baixar Dados com Previsão e Análise",
+                data=csv_resultado,
+                file_name='churn_predictions_analise.csv',
+                mime='text/csv'
+            )
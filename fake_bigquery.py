@@ -0,0 +1,120 @@
+"""
+fake_bigquery.py
+-----------------
+Substituto local, em memória, do cliente do BigQuery para rodar o pipeline sem GCP.
+
+Responde às consultas emitidas por `fetch_data.py`:
+- metadados das tabelas diárias (`__TABLES__`);
+- sessões de um intervalo de `_TABLE_SUFFIX`.
+
+O resultado de cada consulta fica registrado como um job (`get_job`) com tabela de
+destino, lida em páginas por `list_rows(..., start_index, page_size)`, como no modo de
+streaming de fetch_data.py. `fail_after_pages` interrompe a leitura com `ConnectionError`
+após N páginas, para simular uma queda no meio do download.
+
+Uso:
+    client = FakeBigQueryClient(sessions)   # DataFrame no esquema de fetch_data.py
+    fetch_partitions(client=client)
+    client.touch('20170101')                # simula a atualização de uma partição
+"""
+
+
+
+import re
+
+import pandas as pd
+
+_BETWEEN_SUFFIX = re.compile(r"_TABLE_SUFFIX BETWEEN '(\d{8})' AND '(\d{8})'")
+_BETWEEN_TABLES = re.compile(r"table_id BETWEEN 'ga_sessions_(\d{8})' AND 'ga_sessions_(\d{8})'")
+
+
+class FakeRowIterator:
+    """Páginas de um resultado, com a interface usada do `RowIterator` real."""
+
+    def __init__(self, df, start_index=0, page_size=None, fail_after_pages=None):
+        self._df = df
+        self.start_index = start_index
+        self.page_size = page_size or max(len(df), 1)
+        self.total_rows = len(df)
+        self.fail_after_pages = fail_after_pages
+
+    def to_dataframe_iterable(self, **kwargs):
+        for page, start in enumerate(range(self.start_index, self.total_rows, self.page_size)):
+            if self.fail_after_pages is not None and page >= self.fail_after_pages:
+                raise ConnectionError("Conexão interrompida (simulada pelo cliente falso).")
+            yield self._df.iloc[start:start + self.page_size].reset_index(drop=True)
+
+    def to_dataframe(self, **kwargs):
+        return self._df.iloc[self.start_index:].reset_index(drop=True)
+
+
+class FakeQueryJob:
+    """Resultado de uma consulta, com a mesma interface usada do `QueryJob` real."""
+
+    def __init__(self, df, job_id=None):
+        self._df = df
+        self.job_id = job_id
+        self.destination = f'fake._anon.{job_id}'
+        self.state = 'DONE'
+
+    def result(self, page_size=None, **kwargs):
+        return FakeRowIterator(self._df, page_size=page_size)
+
+    def to_dataframe(self, **kwargs):
+        return self._df.copy()
+
+
+class FakeBigQueryClient:
+    """Cliente falso que serve sessões de um DataFrame, particionadas pela coluna `date`."""
+
+    def __init__(self, sessions, modified=None, fail_after_pages=None):
+        self.sessions = sessions.assign(date=sessions['date'].astype(str))
+        suffixes = sorted(self.sessions['date'].unique())
+        self.modified = dict(modified or {suffix: 1 for suffix in suffixes})
+        self.fail_after_pages = fail_after_pages
+        self.queries = []
+        self.jobs = {}
+
+    def touch(self, suffix):
+        """Marca uma partição como modificada (nova data de modificação)."""
+        self.modified[suffix] = self.modified.get(suffix, 0) + 1
+
+    def get_job(self, job_id, **kwargs):
+        if job_id not in self.jobs:
+            raise LookupError(f"Job não encontrado: {job_id}")
+        return self.jobs[job_id]
+
+    def list_rows(self, table, start_index=0, page_size=None, **kwargs):
+        job = next((job for job in self.jobs.values() if job.destination == table), None)
+        if job is None:
+            raise LookupError(f"Tabela não encontrada: {table}")
+        return FakeRowIterator(job._df, start_index, page_size, self.fail_after_pages)
+
+    def _job(self, df):
+        job = FakeQueryJob(df, job_id=f'fake_job_{len(self.jobs)}')
+        self.jobs[job.job_id] = job
+        return job
+
+    def query(self, sql, job_config=None):
+        self.queries.append(sql)
+
+        match = _BETWEEN_TABLES.search(sql)
+        if '__TABLES__' in sql and match:
+            start, end = match.groups()
+            suffixes = [s for s in sorted(self.modified) if start <= s <= end]
+            counts = self.sessions['date'].value_counts()
+            return self._job(pd.DataFrame({
+                'table_id': [f'ga_sessions_{s}' for s in suffixes],
+                'last_modified_time': [self.modified[s] for s in suffixes],
+                'row_count': [int(counts.get(s, 0)) for s in suffixes],
+            }))
+
+        match = _BETWEEN_SUFFIX.search(sql)
+        if match:
+            start, end = match.groups()
+            mask = self.sessions['date'].between(start, end)
+            if 'pageviews IS NOT NULL' in sql:
+                mask &= self.sessions['pageviews'].notna()
+            return self._job(self.sessions[mask].reset_index(drop=True))
+
+        raise NotImplementedError(f"Consulta não suportada pelo cliente falso: {sql}")
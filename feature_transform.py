@@ -0,0 +1,145 @@
+"""
+feature_transform.py
+---------------------
+Transformação de atributos compartilhada entre treino (process_data.py) e serviço
+(app.py e dashboards).
+
+Objetivo:
+- Calcular, de forma vetorizada e apenas com NumPy, as 12 features do modelo a partir
+  dos campos brutos da sessão (pageviews, timeOnSite, transactions,
+  transactionRevenue, device, traffic_medium).
+- Guardar os limiares aprendidos no treino (ex.: mediana de `ticket_medio` usada em
+  `cliente_ticket_alto`) em 'models/feature_transform.json', ao lado do modelo.
+
+Impacto:
+- Clientes da API e dos dashboards podem enviar apenas os campos brutos; o mesmo código
+  gera as features no treino e no serviço, sem divergências nem perda do limiar de treino.
+"""
+
+
+
+import json
+
+import numpy as np
+
+from inference import FEATURES
+
+TRANSFORM_PATH = 'models/feature_transform.json'
+
+# Campos brutos da sessão (saída de fetch_data.py) consumidos pela transformação
+RAW_FIELDS = ('pageviews', 'timeOnSite', 'transactions', 'transactionRevenue', 'device', 'traffic_medium')
+
+
+def _numeric(raw, name, dtype=np.float64):
+    """Coluna numérica com nulos (NaN/None) tratados como zero."""
+    return np.nan_to_num(np.asarray(raw[name], dtype=np.float64), nan=0.0).astype(dtype, copy=False)
+
+
+def _equals(raw, name, value):
+    """Flag int8 de igualdade; em colunas categóricas do pandas compara apenas os códigos."""
+    column = raw[name]
+    if isinstance(column, (list, tuple)):
+        column = np.asarray(column, dtype=object)
+    return np.asarray(column == value, dtype=np.int8)
+
+
+class FeatureTransform:
+    """Transformação campos brutos -> features do modelo, com limiares ajustados no treino."""
+
+    def __init__(self, ticket_medio_threshold=None, low_engagement_pageviews=2, fast_visitor_seconds=5.0):
+        self.ticket_medio_threshold = ticket_medio_threshold
+        self.low_engagement_pageviews = low_engagement_pageviews
+        self.fast_visitor_seconds = fast_visitor_seconds
+
+    def fit(self, raw):
+        """Aprende o limiar de `cliente_ticket_alto` (mediana do ticket médio no treino)."""
+        revenue = _numeric(raw, 'transactionRevenue')
+        transactions = _numeric(raw, 'transactions', np.int32)
+        return self.fit_ticket_medio(revenue / (transactions + 1))
+
+    def fit_ticket_medio(self, ticket_medio):
+        """Ajusta o limiar diretamente a partir da coluna `ticket_medio` já calculada."""
+        self.ticket_medio_threshold = float(np.median(np.asarray(ticket_medio, dtype=np.float64)))
+        return self
+
+    def base_columns(self, raw):
+        """Features que não dependem de limiares ajustados (todas exceto `cliente_ticket_alto`).
+
+        Permite processar partições de forma independente e aplicar o limiar global depois.
+        """
+        pageviews = _numeric(raw, 'pageviews', np.int32)
+        time_on_site = _numeric(raw, 'timeOnSite')
+        transactions = _numeric(raw, 'transactions', np.int32)
+        revenue = _numeric(raw, 'transactionRevenue')
+
+        tempo_por_pagina = time_on_site / (pageviews + 1)
+        ticket_medio = revenue / (transactions + 1)
+
+        return {
+            'pageviews': pageviews,
+            'timeOnSite': time_on_site,
+            'tempo_por_pagina': tempo_por_pagina,
+            'ticket_medio': ticket_medio,
+            'engajamento_baixo': (pageviews <= self.low_engagement_pageviews).astype(np.int8),
+            'visitante_rapido': (tempo_por_pagina <= self.fast_visitor_seconds).astype(np.int8),
+            'device_mobile': _equals(raw, 'device', 'mobile'),
+            'device_tablet': _equals(raw, 'device', 'tablet'),
+            'device_desktop': _equals(raw, 'device', 'desktop'),
+            'via_organica': _equals(raw, 'traffic_medium', 'organic'),
+            'via_pago': _equals(raw, 'traffic_medium', 'cpc'),
+        }
+
+    def ticket_flag(self, ticket_medio):
+        """Flag `cliente_ticket_alto` com o limiar aprendido no treino."""
+        if self.ticket_medio_threshold is None:
+            raise ValueError("FeatureTransform precisa ser ajustado (fit) ou carregado antes do uso.")
+        return (np.asarray(ticket_medio) > self.ticket_medio_threshold).astype(np.int8)
+
+    def transform_columns(self, raw):
+        """Dicionário feature -> array, na ordem de treino. Aceita DataFrame ou dict de colunas."""
+        columns = self.base_columns(raw)
+        columns['cliente_ticket_alto'] = self.ticket_flag(columns['ticket_medio'])
+        return {name: columns[name] for name in FEATURES}
+
+    def transform_matrix(self, raw, dtype=np.float64):
+        """Matriz (n_amostras x 12) pronta para o modelo, sem pandas."""
+        columns = self.transform_columns(raw)
+        n_rows = len(columns['pageviews'])
+        X = np.empty((n_rows, len(FEATURES)), dtype=dtype)
+        for i, name in enumerate(FEATURES):
+            X[:, i] = columns[name]
+        return X
+
+    def transform(self, raw):
+        """DataFrame com as 12 features, na ordem de treino."""
+        import pandas as pd
+        return pd.DataFrame(self.transform_columns(raw), columns=list(FEATURES))
+
+    def ensure_features(self, df):
+        """Completa um DataFrame com as features, caso ele traga apenas os campos brutos."""
+        if all(name in df.columns for name in FEATURES):
+            return df
+        if not all(name in df.columns for name in RAW_FIELDS):
+            missing = [name for name in RAW_FIELDS if name not in df.columns]
+            raise ValueError(f"Arquivo sem as features do modelo nem os campos brutos: {missing}")
+        return df.assign(**self.transform_columns(df))
+
+    def to_dict(self):
+        return {
+            'ticket_medio_threshold': self.ticket_medio_threshold,
+            'low_engagement_pageviews': self.low_engagement_pageviews,
+            'fast_visitor_seconds': self.fast_visitor_seconds,
+            'features': list(FEATURES),
+        }
+
+    def save(self, path=TRANSFORM_PATH):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path=TRANSFORM_PATH):
+        with open(path) as f:
+            params = json.load(f)
+        if params.pop('features') != list(FEATURES):
+            raise ValueError("Transformação salva com features diferentes das esperadas.")
+        return cls(**params)
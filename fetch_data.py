@@ -1,13 +1,43 @@
-from google.cloud import bigquery
-import pandas as pd
+"""
+fetch_data.py
+--------------
+Extração das sessões do Google Analytics (BigQuery público) para o pipeline de churn.
 
-def fetch_bigquery_data():
-    # Cria o cliente do BigQuery
-    client = bigquery.Client()
+Modos:
+- Arquivo único (padrão): todo o intervalo em 'data/ga_sessions_sample.parquet', com o
+  esquema explícito de `storage.RAW_SCHEMA` (--csv exporta também uma cópia em CSV).
+- Streaming (--stream): o resultado é lido em páginas (`list_rows`) e cada página é
+  gravada em um arquivo Parquet próprio assim que chega, então o pico de memória depende
+  do tamanho da página e não do total de linhas. Um checkpoint (job + linhas gravadas)
+  permite retomar o download após uma interrupção; no fim, as partes são unidas em
+  'data/ga_sessions_sample.parquet'.
+- Particionado (--partitioned): uma partição por dia (`_TABLE_SUFFIX`), gravada em
+  Parquet em 'data/raw/ga_sessions_YYYYMMDD.parquet'. Um manifesto guarda a data de
+  modificação de cada tabela diária, e novas execuções só baixam as partições que mudaram.
 
-    # Query SQL
-    query = """
-      SELECT
+O cliente do BigQuery pode ser injetado (ex.: `fake_bigquery.FakeBigQueryClient`),
+permitindo testar o fluxo sem acesso ao GCP.
+"""
+
+
+
+import argparse
+import json
+import glob
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from fileio import write_json
+from storage import MANIFEST_NAME, RAW_DIR, RAW_PATH, RAW_SCHEMA, merge_parquet, read_table, write_table
+
+DATASET = 'bigquery-public-data.google_analytics_sample'
+START_DATE = '20160801'
+END_DATE = '20180131'
+CHECKPOINT_NAME = '_checkpoint.json'
+PAGE_SIZE = 100_000
+
+COLUMNS_SQL = """
         fullVisitorId,
         visitId,
         date,
@@ -19,23 +49,211 @@ def fetch_bigquery_data():
         totals.pageviews,
         totals.timeOnSite,
         totals.transactions,
-        totals.transactionRevenue
+        totals.transactionRevenue"""
+
+# Metadados das tabelas diárias (uma única consulta para todas as partições)
+TABLES_QUERY = """
+      SELECT table_id, last_modified_time, row_count
+      FROM `{dataset}.__TABLES__`
+      WHERE table_id BETWEEN 'ga_sessions_{start}' AND 'ga_sessions_{end}'
+"""
+
+
+def get_client():
+    """Cria o cliente real do BigQuery (importado apenas quando necessário)."""
+    from google.cloud import bigquery
+    return bigquery.Client()
+
+
+def _check_suffix(suffix):
+    if not (len(suffix) == 8 and suffix.isdigit()):
+        raise ValueError(f"Sufixo de tabela inválido: {suffix!r} (esperado YYYYMMDD)")
+    return suffix
+
+
+def sessions_query(start, end):
+    """Query SQL das sessões entre dois sufixos de tabela (inclusive)."""
+    return f"""
+      SELECT
+{COLUMNS_SQL}
       FROM
-        `bigquery-public-data.google_analytics_sample.ga_sessions_*`
+        `{DATASET}.ga_sessions_*`
       WHERE
-        _TABLE_SUFFIX BETWEEN '20160801' AND '20180131'
+        _TABLE_SUFFIX BETWEEN '{_check_suffix(start)}' AND '{_check_suffix(end)}'
         AND totals.pageviews IS NOT NULL
     """
 
+
+def fetch_bigquery_data(client=None, path=RAW_PATH, csv=False, start=START_DATE, end=END_DATE):
+    # Cria o cliente do BigQuery
+    client = client or get_client()
+
     # Executa a query
-    query_job = client.query(query)
+    query_job = client.query(sessions_query(start, end))
 
     # Resultado
     df = query_job.to_dataframe()
 
-    # Salva em CSV
-    df.to_csv("data/ga_sessions_sample.csv", index=False)
-    print("Arquivo salvo em: data/ga_sessions_sample.csv")
+    # Salva em Parquet (e, opcionalmente, em CSV)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_table(df, path, RAW_SCHEMA, csv=csv)
+    print(f"Arquivo salvo em: {path}")
+
+
+def _part_path(parts_dir, part):
+    return os.path.join(parts_dir, f'part-{part:05d}.parquet')
+
+
+def _resume_job(client, parts_dir, start, end):
+    """Job e checkpoint de um download interrompido, se ainda for possível retomá-lo."""
+    checkpoint_path = os.path.join(parts_dir, CHECKPOINT_NAME)
+    if not os.path.exists(checkpoint_path):
+        return None, {'rows_written': 0, 'parts': 0}
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    # Checkpoints sem intervalo são do intervalo padrão
+    previous = (checkpoint.get('start', START_DATE), checkpoint.get('end', END_DATE))
+    if previous != (start, end):
+        print(f"Download interrompido de outro intervalo ({previous[0]}-{previous[1]}); reiniciando o download.")
+        return None, {'rows_written': 0, 'parts': 0}
+    try:
+        # A tabela temporária com o resultado da consulta expira (cerca de 24 h no BigQuery)
+        job = client.get_job(checkpoint['job_id'])
+    except Exception as exc:
+        print(f"Não foi possível retomar o job {checkpoint['job_id']} ({exc}); reiniciando o download.")
+        return None, {'rows_written': 0, 'parts': 0}
+    return job, checkpoint
+
+
+def fetch_bigquery_stream(client=None, path=RAW_PATH, page_size=PAGE_SIZE, csv=False, start=START_DATE,
+                          end=END_DATE):
+    """Baixa o resultado em páginas, gravando cada uma em disco assim que chega.
+
+    As partes ficam em '<path>.parts/' junto com o checkpoint; uma nova chamada após uma
+    interrupção, com o mesmo intervalo de datas, continua da primeira linha ainda não
+    gravada (`list_rows(start_index=...)`).
+    """
+    client = client or get_client()
+    parts_dir = path + '.parts'
+
+    job, checkpoint = _resume_job(client, parts_dir, start, end)
+    rows_written, part = checkpoint['rows_written'], checkpoint['parts']
+    if job is None:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        job = client.query(sessions_query(start, end))
+        job.result()
+    else:
+        print(f"Retomando o job {job.job_id} a partir da linha {rows_written}.")
+    os.makedirs(parts_dir, exist_ok=True)
+
+    # Partes gravadas depois do último checkpoint serão baixadas de novo
+    for stale in glob.glob(os.path.join(parts_dir, 'part-*.parquet')):
+        if stale >= _part_path(parts_dir, part):
+            os.remove(stale)
+
+    checkpoint_path = os.path.join(parts_dir, CHECKPOINT_NAME)
+    rows = client.list_rows(job.destination, start_index=rows_written, page_size=page_size)
+    for page in rows.to_dataframe_iterable():
+        page['fullVisitorId'] = page['fullVisitorId'].astype(str)
+        write_table(page, _part_path(parts_dir, part), RAW_SCHEMA)
+        part += 1
+        rows_written += len(page)
+        # O checkpoint só avança depois que a parte foi gravada por completo
+        write_json(checkpoint_path, {'job_id': job.job_id, 'rows_written': rows_written, 'parts': part,
+                                     'start': start, 'end': end}, indent=2, sort_keys=True)
+        print(f"Linhas gravadas: {rows_written}/{rows.total_rows}")
+
+    # Une as partes, uma por vez, no arquivo final
+    parts = [_part_path(parts_dir, i) for i in range(part)]
+    merge_parquet(parts, path, RAW_SCHEMA)
+    if csv:
+        csv_path = os.path.splitext(path)[0] + '.csv'
+        for i, part_path in enumerate(parts):
+            read_table(part_path).to_csv(csv_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    shutil.rmtree(parts_dir)
+    print(f"Arquivo salvo em: {path} ({rows_written} linhas)")
+    return path
+
+
+def list_partitions(client, start=START_DATE, end=END_DATE):
+    """Sufixo (YYYYMMDD) -> última modificação da tabela diária, no intervalo pedido."""
+    query = TABLES_QUERY.format(dataset=DATASET, start=_check_suffix(start), end=_check_suffix(end))
+    tables = client.query(query).to_dataframe()
+    return {
+        table_id[-8:]: int(modified)
+        for table_id, modified in zip(tables['table_id'], tables['last_modified_time'])
+    }
+
+
+def partition_path(suffix, out_dir=RAW_DIR):
+    return os.path.join(out_dir, f'ga_sessions_{suffix}.parquet')
+
+
+def fetch_partition(client, suffix, out_dir=RAW_DIR):
+    """Baixa uma partição diária e grava em Parquet (escrita atômica)."""
+    df = client.query(sessions_query(suffix, suffix)).to_dataframe()
+    df['fullVisitorId'] = df['fullVisitorId'].astype(str)
+    return write_table(df, partition_path(suffix, out_dir), RAW_SCHEMA)
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(directory, manifest):
+    write_json(os.path.join(directory, MANIFEST_NAME), manifest, indent=2, sort_keys=True)
+
+
+def fetch_partitions(client=None, start=START_DATE, end=END_DATE, out_dir=RAW_DIR, workers=8):
+    """Baixa apenas as partições novas ou modificadas desde a última execução."""
+    client = client or get_client()
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = load_manifest(out_dir)
+    partitions = list_partitions(client, start, end)
+    changed = sorted(
+        suffix for suffix, modified in partitions.items()
+        if manifest.get(suffix) != modified or not os.path.exists(partition_path(suffix, out_dir))
+    )
+    print(f"Partições no intervalo: {len(partitions)} | a baixar: {len(changed)}")
+
+    # Download é limitado por I/O: threads bastam para paralelizar as consultas
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {suffix: pool.submit(fetch_partition, client, suffix, out_dir) for suffix in changed}
+        for suffix, future in futures.items():
+            future.result()
+            manifest[suffix] = partitions[suffix]
+            save_manifest(out_dir, manifest)
+
+    print(f"Partições salvas em: {out_dir}")
+    return changed
+
 
 if __name__ == "__main__":
-    fetch_bigquery_data()
+    parser = argparse.ArgumentParser(description="Extração das sessões do GA no BigQuery.")
+    parser.add_argument('--partitioned', action='store_true', help="Baixa partições diárias em Parquet.")
+    parser.add_argument('--start', default=START_DATE, help="Primeiro dia (YYYYMMDD), em todos os modos.")
+    parser.add_argument('--end', default=END_DATE, help="Último dia (YYYYMMDD), em todos os modos.")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--stream', action='store_true',
+                        help="Baixa o resultado em páginas, com memória constante e retomada após falhas.")
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--csv', action='store_true',
+                        help="Exporta também uma cópia em CSV (modos arquivo único e streaming; não vale com --partitioned).")
+    args = parser.parse_args()
+    # Combinações que o modo particionado ignoraria em silêncio
+    if args.partitioned and args.csv:
+        parser.error("--csv não é suportado com --partitioned (as partições são gravadas só em Parquet).")
+    if args.partitioned and args.stream:
+        parser.error("--partitioned e --stream são modos alternativos; escolha um.")
+
+    if args.partitioned:
+        fetch_partitions(start=args.start, end=args.end, workers=args.workers)
+    elif args.stream:
+        fetch_bigquery_stream(page_size=args.page_size, csv=args.csv, start=args.start, end=args.end)
+    else:
+        fetch_bigquery_data(csv=args.csv, start=args.start, end=args.end)
@@ -0,0 +1,45 @@
+"""
+fileio.py
+----------
+Utilitários de arquivo compartilhados pelo pipeline, pela API e pelo registro de modelos.
+
+Objetivo:
+- Gravar arquivos pequenos (manifestos, checkpoints, ponteiros como LATEST e CURRENT,
+  relatórios de workers) de forma atômica: temporário no mesmo diretório + `os.replace`,
+  então leitores nunca veem um arquivo pela metade.
+- Assinatura barata de um arquivo (tamanho + mtime) para detectar partições alteradas.
+
+Impacto:
+- Só usa a biblioteca padrão: pode ser importado no caminho da API sem carregar pandas
+  ou pyarrow (ver `storage.py` para os formatos de dados).
+"""
+
+
+
+import json
+import os
+
+
+def write_text(path, text):
+    """Grava `text` em `path` de forma atômica."""
+    # Temporário por processo: escritores concorrentes não compartilham o mesmo arquivo
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_json(path, data, **kwargs):
+    """Grava `data` como JSON em `path` de forma atômica (`kwargs` vão para `json.dumps`)."""
+    write_text(path, json.dumps(data, **kwargs))
+
+
+def file_signature(path):
+    """Tamanho e mtime (ns) do arquivo: muda quando o arquivo é regravado."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
@@ -0,0 +1,232 @@
+"""
+hyperparameter_search.py
+-------------------------
+Busca de hiperparâmetros para os candidatos do train_model.py (RandomForest, XGBoost e
+LightGBM) por successive halving.
+
+Objetivo:
+- Sortear `n_configs` configurações por candidato e avaliá-las (F1 em um conjunto de
+  validação fixo) em subamostras crescentes do treino: a cada rodada só a melhor fração
+  (1/eta) segue, com eta vezes mais linhas; a última rodada usa todo o treino.
+- Usar o early stopping nativo do XGBoost e do LightGBM (no conjunto de validação), de modo
+  que `n_estimators` é apenas um teto; o número de árvores encontrado vai para o ajuste final.
+- Avaliar as configurações de cada rodada em paralelo nos núcleos locais, com as mesmas
+  regras de threads da seleção de modelos (`model_selection.py`).
+- Respeitar um orçamento de tempo de parede: ao estourar, a busca para e retorna a melhor
+  configuração da rodada mais alta já avaliada.
+- Gravar cada avaliação em um arquivo JSONL local; uma nova execução com os mesmos dados e a
+  mesma semente reaproveita as avaliações já feitas e continua de onde parou.
+
+Impacto:
+- O ajuste fino de hiperparâmetros (listado como melhoria futura) passa a caber no treino
+  usual: a maioria das configurações é descartada em amostras pequenas e baratas.
+"""
+
+
+
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+from balancing import estimator_params, resample
+from model_selection import data_hash, library_versions, make_estimator
+
+RESULTS_PATH = 'cache/search/results.jsonl'
+EARLY_STOPPING_ROUNDS = 50
+MIN_SAMPLES = 500
+
+# Espaços de busca por candidato (valores sorteados de forma uniforme)
+SEARCH_SPACES = {
+    "RandomForest": {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [None, 8, 16, 32],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'max_features': ['sqrt', 0.5, None],
+    },
+    "XGBoost": {
+        'n_estimators': [1000],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'max_depth': [3, 4, 6, 8],
+        'min_child_weight': [1, 5],
+        'subsample': [0.7, 0.85, 1.0],
+        'colsample_bytree': [0.7, 1.0],
+    },
+    "LightGBM": {
+        'n_estimators': [1000],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'num_leaves': [15, 31, 63, 127],
+        'min_child_samples': [10, 20, 50],
+        'subsample': [0.7, 1.0],
+        'subsample_freq': [1],
+        'colsample_bytree': [0.7, 1.0],
+        'verbose': [-1],
+    },
+}
+
+
+class ResultsStore:
+    """Avaliações já feitas, em um arquivo JSONL (uma linha por avaliação, só acréscimos)."""
+
+    def __init__(self, path=RESULTS_PATH):
+        self.path = path
+        self.records = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    # Uma linha incompleta (execução interrompida no meio da escrita) é ignorada
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[record['key']] = record
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def append(self, record):
+        self.records[record['key']] = record
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def sample_configs(n_configs, seed=42, spaces=SEARCH_SPACES):
+    """Sorteia `n_configs` configurações distintas por candidato (determinístico pela semente)."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for name, space in spaces.items():
+        seen = set()
+        n_unique = math.prod(len(values) for values in space.values())
+        while len(seen) < min(n_configs, n_unique):
+            params = {param: values[rng.integers(len(values))] for param, values in space.items()}
+            params = {param: value.item() if isinstance(value, np.generic) else value for param, value in params.items()}
+            key = json.dumps(params, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                configs.append((name, params))
+    return configs
+
+
+def evaluate(name, params, X_train, y_train, X_val, y_val, balance='none'):
+    """Ajusta uma configuração (com early stopping nos boosters) e mede o F1 na validação.
+
+    O balanceamento (`balance`) é aplicado só nas linhas de treino da rodada.
+    """
+    start = time.perf_counter()
+    X_train, y_train = resample(balance, X_train, y_train, n_jobs=1)
+    params = {**params, **estimator_params(balance, name, y_train)}
+    if name == "XGBoost":
+        model = make_estimator(name, {**params, 'early_stopping_rounds': EARLY_STOPPING_ROUNDS}, n_jobs=1)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        best_iteration = int(model.best_iteration) + 1
+    elif name == "LightGBM":
+        import lightgbm
+        model = make_estimator(name, params, n_jobs=1)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)],
+                  callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        best_iteration = int(model.best_iteration_ or params['n_estimators'])
+    else:
+        model = make_estimator(name, params, n_jobs=1).fit(X_train, y_train)
+        best_iteration = None
+    fit_time = time.perf_counter() - start
+
+    return {
+        'f1': float(f1_score(y_val, model.predict(X_val))),
+        'best_iteration': best_iteration,
+        'fit_time': fit_time,
+    }
+
+
+def final_params(record):
+    """Hiperparâmetros do ajuste final: `n_estimators` dos boosters vem do early stopping."""
+    params = dict(record['params'])
+    if record['best_iteration']:
+        params['n_estimators'] = record['best_iteration']
+    return params
+
+
+def search(X, y, n_configs=9, eta=3, budget_s=3600.0, n_jobs=-1, seed=42, results_path=RESULTS_PATH,
+           balance='none'):
+    """Successive halving sobre os candidatos; retorna (nome, hiperparâmetros, relatório)."""
+    deadline = time.perf_counter() + budget_s
+    store = ResultsStore(results_path)
+
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, stratify=y, test_size=0.2, random_state=seed)
+    order = np.random.default_rng(seed).permutation(len(y_fit))
+    X_fit, y_fit = X_fit.iloc[order], y_fit.iloc[order]
+    base_key = joblib.hash((data_hash(X, y), library_versions(), seed, EARLY_STOPPING_ROUNDS, balance))
+
+    configs = sample_configs(n_configs, seed)
+    n_rungs = 1
+    while eta ** n_rungs <= len(configs):
+        n_rungs += 1
+    rungs, survivors, exhausted = [], configs, False
+
+    for rung in range(n_rungs):
+        n_samples = max(int(len(y_fit) / eta ** (n_rungs - 1 - rung)), min(MIN_SAMPLES, len(y_fit)))
+        X_rung, y_rung = X_fit.iloc[:n_samples], y_fit.iloc[:n_samples]
+
+        keys = [joblib.hash((base_key, name, params, n_samples)) for name, params in survivors]
+        pending = [(key, name, params) for key, (name, params) in zip(keys, survivors) if store.get(key) is None]
+        print(f"Rodada {rung + 1}/{n_rungs}: {len(survivors)} configurações em {n_samples} linhas "
+              f"({len(survivors) - len(pending)} já avaliadas)")
+
+        if pending and time.perf_counter() < deadline:
+            with parallel_config(backend='loky', inner_max_num_threads=1):
+                results = Parallel(n_jobs=n_jobs, return_as='generator')(
+                    delayed(evaluate)(name, params, X_rung, y_rung, X_val, y_val, balance) for _, name, params in pending
+                )
+                for (key, name, params), result in zip(pending, results):
+                    store.append({'key': key, 'candidate': name, 'params': params, 'rung': rung,
+                                  'n_samples': n_samples, **result})
+                    if time.perf_counter() >= deadline:
+                        break
+                # Cancela as avaliações ainda não iniciadas
+                results.close()
+
+        records = [store.get(key) for key in keys if store.get(key) is not None]
+        if len(records) < len(keys):
+            # Rodada incompleta: vale a última rodada completa (as avaliações ficam no arquivo)
+            exhausted = True
+            print("Orçamento de tempo esgotado; usando a melhor configuração já avaliada.")
+            if not rungs and records:
+                rungs.append(records)
+            break
+        rungs.append(records)
+
+        # Melhor fração segue para a próxima rodada (empate: ajuste mais rápido)
+        ranked = sorted(records, key=lambda r: (-r['f1'], r['fit_time']))
+        survivors = [(r['candidate'], r['params']) for r in ranked[:max(len(ranked) // eta, 1)]]
+
+    if not rungs:
+        raise RuntimeError("Orçamento de tempo esgotado antes de avaliar qualquer configuração.")
+
+    best = max(rungs[-1], key=lambda r: (r['f1'], -r['fit_time']))
+    report = {
+        'best': best['candidate'],
+        'best_params': final_params(best),
+        'best_f1': best['f1'],
+        'budget_exhausted': exhausted,
+        'balance': balance,
+        'rungs': rungs,
+    }
+    return best['candidate'], final_params(best), report
+
+
+def print_report(report):
+    for rung, records in enumerate(report['rungs']):
+        top = max(records, key=lambda r: r['f1'])
+        print(f"Rodada {rung + 1}: {len(records)} avaliações em {records[0]['n_samples']} linhas | "
+              f"melhor F1 {top['f1']:.4f} ({top['candidate']})")
+    print(f"Melhor configuração: {report['best']} {report['best_params']} (F1 validação {report['best_f1']:.4f})")
@@ -0,0 +1,137 @@
+"""
+incremental_training.py
+------------------------
+Retreino incremental do modelo de churn a partir de novas partições diárias.
+
+Objetivo:
+- Ler apenas as partições novas (saída de `process_data.py --partitioned`, em
+  'data/processed/') e aplicar o limiar de ticket alto salvo no treino
+  ('models/feature_transform.json').
+- Continuar o modelo atual em vez de treinar do zero:
+  - RandomForest: `warm_start`, acrescentando árvores ajustadas só nos dados novos;
+  - XGBoost: novas rodadas de boosting a partir do booster atual (`xgb_model`);
+  - LightGBM: novas rodadas a partir do booster atual (`init_model`).
+- Partir da versão em produção do registro de modelos (ou de 'models/churn_model.pkl') e
+  publicar o resultado como uma nova versão do registro (pickle, modelo compilado e
+  metadados com tempos), que só vira a LATEST com `promote=True`.
+
+Impacto:
+- A chegada de um novo dia de dados custa o ajuste de algumas árvores sobre esse dia,
+  e não um retreino completo sobre todo o histórico.
+"""
+
+
+
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from balancing import estimator_params, resample
+from compiled_model import compile_model, verify_parity
+from feature_transform import TRANSFORM_PATH, FeatureTransform
+from inference import FEATURES
+from model_loader import PICKLE_PATH
+from model_registry import KEEP_VERSIONS, REGISTRY_DIR, latest_version, publish, version_paths
+from storage import read_table
+
+N_NEW_ESTIMATORS = 50
+
+
+def load_partitions(paths, transform):
+    """X e y das partições processadas, com `cliente_ticket_alto` pelo limiar do treino."""
+    df = pd.concat([read_table(path) for path in paths], ignore_index=True)
+    if 'cliente_ticket_alto' not in df.columns:
+        df['cliente_ticket_alto'] = transform.ticket_flag(df['ticket_medio'])
+    return df[list(FEATURES)], df['churn']
+
+
+def continue_training(model, X, y, n_new_estimators=N_NEW_ESTIMATORS, n_jobs=-1):
+    """Acrescenta `n_new_estimators` árvores/rodadas ao modelo, ajustadas em (X, y)."""
+    if len(np.unique(y)) < 2:
+        raise ValueError("As partições novas precisam ter as duas classes para continuar o treino.")
+
+    name = type(model).__name__
+    if name == 'RandomForestClassifier':
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new_estimators, n_jobs=n_jobs)
+        return model.fit(X, y)
+
+    params = {**model.get_params(), 'n_estimators': n_new_estimators, 'n_jobs': n_jobs}
+    if name == 'XGBClassifier':
+        return type(model)(**params).fit(X, y, xgb_model=model.get_booster(), verbose=False)
+    if name == 'LGBMClassifier':
+        return type(model)(**params).fit(X, y, init_model=model.booster_)
+    raise ValueError(f"Modelo não suportado para treino incremental: {name}")
+
+
+def _n_trees(model):
+    name = type(model).__name__
+    if name == 'RandomForestClassifier':
+        return len(model.estimators_)
+    if name == 'XGBClassifier':
+        return int(model.get_booster().num_boosted_rounds())
+    return int(model.booster_.num_trees())
+
+
+def _candidate_name(model):
+    return {'RandomForestClassifier': "RandomForest", 'XGBClassifier': "XGBoost",
+            'LGBMClassifier': "LightGBM"}.get(type(model).__name__)
+
+
+def retrain_incremental(partition_paths, base_path=None, n_new_estimators=N_NEW_ESTIMATORS,
+                        balance='none', n_jobs=-1, registry_dir=REGISTRY_DIR, promote=False,
+                        full_fit_time=None, keep_versions=KEEP_VERSIONS):
+    """Continua o modelo base com as partições novas e publica uma nova versão no registro.
+
+    Sem `base_path`, parte da versão LATEST do registro (ou de 'models/churn_model.pkl').
+    `full_fit_time` (segundos do último ajuste completo, ex.: 'models/training_report.json')
+    entra nos metadados para comparação.
+    """
+    parent = latest_version(registry_dir) if base_path is None else None
+    transform_path = TRANSFORM_PATH
+    if parent is not None:
+        base_path, _, transform_path = version_paths(parent, registry_dir)
+    base_path = base_path or PICKLE_PATH
+
+    start = time.perf_counter()
+    transform = FeatureTransform.load(transform_path)
+    X, y = load_partitions(partition_paths, transform)
+    load_time = time.perf_counter() - start
+    print(f"Partições novas: {len(partition_paths)} | linhas: {len(y)}")
+
+    model = joblib.load(base_path)
+    base_trees = _n_trees(model)
+    if balance == 'class_weight' and _candidate_name(model):
+        model.set_params(**estimator_params(balance, _candidate_name(model), y))
+    X_fit, y_fit = resample(balance, X, y, n_jobs=n_jobs)
+
+    start = time.perf_counter()
+    model = continue_training(model, X_fit, y_fit, n_new_estimators, n_jobs=n_jobs)
+    fit_time = time.perf_counter() - start
+    print(f"Árvores: {base_trees} -> {_n_trees(model)} | ajuste incremental: {fit_time:.2f} s")
+
+    compiled = compile_model(model, feature_names=list(FEATURES))
+    max_diff = verify_parity(model, compiled, X)
+
+    info = {
+        'parent': parent,
+        'base_model': base_path,
+        'partitions': [os.path.basename(p) for p in partition_paths],
+        'rows': int(len(y)),
+        'balance': balance,
+        'trees_before': base_trees,
+        'trees_after': _n_trees(model),
+        'load_time': load_time,
+        'fit_time': fit_time,
+        'full_fit_time': full_fit_time,
+        'parity_max_diff': max_diff,
+    }
+    version = publish(model, compiled, registry_dir=registry_dir, transform_path=transform_path,
+                      info={'incremental': info}, promote=promote, keep=keep_versions)
+    print(f"Nova versão publicada no registro: {version}" + (" (LATEST)" if promote else ""))
+    if full_fit_time:
+        print(f"Ajuste completo anterior: {full_fit_time:.2f} s | incremental: {fit_time:.2f} s "
+              f"({full_fit_time / max(fit_time, 1e-9):.1f}x mais rápido)")
+    return version, info
@@ -0,0 +1,120 @@
+"""
+inference.py
+-------------
+Caminho rápido de inferência, sem pandas, compartilhado pela API.
+
+Objetivo:
+- Mapear os 12 campos de `CustomerData` diretamente para uma linha NumPy contígua,
+  na ordem fixa das colunas de treino.
+- Reaproveitar um buffer pré-alocado por thread, evitando alocações por requisição.
+- Garantir que a ordem das features coincide com `model.feature_names_in_`.
+- Devolver a probabilidade de churn (`predict_proba`) e aplicar o limiar de decisão à
+  parte, para que o mesmo resultado possa ser reclassificado em outro limiar sem
+  chamar o modelo de novo.
+
+Impacto:
+- Remove a construção de `pd.DataFrame` do caminho de cada requisição, que nos perfis
+  de p99 custava mais que o próprio percurso das árvores.
+"""
+
+
+
+import threading
+from operator import attrgetter
+
+import numpy as np
+
+# Ordem das colunas usada no treino (mesma ordem de process_data.py)
+FEATURES = (
+    'pageviews',
+    'timeOnSite',
+    'tempo_por_pagina',
+    'ticket_medio',
+    'engajamento_baixo',
+    'visitante_rapido',
+    'cliente_ticket_alto',
+    'device_mobile',
+    'device_tablet',
+    'device_desktop',
+    'via_organica',
+    'via_pago',
+)
+
+# Limiar padrão de decisão: churn quando a probabilidade é estritamente maior que ele
+# (mesma regra do `predict` dos modelos, que empata em 0,5 a favor da classe 0)
+DEFAULT_THRESHOLD = 0.5
+
+
+def churn_probability(model, X):
+    """Probabilidade da classe churn (1) para cada linha de X."""
+    return model.predict_proba(X)[:, 1]
+
+
+def apply_threshold(probabilities, threshold=DEFAULT_THRESHOLD):
+    """Classe prevista (0/1) a partir das probabilidades, sem chamar o modelo."""
+    return (np.asarray(probabilities) > threshold).astype(np.int64)
+
+
+def check_feature_order(model, features=FEATURES):
+    """Valida que o modelo foi treinado exatamente com as features na ordem esperada."""
+    trained = getattr(model, 'feature_names_in_', None)
+    if trained is not None and list(trained) != list(features):
+        raise ValueError(
+            f"Ordem de features do modelo {list(trained)} difere da esperada {list(features)}."
+        )
+
+
+def inference_dtype(model):
+    """Escolhe o dtype da matriz de entrada conforme o modelo.
+
+    Modelos compilados (`CompiledEnsemble`, `HybridModel`) declaram o próprio `input_dtype`.
+    As árvores do scikit-learn convertem a entrada para float32 internamente, então
+    entregar float32 contíguo evita uma cópia. XGBoost/LightGBM usam float64.
+    """
+    dtype = getattr(model, 'input_dtype', None)
+    if dtype is not None:
+        return dtype
+    return np.float32 if type(model).__module__.startswith('sklearn') else np.float64
+
+
+class RowBuilder:
+    """Monta linhas/matrizes NumPy a partir de objetos com os atributos das features."""
+
+    def __init__(self, features=FEATURES, dtype=np.float64):
+        self.features = tuple(features)
+        self.dtype = dtype
+        self._getter = attrgetter(*self.features)
+        self._local = threading.local()
+
+    def row(self, data, out=None):
+        """Retorna uma linha (1 x n_features).
+
+        Sem `out`, reutiliza o buffer pré-alocado da thread atual; o resultado só é
+        válido até a próxima chamada na mesma thread.
+        """
+        if out is None:
+            out = getattr(self._local, 'buffer', None)
+            if out is None:
+                out = self._local.buffer = np.empty((1, len(self.features)), dtype=self.dtype)
+        out[0] = self._getter(data)
+        return out
+
+    def new_row(self):
+        """Aloca uma linha própria (necessário quando a linha sobrevive à chamada)."""
+        return np.empty((1, len(self.features)), dtype=self.dtype)
+
+    def from_records(self, records):
+        """Matriz (n_amostras x n_features) a partir de uma lista de registros."""
+        return np.array([self._getter(record) for record in records], dtype=self.dtype)
+
+    def from_columns(self, columns):
+        """Matriz a partir de um dicionário coluna -> valores (JSON colunar)."""
+        missing = [f for f in self.features if f not in columns]
+        if missing:
+            raise ValueError(f"Colunas ausentes: {missing}")
+        if len({len(columns[f]) for f in self.features}) > 1:
+            raise ValueError("Todas as colunas devem ter o mesmo tamanho.")
+        X = np.empty((len(columns[self.features[0]]), len(self.features)), dtype=self.dtype)
+        for i, f in enumerate(self.features):
+            X[:, i] = columns[f]
+        return X
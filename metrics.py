@@ -0,0 +1,369 @@
+"""
+metrics.py
+-----------
+Instrumentação do caminho de inferência da API e exposição no formato Prometheus.
+
+Objetivo:
+- Medir, por rota, quanto de cada requisição vai para cada etapa:
+  - 'validation': do recebimento até o código da rota (leitura do corpo, JSON, pydantic);
+  - 'features': montagem da matriz NumPy ou transformação dos campos brutos;
+  - 'model': `predict_proba`;
+  - 'batch_wait': espera na fila do micro-batching, incluindo a inferência do lote;
+  - 'cache': consulta ao cache de previsões (prediction_cache.py), quando habilitado;
+  - 'postprocess': aplicação do limiar e montagem das listas de saída (rotas de lote);
+  - 'response': do fim da rota até o último byte enviado (serialização da resposta).
+- Contar requisições (por rota e status), linhas por requisição e previsões por classe.
+- Expor tudo em texto Prometheus (`GET /metrics`), junto com os histogramas do
+  micro-batching, usando o mesmo `Histogram` de `microbatch.py`.
+- Oferecer um profiler por amostragem que pode ser ligado e desligado com o servidor no
+  ar (`SamplingProfiler`): uma thread lê as pilhas de todas as threads a cada intervalo e
+  acumula as pilhas no formato "collapsed" (entrada de flamegraph.pl/speedscope).
+
+Custo:
+- Com CHURN_METRICS=0, os spans viram um objeto nulo e o middleware só repassa a chamada.
+- Ligadas, cada etapa custa duas leituras de relógio e uma busca binária nas faixas.
+- O profiler não tem custo enquanto desligado: não há thread nem gancho de trace.
+
+Impacto:
+- Picos de latência em /predict/ passam a ser atribuídos à etapa que os causou, com
+  métricas que o Prometheus coleta sem ferramentas extras no container.
+"""
+
+
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+
+from microbatch import Histogram
+
+ENABLED = os.getenv('CHURN_METRICS', '1') == '1'
+
+# Faixas de latência (segundos) e de linhas por requisição
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class CounterFamily:
+    """Contadores por combinação de rótulos."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, label_names=()):
+        self.name, self.help, self.label_names = name, help, tuple(label_names)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_labels(self.label_names, labels)} {value}' for labels, value in items]
+
+
+class HistogramFamily:
+    """Histogramas (`microbatch.Histogram`) por combinação de rótulos."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS, histograms=None):
+        self.name, self.help, self.label_names = name, help, tuple(label_names)
+        self.buckets = buckets
+        self.histograms = histograms if histograms is not None else {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labels):
+        histogram = self.histograms.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(labels, _LockedHistogram(self.buckets))
+        return histogram
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = sorted(self.histograms.items())
+        for labels, histogram in items:
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot['buckets'].items():
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", bound)])} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {snapshot["sum"]}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {snapshot["count"]}')
+        return lines
+
+
+class CallbackFamily:
+    """Valores lidos de uma função na coleta ({rótulos: valor}), ex.: estatísticas de um cache."""
+
+    def __init__(self, name, help, read, kind='gauge', label_names=()):
+        self.name, self.help, self.label_names = name, help, tuple(label_names)
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [f'{self.name}{_labels(self.label_names, labels)} {value}' for labels, value in sorted(self.read().items())]
+
+
+class _LockedHistogram(Histogram):
+    """`Histogram` do micro-batching com trava: as rotas síncronas rodam em várias threads."""
+
+    def __init__(self, buckets):
+        super().__init__(buckets)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            super().observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return super().snapshot()
+
+
+class Metrics:
+    """Registro das famílias de métricas, renderizadas em texto Prometheus."""
+
+    def __init__(self):
+        self.families = []
+
+    def counter(self, name, help, label_names=()):
+        family = CounterFamily(name, help, label_names)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        family = HistogramFamily(name, help, label_names, buckets)
+        self.families.append(family)
+        return family
+
+    def register_histograms(self, name, help, histograms, label_names=()):
+        """Expõe histogramas já existentes (ex.: os do MicroBatcher): {rótulos: Histogram}."""
+        family = HistogramFamily(name, help, label_names, histograms=histograms)
+        self.families.append(family)
+        return family
+
+    def callback(self, name, help, read, kind='gauge', label_names=()):
+        family = CallbackFamily(name, help, read, kind, label_names)
+        self.families.append(family)
+        return family
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+REQUESTS = METRICS.counter('churn_requests_total', "Requisições HTTP por rota, método e status.",
+                           ('route', 'method', 'status'))
+REQUEST_SECONDS = METRICS.histogram('churn_request_duration_seconds', "Latência das requisições HTTP.",
+                                    ('route', 'method'))
+STAGE_SECONDS = METRICS.histogram('churn_stage_duration_seconds', "Tempo de cada etapa do caminho de inferência.",
+                                  ('route', 'stage'))
+REQUEST_ROWS = METRICS.histogram('churn_request_rows', "Linhas pontuadas por requisição.", ('route',), ROWS_BUCKETS)
+PREDICTIONS = METRICS.counter('churn_predictions_total', "Previsões por rota e classe prevista.",
+                              ('route', 'prediction'))
+
+
+class _RequestTimer:
+    __slots__ = ('start', 'last')
+
+    def __init__(self, start):
+        self.start = start
+        self.last = None
+
+
+# Relógio da requisição atual; é copiado para a thread das rotas síncronas (run_in_threadpool)
+_request = contextvars.ContextVar('churn_request_timer', default=None)
+
+
+class _Span:
+    __slots__ = ('histogram', 'route', 'start')
+
+    def __init__(self, histogram, route):
+        self.histogram = histogram
+        self.route = route
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        timer = _request.get()
+        # O primeiro span da requisição fecha a etapa de validação
+        if timer is not None and timer.last is None:
+            STAGE_SECONDS.observe(self.start - timer.start, self.route, 'validation')
+            timer.last = self.start
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.histogram.observe(end - self.start)
+        timer = _request.get()
+        if timer is not None:
+            timer.last = end
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(route, stage):
+    """Mede o bloco como a etapa `stage` da rota (`with span('/predict/', 'model'): ...`)."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(STAGE_SECONDS.labels(route, stage), route)
+
+
+def record_predictions(route, predictions):
+    """Linhas por requisição e contagem por classe prevista."""
+    if not ENABLED:
+        return
+    n = len(predictions)
+    positives = int(sum(predictions))
+    REQUEST_ROWS.observe(n, route)
+    if positives:
+        PREDICTIONS.inc(route, '1', value=positives)
+    if n - positives:
+        PREDICTIONS.inc(route, '0', value=n - positives)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência e status por rota, e a etapa 'response' de cada requisição."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timer = _RequestTimer(time.perf_counter())
+        token = _request.set(timer)
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            end = time.perf_counter()
+            _request.reset(token)
+            # Rótulo pelo molde da rota ('/visitors/{visitor_id}'), nunca pelo caminho bruto
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUESTS.inc(route, scope['method'], str(status[0]))
+            REQUEST_SECONDS.observe(end - timer.start, route, scope['method'])
+            if timer.last is not None:
+                STAGE_SECONDS.observe(end - timer.last, route, 'response')
+
+
+class SamplingProfiler:
+    """Profiler por amostragem de pilhas (todas as threads), ligado e desligado em tempo de execução."""
+
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.stacks = _Counter()
+        self.samples = 0
+        self.interval = None
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=5.0, duration_s=None):
+        """Inicia a amostragem (zera as amostras anteriores); para sozinho após `duration_s`."""
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks, self.samples = _Counter(), 0
+            self.interval = interval_ms / 1000.0
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration_s,), name='churn-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+        return self.status()
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self, duration_s):
+        own = threading.get_ident()
+        deadline = None if duration_s is None else time.perf_counter() + duration_s
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.stopped_at = time.time()
+
+    def status(self):
+        return {
+            'running': self.running,
+            'samples': self.samples,
+            'interval_ms': None if self.interval is None else self.interval * 1000.0,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+        }
+
+    def _snapshot(self):
+        # Cópia atômica (sob o GIL): a thread de amostragem pode estar gravando
+        return _Counter(dict(self.stacks))
+
+    def top(self, limit=20):
+        """Pilhas mais frequentes (as threads ociosas dominam; filtre pelo nome da rota)."""
+        return [{'stack': stack, 'samples': count} for stack, count in self._snapshot().most_common(limit)]
+
+    def collapsed(self):
+        """Todas as pilhas no formato "collapsed" ("a;b;c <amostras>" por linha)."""
+        return '\n'.join(f'{stack} {count}' for stack, count in self._snapshot().most_common()) + '\n'
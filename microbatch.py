@@ -0,0 +1,147 @@
+"""
+microbatch.py
+--------------
+Micro-batching assíncrono (asyncio) para a rota /predict/ da API.
+
+Objetivo:
+- Agrupar requisições concorrentes de previsão por até N milissegundos ou K linhas.
+- Pontuar o grupo inteiro com uma única chamada ao modelo.
+- Devolver a cada requisição apenas o seu próprio resultado.
+- No desligamento (`stop`), pontuar as linhas ainda pendentes em vez de abandoná-las.
+
+Métricas expostas:
+- Profundidade atual da fila.
+- Histogramas de tamanho de lote e de profundidade da fila no momento de cada disparo.
+
+Impacto:
+- O custo fixo por chamada ao modelo deixa de ser pago por requisição, permitindo
+  que a vazão cresça com a concorrência.
+"""
+
+
+
+import asyncio
+import bisect
+
+import numpy as np
+
+
+class Histogram:
+    """Histograma de contagens por faixa (limites superiores inclusivos)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Retorna as contagens cumulativas por faixa, no estilo Prometheus."""
+        cumulative, acc = {}, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            acc += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = acc
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class MicroBatcher:
+    """Agrupa linhas enviadas concorrentemente e as pontua em lote."""
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_depths = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self._queue = None
+        self._task = None
+        # Lote sendo montado ou pontuado pela tarefa de fundo (resolvido no stop, se interrompido)
+        self._batch = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Encerra a tarefa de fundo e pontua as linhas pendentes (lote em andamento e fila)."""
+        queue, self._queue = self._queue, None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Nenhuma requisição fica sem resposta no desligamento ou no reload
+        pending, self._batch = [item for item in self._batch if not item[1].done()], []
+        while queue is not None and not queue.empty():
+            pending.append(queue.get_nowait())
+        if pending:
+            await self._score(pending)
+
+    async def submit(self, row: np.ndarray):
+        """Enfileira uma linha (1 x n_features) e aguarda a sua previsão.
+
+        Fora de `start()`/`stop()` (subida ou desligamento do servidor), pontua a linha
+        diretamente, sem agrupar.
+        """
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            return (await loop.run_in_executor(None, self.predict_fn, row))[0]
+        future = loop.create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        """Aguarda o primeiro item e completa o lote até o limite de tamanho ou de tempo."""
+        loop = asyncio.get_running_loop()
+        batch = self._batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batch_sizes.observe(len(batch))
+            self.queue_depths.observe(self._queue.qsize())
+            await self._score(batch)
+            self._batch = []
+
+    async def _score(self, batch):
+        """Pontua o lote com uma única chamada e resolve o future de cada linha."""
+        X = np.vstack([row for row, _ in batch])
+        try:
+            # A inferência roda fora do event loop, que segue aceitando requisições
+            predictions = await asyncio.get_running_loop().run_in_executor(None, self.predict_fn, X)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_histogram": self.batch_sizes.snapshot(),
+            "queue_depth_histogram": self.queue_depths.snapshot(),
+        }
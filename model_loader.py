@@ -0,0 +1,273 @@
+"""
+model_loader.py
+----------------
+Carregador compartilhado do modelo para a API e os dashboards.
+
+Objetivo:
+- Carregar o modelo sob demanda ('lazy'), em segundo plano ('background') ou na
+  importação ('eager'), conforme a variável CHURN_MODEL_LOADING.
+- Abrir os arrays do modelo mapeados em memória (CHURN_MODEL_MMAP_MODE, padrão 'r').
+- Com CHURN_SHARED_MODEL_DIR definido, abrir a cópia compartilhada entre workers
+  (ver `shared_model.py`) em vez de desserializar o modelo em cada processo.
+- Carregar junto a transformação de features ('models/feature_transform.json'), quando
+  existir, para que o serviço aceite campos brutos de sessão.
+- Executar uma previsão de aquecimento antes de declarar o modelo pronto, para que a
+  sonda de prontidão só libere tráfego com o modelo "quente".
+- Com um registro de modelos (`model_registry.py`, CHURN_MODEL_REGISTRY), carregar a versão
+  apontada por LATEST e, com CHURN_MODEL_WATCH_INTERVAL > 0, observar o ponteiro: uma nova
+  versão é verificada, carregada e aquecida em segundo plano e só então trocada de uma vez;
+  requisições em andamento terminam com o modelo anterior.
+- Conferir os checksums só dos artefatos que serão lidos: servindo o compilado, o pickle
+  só é verificado (e lido) quando o modelo original é carregado em segundo plano.
+
+Impacto:
+- Reduz o cold start no Cloud Run: o processo começa a responder (liveness) antes de o
+  modelo terminar de carregar, e importações pesadas ficam fora do caminho de inicialização.
+"""
+
+
+
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from compiled_model import CompiledEnsemble, load_serving_model
+from feature_transform import TRANSFORM_PATH, FeatureTransform
+from inference import check_feature_order
+from model_registry import REGISTRY_DIR, latest_version, load_metadata, verify, version_dir, version_paths
+from shared_model import source_signature
+
+PICKLE_PATH = 'models/churn_model.pkl'
+COMPILED_PATH = 'models/churn_model_compiled'
+SWAP_HISTORY = 20
+
+
+class ModelLoader:
+    """Carrega o modelo uma única vez por processo, de forma preguiçosa ou em segundo plano."""
+
+    def __init__(self, pickle_path=PICKLE_PATH, compiled_path=COMPILED_PATH, mmap_mode=None, shared_dir=None,
+                 transform_path=TRANSFORM_PATH, registry_dir=None, watch_interval=0.0):
+        self.pickle_path = pickle_path
+        self.compiled_path = compiled_path
+        self.transform_path = transform_path
+        self.mmap_mode = mmap_mode
+        self.shared_dir = shared_dir
+        self.registry_dir = registry_dir
+        self.watch_interval = watch_interval
+        self.load_seconds = None
+        self.loaded_at = None
+        self.metadata = None
+        self.swaps = []
+        self.swap_error = None
+        self.last_check = None
+        # Modelo, transformação e versão trocados juntos, em uma única atribuição
+        self._current = (None, None, None)
+        # Cópias em CHURN_SHARED_MODEL_DIR da versão atual e da anterior (as demais são removidas)
+        self.shared_path = None
+        self.previous_shared_path = None
+        self._error = None
+        self._thread = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def version(self):
+        return self._current[2]
+
+    @property
+    def transform(self):
+        return self._current[1]
+
+    def snapshot(self):
+        """(modelo, transformação, versão) consistentes entre si, mesmo durante uma troca."""
+        self.get()
+        return self._current
+
+    def start(self):
+        """Dispara o carregamento em segundo plano (idempotente)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name='model-loader', daemon=True)
+                self._thread.start()
+
+    def get(self, timeout=None):
+        """Retorna o modelo, aguardando o carregamento se necessário."""
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Modelo ainda não foi carregado.")
+        if self._error is not None:
+            raise RuntimeError("Falha ao carregar o modelo.") from self._error
+        return self._current[0]
+
+    @property
+    def ready(self):
+        """Verdadeiro apenas depois do carregamento e da previsão de aquecimento."""
+        return self._done.is_set() and self._error is None
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "loading": self._thread is not None and not self._done.is_set(),
+            "error": repr(self._error) if self._error is not None else None,
+            "load_seconds": self.load_seconds,
+            "version": self.version,
+        }
+
+    def model_info(self):
+        """Versão em produção, metadados do registro e histórico de trocas."""
+        return {
+            **self.status(),
+            "source": "registry" if self.metadata is not None else "files",
+            "loaded_at": self.loaded_at,
+            "metadata": {k: v for k, v in (self.metadata or {}).items() if k != 'checksums'},
+            "registry": self.registry_dir,
+            "registry_latest": latest_version(self.registry_dir) if self.registry_dir else None,
+            "watch_interval": self.watch_interval,
+            "last_check": self.last_check,
+            "swap_error": self.swap_error,
+            "swaps": self.swaps,
+        }
+
+    def _resolve(self):
+        """Artefatos a carregar: versão LATEST do registro ou, sem registro, os arquivos fixos."""
+        version = latest_version(self.registry_dir) if self.registry_dir else None
+        if version is None:
+            return (self.pickle_path, self.compiled_path, self.transform_path,
+                    source_signature(self.pickle_path, self.compiled_path), None)
+        pickle_path, compiled_path, transform_path = version_paths(version, self.registry_dir)
+        return pickle_path, compiled_path, transform_path, version, load_metadata(version, self.registry_dir)
+
+    def _checker(self, version):
+        """Confere, antes da leitura, os checksums só do artefato da versão que será lido."""
+        if version is None:
+            return None
+
+        def check(path):
+            verify(version, self.registry_dir, [os.path.relpath(path, version_dir(version, self.registry_dir))])
+        return check
+
+    def _load_model(self, pickle_path, compiled_path, transform_path, version=None):
+        """Carrega, valida e aquece um modelo; retorna (modelo, transformação, cópia compartilhada)."""
+        check = self._checker(version)
+        path = None
+        if self.shared_dir:
+            from shared_model import ensure_shared_model
+            path = ensure_shared_model(self.shared_dir, pickle_path, compiled_path, check=check)
+            model = CompiledEnsemble.load(path, mmap_mode='r')
+        else:
+            model = load_serving_model(pickle_path, compiled_path, mmap_mode=self.mmap_mode, check=check)
+        check_feature_order(model)
+        # Previsão de aquecimento: toca as páginas do modelo e inicializa caches internos
+        n_features = len(getattr(model, 'feature_names_in_', ())) or model.n_features_in_
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model.predict(np.zeros((1, n_features)))
+        transform = None
+        if os.path.exists(transform_path):
+            if check:
+                check(transform_path)
+            transform = FeatureTransform.load(transform_path)
+        return model, transform, path
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            pickle_path, compiled_path, transform_path, version, metadata = self._resolve()
+            model, transform, shared_path = self._load_model(pickle_path, compiled_path, transform_path, version)
+            self.metadata = metadata
+            self._current = (model, transform, version)
+            self.shared_path = shared_path
+            self.loaded_at = time.time()
+        except Exception as exc:
+            self._error = exc
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._done.set()
+
+    def check_for_update(self):
+        """Troca para a versão LATEST do registro, se mudou; retorna True se houve troca.
+
+        O novo modelo é verificado, carregado e aquecido antes da troca; em caso de falha,
+        o modelo atual continua em produção e o erro fica em `swap_error`.
+        """
+        self.last_check = time.time()
+        latest = latest_version(self.registry_dir) if self.registry_dir else None
+        if latest is None or latest == self.version:
+            return False
+        if self.swap_error and self.swap_error["version"] == latest:
+            # Versões são imutáveis: uma versão que falhou não é recarregada a cada verificação
+            return False
+
+        start = time.perf_counter()
+        try:
+            pickle_path, compiled_path, transform_path, version, metadata = self._resolve()
+            model, transform, shared_path = self._load_model(pickle_path, compiled_path, transform_path, version)
+        except Exception as exc:
+            self.swap_error = {"version": latest, "error": repr(exc), "at": time.time()}
+            return False
+
+        previous = self.version
+        with self._lock:
+            self.metadata = metadata
+            self._current = (model, transform, version)
+            self._error = None
+            self.loaded_at = time.time()
+            self.swap_error = None
+            if shared_path != self.shared_path:
+                self.previous_shared_path, self.shared_path = self.shared_path, shared_path
+        self._done.set()
+        swap = {"from": previous, "to": version, "at": self.loaded_at, "load_seconds": time.perf_counter() - start}
+        if self.shared_dir:
+            swap["pruned"] = self._prune_shared()
+        self.swaps = (self.swaps + [swap])[-SWAP_HISTORY:]
+        return True
+
+    def _prune_shared(self):
+        """Remove de CHURN_SHARED_MODEL_DIR as cópias que não são da versão atual nem da anterior."""
+        from shared_model import prune_shared_models
+        try:
+            return prune_shared_models(self.shared_dir, (self.shared_path, self.previous_shared_path))
+        except OSError as exc:
+            # A limpeza nunca desfaz uma troca bem-sucedida
+            return {"error": repr(exc)}
+
+    def start_watcher(self):
+        """Observa o registro em segundo plano a cada `watch_interval` segundos (idempotente)."""
+        if not self.registry_dir or self.watch_interval <= 0:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+                self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            # Só troca depois do carregamento inicial, para não competir com ele
+            if self._done.is_set():
+                self.check_for_update()
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_loader():
+    """Carregador único do processo, configurado pelas variáveis de ambiente."""
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            mmap_mode = os.getenv('CHURN_MODEL_MMAP_MODE', 'r') or None
+            shared_dir = os.getenv('CHURN_SHARED_MODEL_DIR') or None
+            registry_dir = os.getenv('CHURN_MODEL_REGISTRY', REGISTRY_DIR) or None
+            watch_interval = float(os.getenv('CHURN_MODEL_WATCH_INTERVAL', '10'))
+            _loader = ModelLoader(mmap_mode=mmap_mode, shared_dir=shared_dir, registry_dir=registry_dir,
+                                  watch_interval=watch_interval)
+        return _loader
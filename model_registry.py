@@ -0,0 +1,228 @@
+"""
+model_registry.py
+------------------
+Registro local de modelos, baseado em arquivos, com versões imutáveis.
+
+Estrutura ('models/registry/', ou CHURN_MODEL_REGISTRY):
+    <versão>/churn_model.pkl
+    <versão>/churn_model_compiled/        (tabelas de nós, ver compiled_model.py)
+    <versão>/feature_transform.json
+    <versão>/metadata.json                (features, métricas, classe do modelo, sha256)
+    LATEST                                (versão em produção)
+
+Objetivo:
+- Publicar cada modelo treinado como uma nova versão: o diretório é montado em um
+  temporário e renomeado de uma vez, e o ponteiro LATEST é trocado com `os.replace`,
+  então leitores nunca veem uma versão pela metade.
+- Guardar metadados (lista de features, métricas de treino, checksums) para auditoria e
+  para que a API verifique a integridade dos arquivos antes de trocar de modelo.
+- Promover ou reverter versões sem retreinar (`python model_registry.py promote <versão>`).
+- Manter só as últimas KEEP_VERSIONS versões (mais a LATEST): cada publicação remove as
+  mais antigas (`python model_registry.py prune --keep N` para limpar manualmente).
+
+Impacto:
+- Um novo modelo entra em produção trocando o LATEST; a API observa o ponteiro e troca o
+  modelo em segundo plano, sem reiniciar os workers (ver `model_loader.py`).
+"""
+
+
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from feature_transform import TRANSFORM_PATH
+from fileio import write_text
+from inference import FEATURES
+
+REGISTRY_DIR = 'models/registry'
+LATEST_NAME = 'LATEST'
+METADATA_NAME = 'metadata.json'
+MODEL_NAME = 'churn_model.pkl'
+COMPILED_NAME = 'churn_model_compiled'
+TRANSFORM_NAME = 'feature_transform.json'
+KEEP_VERSIONS = 10
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _selected(relative, artifacts):
+    """True se o arquivo (caminho relativo) pertence a um dos artefatos (arquivo ou diretório)."""
+    return artifacts is None or any(relative == name or relative.startswith(name + os.sep) for name in artifacts)
+
+
+def _checksums(directory, artifacts=None):
+    """sha256 dos arquivos da versão (caminho relativo -> hash), exceto os metadados.
+
+    Com `artifacts`, só os arquivos desses artefatos são lidos.
+    """
+    checksums = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)
+            if relative != METADATA_NAME and _selected(relative, artifacts):
+                checksums[relative] = sha256_file(path)
+    return dict(sorted(checksums.items()))
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, version)
+
+
+def version_paths(version, registry_dir=REGISTRY_DIR):
+    """Caminhos (pickle, compilado, transformação) dos artefatos de uma versão."""
+    directory = version_dir(version, registry_dir)
+    return (os.path.join(directory, MODEL_NAME), os.path.join(directory, COMPILED_NAME),
+            os.path.join(directory, TRANSFORM_NAME))
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.startswith('.') and os.path.exists(os.path.join(registry_dir, name, METADATA_NAME))
+    )
+
+
+def latest_version(registry_dir=REGISTRY_DIR):
+    """Versão apontada por LATEST, ou None se o registro ainda não tiver versão promovida."""
+    try:
+        with open(os.path.join(registry_dir, LATEST_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_latest(version, registry_dir=REGISTRY_DIR):
+    """Aponta LATEST para `version` (troca atômica)."""
+    if not os.path.exists(os.path.join(version_dir(version, registry_dir), METADATA_NAME)):
+        raise ValueError(f"Versão inexistente no registro: {version}")
+    write_text(os.path.join(registry_dir, LATEST_NAME), version + '\n')
+
+
+def load_metadata(version, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry_dir), METADATA_NAME)) as f:
+        return json.load(f)
+
+
+def verify(version, registry_dir=REGISTRY_DIR, artifacts=None):
+    """Confere os checksums da versão; levanta ValueError se algum arquivo divergir.
+
+    Com `artifacts` (ex.: `[COMPILED_NAME]`), confere só esses artefatos: a API verifica
+    apenas o que vai ler, sem calcular o sha256 do pickle quando serve o modelo compilado.
+    """
+    expected = {name: digest for name, digest in load_metadata(version, registry_dir)['checksums'].items()
+                if _selected(name, artifacts)}
+    actual = _checksums(version_dir(version, registry_dir), artifacts)
+    if actual != expected:
+        changed = sorted(set(expected.items()) ^ set(actual.items()))
+        raise ValueError(f"Checksums da versão {version} não conferem: {[name for name, _ in changed]}")
+    return True
+
+
+def prune_versions(registry_dir=REGISTRY_DIR, keep=KEEP_VERSIONS):
+    """Remove as versões mais antigas, mantendo as `keep` mais recentes e sempre a LATEST.
+
+    Retorna as versões removidas. Com `keep` <= 0, não remove nada.
+    """
+    if keep <= 0:
+        return []
+    latest = latest_version(registry_dir)
+    removed = [version for version in list_versions(registry_dir)[:-keep] if version != latest]
+    for version in removed:
+        shutil.rmtree(version_dir(version, registry_dir), ignore_errors=True)
+    return removed
+
+
+def _new_version(registry_dir):
+    """Nome da nova versão (data e hora), sempre posterior às existentes.
+
+    Nomes de versões removidas por `prune_versions` não são reutilizados.
+    """
+    existing = list_versions(registry_dir)
+    stamp = max([time.strftime('%Y%m%dT%H%M%S')] + [name.split('-')[0] for name in existing[-1:]])
+    version = stamp
+    suffix = 1
+    while os.path.exists(version_dir(version, registry_dir)) or (existing and version <= existing[-1]):
+        version = f"{stamp}-{suffix}"
+        suffix += 1
+    return version
+
+
+def publish(model, compiled, registry_dir=REGISTRY_DIR, transform_path=TRANSFORM_PATH, metrics=None,
+            info=None, promote=True, keep=KEEP_VERSIONS):
+    """Grava uma nova versão (pickle, compilado, transformação e metadados) e retorna o nome.
+
+    Com `promote=True`, a versão passa a ser a LATEST. Depois da publicação, só as `keep`
+    versões mais recentes (e a LATEST) continuam no registro (`prune_versions`).
+    """
+    import joblib
+    os.makedirs(registry_dir, exist_ok=True)
+    version = _new_version(registry_dir)
+    tmp = tempfile.mkdtemp(dir=registry_dir, prefix='.tmp-')
+    try:
+        joblib.dump(model, os.path.join(tmp, MODEL_NAME))
+        compiled.save(os.path.join(tmp, COMPILED_NAME))
+        if transform_path and os.path.exists(transform_path):
+            shutil.copyfile(transform_path, os.path.join(tmp, TRANSFORM_NAME))
+
+        metadata = {
+            'version': version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'model_class': type(model).__name__,
+            'features': list(FEATURES),
+            'metrics': metrics or {},
+            **(info or {}),
+            'checksums': _checksums(tmp),
+        }
+        with open(os.path.join(tmp, METADATA_NAME), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(tmp, version_dir(version, registry_dir))
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    if promote:
+        set_latest(version, registry_dir)
+    prune_versions(registry_dir, keep)
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro local de modelos de churn.")
+    parser.add_argument('--registry', default=os.getenv('CHURN_MODEL_REGISTRY', REGISTRY_DIR))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="Lista as versões (* = LATEST).")
+    for command in ('promote', 'verify'):
+        commands.add_parser(command).add_argument('version')
+    commands.add_parser('prune', help="Remove as versões antigas (nunca a LATEST).").add_argument(
+        '--keep', type=int, default=KEEP_VERSIONS, help="Versões mais recentes mantidas.")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        latest = latest_version(args.registry)
+        for version in list_versions(args.registry):
+            metadata = load_metadata(version, args.registry)
+            print(f"{'*' if version == latest else ' '} {version}  {metadata['model_class']}  {metadata['metrics']}")
+    elif args.command == 'promote':
+        verify(args.version, args.registry)
+        set_latest(args.version, args.registry)
+        print(f"LATEST -> {args.version}")
+    elif args.command == 'prune':
+        removed = prune_versions(args.registry, args.keep)
+        print(f"Versões removidas: {', '.join(removed) or 'nenhuma'}")
+    else:
+        verify(args.version, args.registry)
+        print(f"Versão {args.version}: checksums OK")
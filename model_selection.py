@@ -0,0 +1,143 @@
+"""
+model_selection.py
+-------------------
+Seleção de modelos do train_model.py em paralelo e com cache em disco.
+
+Objetivo:
+- Agendar todas as combinações candidato x fold da validação cruzada em um pool de
+  processos (joblib/loky), com cada job limitado a 1 thread (estimador com `n_jobs=1` e
+  `inner_max_num_threads=1` para OpenMP/BLAS), evitando a disputa de núcleos entre jobs.
+- Guardar o resultado de cada fold em disco (joblib.Memory), com chave formada pelo hash
+  dos dados, pelos hiperparâmetros, pelos índices do fold e pelas versões das bibliotecas:
+  uma nova execução sobre os mesmos dados pula os folds já calculados.
+- Reaproveitar a configuração escolhida no ajuste final (`make_estimator`) e gerar um
+  relatório de tempos por modelo.
+- Opcionalmente, balancear as classes dentro de cada fold (`balancing.py`), apenas nas
+  linhas de treino do fold.
+
+Impacto:
+- A validação cruzada dos três modelos passa a usar todos os núcleos da máquina de treino,
+  e reexecuções sem mudança nos dados custam apenas o ajuste final.
+"""
+
+
+
+import time
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold
+from xgboost import XGBClassifier
+from lightgbm import LGBMClassifier
+
+from balancing import estimator_params, resample
+
+CACHE_DIR = 'cache/model_selection'
+N_SPLITS = 5
+
+# Candidatos: classe do estimador + hiperparâmetros (sem `n_jobs`, definido por job)
+CANDIDATES = {
+    "RandomForest": (RandomForestClassifier, {'random_state': 42}),
+    "XGBoost": (XGBClassifier, {'use_label_encoder': False, 'eval_metric': 'logloss', 'random_state': 42}),
+    "LightGBM": (LGBMClassifier, {'random_state': 42}),
+}
+
+
+def make_estimator(name, params=None, n_jobs=None):
+    """Instancia o candidato `name` com seus hiperparâmetros (ou `params`) e `n_jobs` threads."""
+    estimator_class, defaults = CANDIDATES[name]
+    return estimator_class(**{**defaults, **(params or {})}, n_jobs=n_jobs)
+
+
+def library_versions():
+    """Versões que influenciam o resultado de um fold (fazem parte da chave do cache)."""
+    import lightgbm
+    import sklearn
+    import xgboost
+    return {'sklearn': sklearn.__version__, 'xgboost': xgboost.__version__, 'lightgbm': lightgbm.__version__}
+
+
+def data_hash(X, y):
+    """Hash do conteúdo (valores, colunas e alvo) dos dados de treino."""
+    return joblib.hash((X, y))
+
+
+def fit_fold(estimator, X, y, train_idx, test_idx, balance='none'):
+    """Ajusta e avalia (F1) o estimador em um fold, balanceando só as linhas de treino."""
+    start = time.perf_counter()
+    X_train, y_train = resample(balance, X.iloc[train_idx], y.iloc[train_idx], n_jobs=1)
+    model = clone(estimator).fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score = f1_score(y.iloc[test_idx], model.predict(X.iloc[test_idx]))
+    return {'f1': float(score), 'fit_time': fit_time, 'score_time': time.perf_counter() - start}
+
+
+def _cached_fold(memory):
+    """`fit_fold` com cache em disco; X e y entram na chave apenas pelo `data_key`."""
+    def fold(name, params, balance, data_key, fold_index, versions, estimator, X, y, train_idx, test_idx):
+        return fit_fold(estimator, X, y, train_idx, test_idx, balance)
+    return memory.cache(fold, ignore=['estimator', 'X', 'y'])
+
+
+def select_model(X, y, candidates=None, n_splits=N_SPLITS, n_jobs=-1, cache_dir=CACHE_DIR, balance='none'):
+    """Validação cruzada paralela (candidato x fold) com cache em disco.
+
+    Retorna (nome do melhor candidato, relatório por candidato). Com `cache_dir=None`,
+    nenhum resultado é lido ou gravado em disco. `balance` é a estratégia de
+    `balancing.py` aplicada dentro de cada fold.
+    """
+    candidates = candidates or {name: {} for name in CANDIDATES}
+    memory = joblib.Memory(cache_dir, verbose=0)
+    fold = _cached_fold(memory)
+
+    data_key = data_hash(X, y)
+    versions = library_versions()
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    splits = list(skf.split(np.zeros(len(y)), y))
+
+    jobs, cached = [], {}
+    for name, params in candidates.items():
+        estimator = make_estimator(name, {**params, **estimator_params(balance, name, y)}, n_jobs=1)
+        for i, (train_idx, test_idx) in enumerate(splits):
+            args = (name, params, balance, data_key, i, versions, estimator, X, y, train_idx, test_idx)
+            cached[(name, i)] = fold.check_call_in_cache(*args)
+            jobs.append(args)
+
+    # Folds em cache são lidos no processo principal; só os demais vão para o pool
+    start = time.perf_counter()
+    pending = [args for args in jobs if not cached[(args[0], args[4])]]
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        computed = iter(Parallel(n_jobs=n_jobs)(delayed(fold)(*args) for args in pending) if pending else [])
+    results = [fold(*args) if cached[(args[0], args[4])] else next(computed) for args in jobs]
+    wall_time = time.perf_counter() - start
+
+    report = {}
+    for args, result in zip(jobs, results):
+        name, fold_index = args[0], args[4]
+        entry = report.setdefault(name, {'params': candidates[name], 'folds': []})
+        entry['folds'].append({**result, 'fold': fold_index, 'cached': cached[(name, fold_index)]})
+
+    for entry in report.values():
+        folds = entry['folds']
+        entry['f1_mean'] = float(np.mean([f['f1'] for f in folds]))
+        entry['fit_time_total'] = float(sum(f['fit_time'] for f in folds))
+        entry['folds_cached'] = sum(f['cached'] for f in folds)
+
+    best = max(report, key=lambda name: report[name]['f1_mean'])
+    report = {'best': best, 'cv_wall_time': wall_time, 'data_hash': data_key, 'n_jobs': n_jobs,
+              'balance': balance, 'candidates': report}
+    return best, report
+
+
+def print_report(report):
+    print(f"{'modelo':<14}{'F1 (CV)':>9}{'ajuste (s)':>12}{'folds em cache':>16}")
+    for name, entry in report['candidates'].items():
+        print(f"{name:<14}{entry['f1_mean']:>9.4f}{entry['fit_time_total']:>12.2f}"
+              f"{entry['folds_cached']:>10}/{len(entry['folds'])}")
+    print(f"Tempo total da validação cruzada (paralela): {report['cv_wall_time']:.2f} s")
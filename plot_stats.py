@@ -0,0 +1,180 @@
+"""
+plot_stats.py
+--------------
+Estatísticas pré-computadas para os gráficos do dashboard analítico.
+
+Objetivo:
+- Acumular, bloco a bloco e de forma vetorizada, a distribuição de cada variável por
+  classe de churn: histograma em escala log1p, mínimo/máximo exatos e os
+  OUTLIERS_PER_TAIL menores e maiores valores (usados para desenhar os outliers, de forma
+  determinística e independente da ordem dos blocos).
+- Derivar quartis, mediana e bigodes (regra de Tukey, 1,5 x IQR) a partir do histograma.
+- Desenhar os boxplots apenas a partir desses resumos (`Axes.bxp`), sem passar o
+  DataFrame completo para o seaborn.
+- Somar distribuições acumuladas por grupos mais finos (ex.: faixas de probabilidade)
+  para obter as de cada classe em qualquer limiar de decisão, sem reler os dados.
+
+Precisão:
+- Cada faixa do histograma cobre 1/BINS_PER_UNIT em log1p, ou seja, erro relativo de
+  cerca de 0,25% nos quartis. Valores negativos são tratados como zero (as variáveis
+  analisadas são contagens, tempos e valores monetários).
+
+Impacto:
+- O tempo de renderização e a memória dos gráficos deixam de crescer com o número de linhas.
+"""
+
+
+
+import numpy as np
+
+BINS_PER_UNIT = 200
+
+# Valores extremos guardados em cada cauda para desenhar os outliers
+OUTLIERS_PER_TAIL = 250
+
+
+def _smallest(values, k):
+    return np.partition(values, k)[:k] if values.size > k else values
+
+
+def _largest(values, k):
+    return np.partition(values, values.size - k - 1)[values.size - k:] if values.size > k else values
+
+
+class ColumnDistribution:
+    """Distribuição de uma variável em uma classe: histograma log1p + valores extremos de cada cauda."""
+
+    def __init__(self, outliers_per_tail=OUTLIERS_PER_TAIL):
+        self.outliers_per_tail = outliers_per_tail
+        self.hist = np.zeros(0, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._low = np.empty(0)
+        self._high = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+
+        bins = np.floor(np.log1p(np.clip(values, 0, None)) * BINS_PER_UNIT).astype(np.int64)
+        counts = np.bincount(bins)
+        if counts.size > self.hist.size:
+            self.hist = np.pad(self.hist, (0, counts.size - self.hist.size))
+        self.hist[:counts.size] += counts
+
+        self.count += values.size
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        self._low = _smallest(np.concatenate([self._low, values]), self.outliers_per_tail)
+        self._high = _largest(np.concatenate([self._high, values]), self.outliers_per_tail)
+
+    @classmethod
+    def combine(cls, parts, outliers_per_tail=OUTLIERS_PER_TAIL):
+        """Distribuição única equivalente a ter acumulado todos os valores de `parts`."""
+        combined = cls(outliers_per_tail)
+        parts = [part for part in parts if part.count]
+        if not parts:
+            return combined
+        combined.hist = np.zeros(max(part.hist.size for part in parts), dtype=np.int64)
+        for part in parts:
+            combined.hist[:part.hist.size] += part.hist
+        combined.count = sum(part.count for part in parts)
+        combined.total = sum(part.total for part in parts)
+        combined.min = min(part.min for part in parts)
+        combined.max = max(part.max for part in parts)
+
+        # Os k extremos do conjunto estão entre os k extremos de alguma das partes
+        combined._low = _smallest(np.concatenate([part._low for part in parts]), outliers_per_tail)
+        combined._high = _largest(np.concatenate([part._high for part in parts]), outliers_per_tail)
+        return combined
+
+    def _centers(self):
+        return np.expm1((np.arange(self.hist.size) + 0.5) / BINS_PER_UNIT)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        cumulative = np.cumsum(self.hist)
+        index = int(np.searchsorted(cumulative, q * self.count, side='left'))
+        value = float(np.expm1((min(index, self.hist.size - 1) + 0.5) / BINS_PER_UNIT))
+        return float(np.clip(value, self.min, self.max))
+
+    def box_stats(self, label):
+        """Dicionário no formato esperado por `matplotlib.axes.Axes.bxp`."""
+        q1, med, q3 = (self.quantile(q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        centers = self._centers()[self.hist > 0]
+
+        inside = centers[(centers >= q1 - 1.5 * iqr) & (centers <= q3 + 1.5 * iqr)]
+        whislo = float(np.clip(inside.min(), self.min, q1)) if inside.size else q1
+        whishi = float(np.clip(inside.max(), q3, self.max)) if inside.size else q3
+
+        # Com até `outliers_per_tail` outliers em uma cauda, todos são desenhados; com mais,
+        # os mais extremos. As duas caudas podem conter os mesmos valores (poucas linhas),
+        # mas cada uma só contribui com os seus lados do bigode
+        fliers = np.concatenate([self._low[self._low < whislo], self._high[self._high > whishi]])
+        return {
+            'label': label,
+            'q1': q1,
+            'med': med,
+            'q3': q3,
+            'whislo': whislo,
+            'whishi': whishi,
+            'mean': self.total / self.count if self.count else float('nan'),
+            'fliers': np.sort(fliers),
+        }
+
+
+class ClassDistributions:
+    """Distribuições por classe prevista para um conjunto de variáveis."""
+
+    def __init__(self, columns, label_column='churn_prediction', outliers_per_tail=OUTLIERS_PER_TAIL):
+        self.columns = list(columns)
+        self.label_column = label_column
+        self.outliers_per_tail = outliers_per_tail
+        self.by_class = {}
+
+    def update(self, chunk):
+        labels = chunk[self.label_column].to_numpy()
+        for label in np.unique(labels):
+            mask = labels == label
+            per_column = self.by_class.setdefault(label.item(), {
+                column: ColumnDistribution(self.outliers_per_tail) for column in self.columns
+            })
+            for column in self.columns:
+                per_column[column].update(chunk[column].to_numpy()[mask])
+
+    def grouped(self, label_of):
+        """Novas distribuições por `label_of(grupo)`, somando os grupos de mesmo rótulo."""
+        labels = {}
+        for key in self.by_class:
+            labels.setdefault(label_of(key), []).append(key)
+        result = ClassDistributions(self.columns, self.label_column, self.outliers_per_tail)
+        for label, keys in labels.items():
+            result.by_class[label] = {
+                column: ColumnDistribution.combine([self.by_class[key][column] for key in keys],
+                                                   self.outliers_per_tail)
+                for column in self.columns
+            }
+        return result
+
+    def box_stats(self, column):
+        return [self.by_class[label][column].box_stats(str(label)) for label in sorted(self.by_class)]
+
+
+def draw_boxplot(ax, distributions, column, colors=None):
+    """Desenha o boxplot de `column` por classe a partir das estatísticas acumuladas."""
+    stats = distributions.box_stats(column)
+    if not stats:
+        return ax
+    artists = ax.bxp(stats, showfliers=True, patch_artist=True,
+                     flierprops={'marker': 'o', 'markersize': 3, 'alpha': 0.5})
+    for box, color in zip(artists['boxes'], colors or []):
+        box.set_facecolor(color)
+    return ax
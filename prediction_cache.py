@@ -0,0 +1,114 @@
+"""
+prediction_cache.py
+--------------------
+Cache de probabilidades de churn para vetores de features repetidos em /predict/.
+
+Objetivo:
+- Evitar uma nova inferência para payloads idênticos (ex.: sessões de rejeição com
+  `pageviews=1` e flags zeradas, que formam boa parte do tráfego).
+- Chave: hash (blake2b) do vetor de features quantizado (arredondado a `decimals` casas).
+  O modelo pontua o mesmo vetor quantizado, então acerto e falta devolvem o mesmo valor.
+- Valor: a probabilidade, não a classe; o limiar de cada requisição continua valendo.
+- Limitado em entradas (LRU) e em idade (TTL); entradas vencidas saem na próxima
+  consulta ou pela ordem do LRU.
+- Amarrado à versão do modelo carregado: a primeira consulta com outra versão esvazia o
+  cache, e resultados calculados com a versão anterior são descartados.
+
+Impacto:
+- Acertos não passam pelo modelo, pelo threadpool nem pelo micro-batching.
+"""
+
+
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """LRU + TTL de probabilidades por vetor de features quantizado e versão do modelo."""
+
+    def __init__(self, max_size=10_000, ttl_s=3600.0, decimals=4, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl_s if ttl_s and ttl_s > 0 else None
+        self.decimals = decimals
+        self.clock = clock
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def quantize(self, row: np.ndarray) -> np.ndarray:
+        """Arredonda a linha no lugar (é ela que vai ao modelo em caso de falta)."""
+        np.round(row, self.decimals, out=row)
+        # -0.0 e 0.0 têm bytes diferentes; somar 0.0 normaliza o sinal do zero
+        row += 0.0
+        return row
+
+    def key(self, row: np.ndarray) -> bytes:
+        return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+    def _invalidate(self, version):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self.version = version
+
+    def get(self, version, key):
+        """Probabilidade em cache para a chave, ou None (falta ou entrada vencida)."""
+        with self._lock:
+            if version != self.version:
+                self._invalidate(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                probability, expires_at = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return probability
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, version, key, probability):
+        """Guarda a probabilidade, a menos que o modelo tenha sido trocado durante a inferência."""
+        with self._lock:
+            if version != self.version:
+                return
+            expires_at = None if self.ttl is None else self.clock() + self.ttl
+            self._entries[key] = (probability, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._invalidate(self.version)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl,
+            "decimals": self.decimals,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
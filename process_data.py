@@ -5,7 +5,9 @@ Script de processamento de dados brutos de sessões para criação do dataset de
 
 Objetivo:
 - Realizar limpeza, tratamento de valores nulos e engenharia de atributos (feature engineering).
-- Balancear o dataset para o problema de classificação binária de Churn usando SMOTE.
+- Balancear o dataset para o problema de classificação binária de Churn usando SMOTE
+  (ou outra estratégia de `balancing.py`, via --balance; com 'none' ou 'class_weight' a
+  base é salva sem linhas sintéticas e o balanceamento fica para os folds do treino).
 
 Principais Transformações:
 - Criação de features derivadas: tempo médio por página, ticket médio.
@@ -15,89 +17,175 @@ Impacto:
 - Garante um conjunto de dados mais representativo e robusto para o treinamento dos modelos.
 - Ajuda a melhorar a capacidade preditiva e generalização do modelo.
 
+Desempenho:
+- Leitura apenas das colunas necessárias (`usecols`), com `category` para device/traffic_medium.
+- Todas as features são calculadas de forma vetorizada; flags em int8.
+- A transformação (`feature_transform.py`) é a mesma usada na API e nos dashboards e é
+  salva com os limiares de treino em 'models/feature_transform.json'.
+
+Modo particionado (--partitioned):
+- Cada partição diária de 'data/raw' é processada em paralelo (pool de processos) e salva
+  em Parquet em 'data/processed'; um manifesto evita reprocessar partições inalteradas.
+
+Atributos por visitante (--visitor-features):
+- Atualiza também o estado incremental de `visitor_features.py` (recência, frequência,
+  sessões por janela e receita acumulada por `fullVisitorId`) com as partições novas.
+
+Armazenamento:
+- Entrada e saída em Parquet com esquemas explícitos (`storage.py`), lidas com projeção
+  de colunas e mapeamento em memória. Arquivos CSV antigos continuam sendo lidos.
+
 Resultado:
-- Base processada salva em 'data/processed_sessions.csv' pronta para treinamento.
+- Base processada salva em 'data/processed_sessions.parquet' pronta para treinamento
+  (--csv exporta também 'data/processed_sessions.csv').
 """
 
 
 
 
+import argparse
+import glob
+import json
 import pandas as pd
+import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.model_selection import train_test_split
-from imblearn.over_sampling import SMOTE
-
-def process_data():
-    # Carregar o CSV
-    df = pd.read_csv('data/ga_sessions_sample.csv', dtype={'fullVisitorId': str})
-    print("Dados carregados! Shape inicial:", df.shape)
-
-    # Tratar valores nulos
-    df['pageviews'] = df['pageviews'].fillna(0).astype(int)
-    df['timeOnSite'] = df['timeOnSite'].fillna(0).astype(float)
-    df['transactions'] = df['transactions'].fillna(0).astype(int)
-    df['transactionRevenue'] = df['transactionRevenue'].fillna(0).astype(float)
-
-    # Criar a variável alvo (churn)
-    # Churn = 1 para quem não comprou (transactions = 0)
-    df['churn'] = df['transactions'].apply(lambda x: 1 if x == 0 else 0)
-
-    # Feature Engineering
-    df['tempo_por_pagina'] = df['timeOnSite'] / (df['pageviews'] + 1)
-    df['ticket_medio'] = df['transactionRevenue'] / (df['transactions'] + 1)
-
-    # Criar flags para engajamento
-    df['engajamento_baixo'] = (df['pageviews'] <= 2).astype(int)
-    df['visitante_rapido'] = (df['tempo_por_pagina'] <= 5).astype(int)
-    df['cliente_ticket_alto'] = (df['ticket_medio'] > df['ticket_medio'].median()).astype(int)
-
-    # Simplificar device (mobile, desktop, tablet)
-    df['device_mobile'] = (df['device'] == 'mobile').astype(int)
-    df['device_tablet'] = (df['device'] == 'tablet').astype(int)
-    df['device_desktop'] = (df['device'] == 'desktop').astype(int)
-
-    # Origem da visita
-    df['via_organica'] = df['traffic_medium'].apply(lambda x: 1 if x == 'organic' else 0)
-    df['via_pago'] = df['traffic_medium'].apply(lambda x: 1 if x == 'cpc' else 0)
-
-    # Selecionar apenas as colunas que vamos usar
-    features = [
-        'pageviews',
-        'timeOnSite',
-        'tempo_por_pagina',
-        'ticket_medio',
-        'engajamento_baixo',
-        'visitante_rapido',
-        'cliente_ticket_alto',
-        'device_mobile',
-        'device_tablet',
-        'device_desktop',
-        'via_organica',
-        'via_pago',
-        'churn'
+from balancing import STRATEGIES, resample
+from feature_transform import FeatureTransform, TRANSFORM_PATH
+from inference import FEATURES
+from fileio import file_signature, write_json
+from storage import (MANIFEST_NAME, PARTITION_SCHEMA, PROCESSED_DIR, PROCESSED_PATH, PROCESSED_SCHEMA, RAW_COLUMNS,
+                     RAW_DIR, RAW_DTYPES, RAW_PATH, read_table, write_table)
+from visitor_features import build_visitor_state
+
+def load_raw(path=RAW_PATH):
+    """Lê apenas as colunas necessárias, já com dtypes compactos (Parquet ou CSV antigo)."""
+    return read_table(path, columns=RAW_COLUMNS, dtype=RAW_DTYPES)
+
+def build_features(df, transform=None):
+    """Engenharia de atributos vetorizada, compartilhada com a API e os dashboards.
+
+    Sem `transform`, ajusta uma nova `FeatureTransform` (limiar de ticket alto = mediana).
+    Retorna o DataFrame de features + alvo e a transformação usada.
+    """
+    transform = transform or FeatureTransform().fit(df)
+    features = transform.transform(df)
+
+    # Variável alvo: churn = 1 para quem não comprou (transactions = 0)
+    features['churn'] = (df['transactions'].fillna(0).to_numpy() == 0).astype(np.int8)
+    return features, transform
+
+def process_partition(raw_path, out_path):
+    """Features de uma partição diária, sem os limiares globais, gravadas em Parquet.
+
+    `cliente_ticket_alto` depende da mediana de todo o histórico e é calculada apenas na
+    montagem da base (`load_processed_partitions`), então uma partição nova não obriga a
+    reprocessar as demais.
+    """
+    df = load_raw(raw_path)
+    features = pd.DataFrame(FeatureTransform().base_columns(df))
+    features['churn'] = (df['transactions'].fillna(0).to_numpy() == 0).astype(np.int8)
+    return write_table(features, out_path, PARTITION_SCHEMA)
+
+def process_partitions(raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR, workers=None):
+    """Processa em paralelo (pool de processos) apenas as partições brutas novas ou alteradas."""
+    os.makedirs(processed_dir, exist_ok=True)
+    manifest_path = os.path.join(processed_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    raw_paths = sorted(glob.glob(os.path.join(raw_dir, 'ga_sessions_*.parquet')))
+    outputs = {os.path.basename(p): os.path.join(processed_dir, os.path.basename(p)) for p in raw_paths}
+    signatures = {os.path.basename(p): file_signature(p) for p in raw_paths}
+    changed = [
+        p for p in raw_paths
+        if manifest.get(os.path.basename(p)) != signatures[os.path.basename(p)]
+        or not os.path.exists(outputs[os.path.basename(p)])
     ]
-    df_final = df[features]
-    print("Shape após feature engineering:", df_final.shape)
+    print(f"Partições brutas: {len(raw_paths)} | a processar: {len(changed)}")
+
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for out_path in pool.map(process_partition, changed, [outputs[os.path.basename(p)] for p in changed]):
+                manifest[os.path.basename(out_path)] = signatures[os.path.basename(out_path)]
+
+    # Partições removidas da origem também saem da base processada
+    for name in set(manifest) - set(signatures):
+        stale = os.path.join(processed_dir, name)
+        if os.path.exists(stale):
+            os.remove(stale)
+        del manifest[name]
+
+    write_json(manifest_path, manifest, indent=2, sort_keys=True)
+    return [outputs[name] for name in sorted(outputs)]
+
+def load_processed_partitions(paths):
+    """Monta a base a partir das partições processadas e aplica o limiar global de ticket alto."""
+    df = pd.concat([read_table(p) for p in paths], ignore_index=True)
+    transform = FeatureTransform().fit_ticket_medio(df['ticket_medio'])
+    df['cliente_ticket_alto'] = transform.ticket_flag(df['ticket_medio'])
+    return df[list(FEATURES) + ['churn']], transform
+
+def process_data(partitioned=False, workers=None, csv=False, balance='smote', visitor_features=False):
+    if partitioned:
+        # Partições diárias processadas em paralelo; só as alteradas são refeitas
+        paths = process_partitions(workers=workers)
+        df_final, transform = load_processed_partitions(paths)
+        print("Partições carregadas! Shape após feature engineering:", df_final.shape)
+    else:
+        # Carregar apenas as colunas necessárias (Parquet com esquema explícito)
+        df = load_raw(RAW_PATH)
+        print("Dados carregados! Shape inicial:", df.shape)
+
+        # Feature Engineering em uma única transformação vetorizada
+        df_final, transform = build_features(df)
+        del df
+        print("Shape após feature engineering:", df_final.shape)
+
+    # Agregados por visitante: só as partições ainda não aplicadas ao estado
+    if visitor_features:
+        build_visitor_state(raw_dir=RAW_DIR if partitioned else None, raw_path=RAW_PATH)
+
+    # Salvar a transformação (com o limiar de ticket alto) para uso na API e nos dashboards
+    os.makedirs('models', exist_ok=True)
+    transform.save(TRANSFORM_PATH)
+    print(f"Transformação de features salva em: {TRANSFORM_PATH}")
 
     # Separar X e y
     X = df_final.drop('churn', axis=1)
     y = df_final['churn']
 
-    # Aplicar SMOTE apenas se necessário
-    if len(y.unique()) > 1:
-        print("Aplicando SMOTE para balanceamento...")
-        smote = SMOTE(random_state=42)
-        X_resampled, y_resampled = smote.fit_resample(X, y)
+    # Balancear apenas se necessário (e se a estratégia gerar ou remover linhas)
+    if balance in ('none', 'class_weight'):
+        print(f"Balanceamento não aplicado na base (estratégia '{balance}'); use train_model.py --balance.")
+        df_resampled = df_final
+    elif len(y.unique()) > 1:
+        print(f"Aplicando balanceamento ({balance})...")
+        X_resampled, y_resampled = resample(balance, X, y, n_jobs=workers or -1)
         df_resampled = pd.concat([pd.DataFrame(X_resampled, columns=X.columns), pd.DataFrame(y_resampled, columns=['churn'])], axis=1)
-        print("Balanceamento SMOTE realizado! Shape:", df_resampled.shape)
+        print("Balanceamento realizado! Shape:", df_resampled.shape)
     else:
-        print("SMOTE não aplicado. Apenas uma classe no target.")
+        print("Balanceamento não aplicado. Apenas uma classe no target.")
         df_resampled = df_final.copy()
 
-    # Salvar base processada
+    # Salvar base processada (CSV apenas como exportação opcional)
     os.makedirs('data', exist_ok=True)
-    df_resampled.to_csv('data/processed_sessions.csv', index=False)
-    print("Base processada salva em: data/processed_sessions.csv")
+    write_table(df_resampled, PROCESSED_PATH, PROCESSED_SCHEMA, csv=csv)
+    print(f"Base processada salva em: {PROCESSED_PATH}")
 
 if __name__ == "__main__":
-    process_data()
+    parser = argparse.ArgumentParser(description="Processamento das sessões para o treino.")
+    parser.add_argument('--partitioned', action='store_true',
+                        help="Processa as partições de data/raw (fetch_data.py --partitioned).")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--csv', action='store_true', help="Exporta também a base processada em CSV.")
+    parser.add_argument('--balance', choices=STRATEGIES, default='smote',
+                        help="Estratégia de balanceamento aplicada antes de salvar a base.")
+    parser.add_argument('--visitor-features', action='store_true',
+                        help="Atualiza também os atributos por visitante (visitor_features.py).")
+    args = parser.parse_args()
+    process_data(partitioned=args.partitioned, workers=args.workers, csv=args.csv, balance=args.balance,
+                 visitor_features=args.visitor_features)
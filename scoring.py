@@ -0,0 +1,203 @@
+"""
+scoring.py
+-----------
+Pontuação em streaming de arquivos CSV para os dashboards Streamlit.
+
+Objetivo:
+- Ler o arquivo enviado em blocos (chunks), prever churn bloco a bloco e gravar o
+  resultado incrementalmente em um arquivo temporário para download.
+- Manter agregados acumulados (contagem por classe e médias de `timeOnSite`,
+  `pageviews` e `ticket_medio` por classe) sem guardar o arquivo inteiro em memória.
+- Guardar uma amostra limitada (reservoir sampling) das linhas pontuadas para
+  pré-visualização e as distribuições por classe usadas nos boxplots (`plot_stats.py`).
+- Gravar a probabilidade de churn de cada linha e acumular os agregados por faixa de
+  probabilidade (PROBABILITY_BINS faixas), e não pela classe: contagens, médias e
+  boxplots em outro limiar de decisão saem da soma das faixas, sem chamar o modelo.
+
+Impacto:
+- Uploads com milhões de linhas deixam de estourar a memória do app: o pico de memória
+  fica limitado pelo tamanho do bloco e da amostra.
+"""
+
+
+
+import copy
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from inference import DEFAULT_THRESHOLD, FEATURES, apply_threshold, churn_probability
+from plot_stats import ClassDistributions
+
+SUMMARY_COLUMNS = ['timeOnSite', 'pageviews', 'ticket_medio']
+CHUNKSIZE = int(os.getenv('CHURN_SCORING_CHUNKSIZE', '100000'))
+
+# Resolução dos limiares que podem ser aplicados sem reler o arquivo (passo de 0,01)
+PROBABILITY_BINS = 100
+
+
+def probability_bins(probabilities, bins=PROBABILITY_BINS):
+    """Faixa de cada probabilidade: 0 para p = 0 e k para p em ((k-1)/bins, k/bins].
+
+    Com essas faixas, `p > k/bins` equivale a `faixa > k`, então a classe em qualquer
+    limiar múltiplo de 1/bins é exata (inclusive para probabilidades exatamente no limiar,
+    comuns no RandomForest).
+    """
+    scaled = np.round(np.asarray(probabilities, dtype=np.float64) * bins, 9)
+    return np.clip(np.ceil(scaled), 0, bins).astype(np.int64)
+
+
+class ScoreSummary:
+    """Agregados acumulados de um arquivo pontuado em blocos."""
+
+    def __init__(self, columns=SUMMARY_COLUMNS, sample_size=5000, seed=42, threshold=DEFAULT_THRESHOLD,
+                 bins=PROBABILITY_BINS):
+        self.columns = list(columns)
+        self.sample_size = sample_size
+        self.bins = bins
+        self.threshold = round(threshold * bins) / bins
+        self.n_rows = 0
+        self.bin_counts = np.zeros(bins + 1, dtype=np.int64)
+        self.bin_sums = np.zeros((bins + 1, len(self.columns)))
+        self.sample = None
+        self.bin_distributions = ClassDistributions(self.columns, label_column='_bin')
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        bins = probability_bins(chunk['churn_probability'], self.bins)
+        self.bin_counts += np.bincount(bins, minlength=self.bins + 1)
+        for j, column in enumerate(self.columns):
+            values = chunk[column].to_numpy(dtype=np.float64)
+            self.bin_sums[:, j] += np.bincount(bins, weights=np.nan_to_num(values), minlength=self.bins + 1)
+        self.bin_distributions.update(chunk.assign(_bin=bins))
+
+        # Amostragem uniforme por chaves aleatórias: mantém as `sample_size` menores chaves
+        keyed = chunk.assign(_key=self._rng.random(len(chunk)))
+        if len(keyed) > self.sample_size:
+            keyed = keyed.nsmallest(self.sample_size, '_key')
+        if self.sample is not None:
+            keyed = pd.concat([self.sample, keyed], ignore_index=True)
+        self.sample = keyed.nsmallest(self.sample_size, '_key') if len(keyed) > self.sample_size else keyed
+
+    def at(self, threshold):
+        """O mesmo resumo visto em outro limiar (arredondado para a grade de 1/bins)."""
+        view = copy.copy(self)
+        view.threshold = round(threshold * self.bins) / self.bins
+        return view
+
+    def _split(self):
+        """Primeira faixa classificada como churn no limiar atual."""
+        return int(round(self.threshold * self.bins)) + 1
+
+    @property
+    def counts(self):
+        split = self._split()
+        counts = pd.Series({0: self.bin_counts[:split].sum(), 1: self.bin_counts[split:].sum()}, dtype='int64')
+        return counts[counts > 0]
+
+    @property
+    def sums(self):
+        split = self._split()
+        sums = pd.DataFrame([self.bin_sums[:split].sum(axis=0), self.bin_sums[split:].sum(axis=0)],
+                            index=[0, 1], columns=self.columns)
+        return sums.loc[self.counts.index]
+
+    @property
+    def distributions(self):
+        split = self._split()
+        return self.bin_distributions.grouped(lambda b: int(b >= split))
+
+    def means(self):
+        """Médias por classe (linhas = classe prevista, colunas = variáveis)."""
+        return self.sums.div(self.counts, axis=0)
+
+    def mean(self, label, column):
+        means = self.means()
+        return float(means.loc[label, column]) if label in means.index else float('nan')
+
+    def churn_percent(self):
+        return float(self.counts.get(1, 0)) / self.n_rows * 100 if self.n_rows else 0.0
+
+    def counts_table(self):
+        return self.counts.sort_index().rename('Quantidade').rename_axis('churn_prediction').reset_index()
+
+    def sample_frame(self):
+        if self.sample is None:
+            return pd.DataFrame()
+        sample = self.sample.drop(columns='_key').reset_index(drop=True)
+        sample['churn_prediction'] = apply_threshold(sample['churn_probability'], self.threshold)
+        return sample
+
+
+def temp_output_path(previous=None):
+    """Cria um arquivo temporário para o resultado, removendo o da execução anterior."""
+    if previous and os.path.exists(previous):
+        os.remove(previous)
+    with tempfile.NamedTemporaryFile(prefix='churn_scored_', suffix='.csv', delete=False) as f:
+        return f.name
+
+
+def output_path_for(key, directory=None):
+    """Caminho estável do resultado de um arquivo (chave = hash do conteúdo + versão do modelo)."""
+    directory = directory or os.path.join(tempfile.gettempdir(), 'churn_scoring')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'churn_scored_{key}.csv')
+
+
+def prune_outputs(keep, directory=None):
+    """Remove os resultados mais antigos, mantendo no máximo `keep` arquivos."""
+    directory = directory or os.path.join(tempfile.gettempdir(), 'churn_scoring')
+    if not os.path.isdir(directory):
+        return
+    paths = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.startswith('churn_scored_')),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for path in paths[keep:]:
+        os.remove(path)
+
+
+def score_csv_stream(source, model, out_path, chunksize=CHUNKSIZE, progress=None, summary=None, transform=None,
+                     threshold=DEFAULT_THRESHOLD):
+    """Pontua um CSV em blocos, gravando o resultado em `out_path`.
+
+    `progress`, se informado, recebe a fração (0 a 1) do arquivo já processada.
+    Com `transform` (FeatureTransform), arquivos com apenas os campos brutos da sessão
+    recebem as features calculadas bloco a bloco.
+    O arquivo gravado traz `churn_probability` e `churn_prediction` no limiar `threshold`.
+    Só as 12 features vão ao modelo; as demais colunas (ids, campos brutos) seguem apenas
+    para o arquivo de saída.
+    """
+    summary = summary or ScoreSummary(threshold=threshold)
+    total_bytes = getattr(source, 'size', None)
+
+    with open(out_path, 'w', newline='') as out:
+        for i, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+            if transform is not None:
+                chunk = transform.ensure_features(chunk)
+            missing = [name for name in FEATURES if name not in chunk.columns]
+            if missing:
+                raise ValueError(f"Arquivo sem as features do modelo: {missing}")
+            chunk['churn_probability'] = churn_probability(model, chunk[list(FEATURES)])
+            chunk['churn_prediction'] = apply_threshold(chunk['churn_probability'], summary.threshold)
+            summary.update(chunk)
+            chunk.to_csv(out, index=False, header=(i == 0))
+            if progress is not None and total_bytes:
+                progress(min(source.tell() / total_bytes, 1.0))
+
+    if progress is not None:
+        progress(1.0)
+    return summary
+
+
+def rethreshold_csv(scored_path, out_path, threshold, chunksize=CHUNKSIZE):
+    """Regrava um arquivo já pontuado com `churn_prediction` em outro limiar (sem o modelo)."""
+    with open(out_path, 'w', newline='') as out:
+        for i, chunk in enumerate(pd.read_csv(scored_path, chunksize=chunksize)):
+            chunk['churn_prediction'] = apply_threshold(chunk['churn_probability'], threshold)
+            chunk.to_csv(out, index=False, header=(i == 0))
+    return out_path
@@ -0,0 +1,176 @@
+"""
+shared_model.py
+----------------
+Modelo compartilhado entre processos (workers do uvicorn) via arquivos mapeados em memória.
+
+Objetivo:
+- Escrever uma única vez os arrays do modelo compilado em um diretório compartilhado
+  (ex.: /dev/shm/churn-model, memória compartilhada do Linux).
+- Fazer cada worker abrir esses arrays somente leitura com `mmap_mode='r'`, de modo que
+  as páginas físicas sejam as mesmas para todos os processos.
+- Informar o uso de memória (RSS) de cada worker para confirmar o compartilhamento.
+
+Impacto:
+- Com N workers, o modelo ocupa a RAM uma vez só, em vez de N cópias desserializadas.
+"""
+
+
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from compiled_model import ARRAYS, compile_model
+from fileio import write_json
+
+WORKERS_DIR = 'workers'
+
+logger = logging.getLogger(__name__)
+
+
+def source_signature(pickle_path, compiled_path):
+    """Assinatura dos artefatos de origem (tamanho + mtime) para detectar novas versões."""
+    parts = []
+    for path in (os.path.join(compiled_path, 'meta.json'), pickle_path):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def _materialize(dest, pickle_path, compiled_path, check=None):
+    """Grava em `dest` os arrays do modelo compilado, compilando o pickle se necessário.
+
+    `check(path)` é chamado antes de ler o artefato de origem (ver `load_serving_model`).
+    """
+    compiled_meta = os.path.join(compiled_path, 'meta.json')
+    if os.path.exists(compiled_meta) and (
+        not os.path.exists(pickle_path) or os.path.getmtime(compiled_meta) >= os.path.getmtime(pickle_path)
+    ):
+        if check:
+            check(compiled_path)
+        for name in [f'{a}.npy' for a in ARRAYS] + ['meta.json']:
+            shutil.copyfile(os.path.join(compiled_path, name), os.path.join(dest, name))
+    else:
+        import joblib
+        if check:
+            check(pickle_path)
+        compile_model(joblib.load(pickle_path)).save(dest)
+
+
+def ensure_shared_model(shared_dir, pickle_path, compiled_path, check=None):
+    """Garante a cópia compartilhada do modelo e retorna o seu diretório.
+
+    O primeiro worker a chegar grava os arrays (sob lock de arquivo, com rename atômico);
+    os demais apenas reutilizam o diretório já publicado.
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    target = os.path.join(shared_dir, source_signature(pickle_path, compiled_path))
+    if os.path.exists(os.path.join(target, 'meta.json')):
+        return target
+
+    with open(os.path.join(shared_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(os.path.join(target, 'meta.json')):
+                tmp = tempfile.mkdtemp(dir=shared_dir, prefix='.tmp-')
+                try:
+                    _materialize(tmp, pickle_path, compiled_path, check)
+                    os.rename(tmp, target)
+                except Exception:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return target
+
+
+def prune_shared_models(shared_dir, keep):
+    """Remove as cópias de modelo em `shared_dir` fora de `keep` (diretórios); retorna as removidas.
+
+    Em tmpfs (/dev/shm), cada versão promovida deixa uma cópia inteira dos arrays na RAM.
+    Roda sob o mesmo lock da publicação, então nunca remove uma cópia sendo gravada;
+    workers que ainda mapeiam uma cópia removida seguem com ela até trocarem de versão.
+    """
+    keep = {os.path.basename(os.path.normpath(path)) for path in keep if path}
+    removed = []
+    with open(os.path.join(shared_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            for name in sorted(os.listdir(shared_dir)):
+                path = os.path.join(shared_dir, name)
+                if name in keep or not os.path.exists(os.path.join(path, 'meta.json')):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    if removed:
+        logger.info("Cópias antigas do modelo removidas de %s: %s", shared_dir, ', '.join(removed))
+    return removed
+
+
+def process_memory():
+    """Memória do processo atual em kB (RSS total, privada, de arquivos e compartilhada)."""
+    fields = {'VmRSS': 'rss_kb', 'RssAnon': 'anon_kb', 'RssFile': 'file_kb', 'RssShmem': 'shmem_kb'}
+    memory = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    memory[fields[key]] = int(value.split()[0])
+    except OSError:
+        import resource
+        memory['rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memory
+
+
+def report_worker(shared_dir):
+    """Publica a memória deste worker para que qualquer worker possa listar todos."""
+    workers_dir = os.path.join(shared_dir, WORKERS_DIR)
+    os.makedirs(workers_dir, exist_ok=True)
+    report = {"pid": os.getpid(), "updated_at": time.time(), **process_memory()}
+    write_json(os.path.join(workers_dir, f'{os.getpid()}.json'), report)
+    return report
+
+
+def worker_reports(shared_dir):
+    """Últimos relatórios de memória dos workers ainda vivos."""
+    workers_dir = os.path.join(shared_dir, WORKERS_DIR)
+    reports = []
+    if not os.path.isdir(workers_dir):
+        return reports
+    for name in sorted(os.listdir(workers_dir)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(workers_dir, name)
+        try:
+            with open(path) as f:
+                report = json.load(f)
+            os.kill(report['pid'], 0)
+        except ProcessLookupError:
+            os.remove(path)
+            continue
+        except (OSError, ValueError):
+            continue
+        reports.append(report)
+    return reports
+
+
+def start_worker_reporter(shared_dir, interval=15.0):
+    """Atualiza periodicamente o relatório de memória deste worker em segundo plano."""
+    def loop():
+        while True:
+            report_worker(shared_dir)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='worker-memory-reporter', daemon=True)
+    thread.start()
+    return thread
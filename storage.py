@@ -0,0 +1,178 @@
+"""
+storage.py
+-----------
+Armazenamento colunar (Parquet / Arrow IPC) dos datasets intermediários do pipeline.
+
+Objetivo:
+- Definir esquemas explícitos (pyarrow) para as sessões brutas e para a base processada,
+  de modo que nenhum script precise adivinhar dtypes a cada leitura.
+- Ler apenas as colunas pedidas (projeção) e com mapeamento em memória, em vez de
+  reinterpretar o CSV inteiro como texto.
+- Manter o CSV apenas como exportação opcional (`write_table(..., csv=True)`).
+
+Formatos (pela extensão do arquivo):
+- '.parquet': compactado (zstd), menor em disco; padrão do pipeline.
+- '.feather' / '.arrow': Arrow IPC sem compressão, lido sem cópia via mmap.
+- '.csv': apenas leitura de arquivos antigos e exportação.
+
+Impacto:
+- `process_data.py` e `train_model.py` deixam de reparsear texto a cada execução e
+  carregam só as colunas usadas, com dtypes compactos já definidos no arquivo.
+"""
+
+
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from feature_transform import RAW_FIELDS
+from inference import FEATURES
+
+RAW_PATH = 'data/ga_sessions_sample.parquet'
+PROCESSED_PATH = 'data/processed_sessions.parquet'
+
+# Diretórios do modo particionado (fetch_data.py --partitioned, process_data.py) e o
+# manifesto de assinaturas gravado em cada um
+RAW_DIR = 'data/raw'
+PROCESSED_DIR = 'data/processed'
+MANIFEST_NAME = '_manifest.json'
+
+PARQUET_COMPRESSION = 'zstd'
+FORMATS = ('.parquet', '.feather', '.arrow', '.csv')
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# Sessões como retornadas pela query de fetch_data.py (inteiros do BigQuery aceitam nulos)
+RAW_SCHEMA = pa.schema([
+    ('fullVisitorId', pa.string()),
+    ('visitId', pa.int64()),
+    ('date', pa.string()),
+    ('device', _CATEGORY),
+    ('os', _CATEGORY),
+    ('country', _CATEGORY),
+    ('traffic_medium', _CATEGORY),
+    ('traffic_source', _CATEGORY),
+    ('pageviews', pa.int64()),
+    ('timeOnSite', pa.int64()),
+    ('transactions', pa.int64()),
+    ('transactionRevenue', pa.int64()),
+])
+
+# Apenas as colunas brutas usadas na engenharia de atributos (feature_transform.RAW_FIELDS),
+# com dtypes compactos: categorias do esquema como 'category', contagens em float32 e
+# valores em float64 (floats aceitam os nulos do BigQuery)
+RAW_COLUMNS = list(RAW_FIELDS)
+_RAW_COUNT_COLUMNS = ('pageviews', 'transactions')
+RAW_DTYPES = {
+    name: 'category' if pa.types.is_dictionary(RAW_SCHEMA.field(name).type)
+    else 'float32' if name in _RAW_COUNT_COLUMNS else 'float64'
+    for name in RAW_COLUMNS
+}
+
+# Base de treino: as 12 features na ordem do modelo + alvo, com flags em int8
+_FEATURE_TYPES = {
+    'pageviews': pa.int32(),
+    'timeOnSite': pa.float64(),
+    'tempo_por_pagina': pa.float64(),
+    'ticket_medio': pa.float64(),
+}
+PROCESSED_SCHEMA = pa.schema(
+    [(name, _FEATURE_TYPES.get(name, pa.int8())) for name in FEATURES] + [('churn', pa.int8())]
+)
+
+# Partições processadas ainda sem `cliente_ticket_alto` (limiar global aplicado na montagem)
+PARTITION_SCHEMA = PROCESSED_SCHEMA.remove(PROCESSED_SCHEMA.get_field_index('cliente_ticket_alto'))
+
+
+def _extension(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Formato não suportado: {path!r} (esperado um de {FORMATS})")
+    return ext
+
+
+def existing_path(path):
+    """Retorna `path` ou, se não existir, o mesmo dataset em outro formato (ex.: CSV antigo)."""
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for ext in FORMATS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+    raise FileNotFoundError(f"Dataset não encontrado: {path} (nem em outro formato)")
+
+
+def to_arrow(df, schema):
+    """Converte o DataFrame para uma tabela Arrow no esquema dado (colunas na ordem do esquema)."""
+    missing = [name for name in schema.names if name not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas ausentes para o esquema: {missing}")
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def write_table(df, path, schema, csv=False):
+    """Grava `df` no formato indicado pela extensão de `path` (escrita atômica).
+
+    Com `csv=True`, exporta também uma cópia em CSV ao lado do arquivo colunar.
+    """
+    ext = _extension(path)
+    tmp = path + '.tmp'
+    if ext == '.csv':
+        df[schema.names].to_csv(tmp, index=False)
+    else:
+        table = to_arrow(df, schema)
+        if ext == '.parquet':
+            pq.write_table(table, tmp, compression=PARQUET_COMPRESSION)
+        else:
+            feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, path)
+
+    if csv and ext != '.csv':
+        write_table(df, os.path.splitext(path)[0] + '.csv', schema)
+    return path
+
+
+def merge_parquet(paths, path, schema):
+    """Concatena arquivos Parquet em um único arquivo, um grupo de linhas por vez.
+
+    Apenas um arquivo de entrada fica em memória por vez (memória constante).
+    """
+    tmp = path + '.tmp'
+    with pq.ParquetWriter(tmp, schema, compression=PARQUET_COMPRESSION) as writer:
+        for part in paths:
+            parquet_file = pq.ParquetFile(part, memory_map=True)
+            for i in range(parquet_file.num_row_groups):
+                writer.write_table(parquet_file.read_row_group(i).cast(schema))
+    os.replace(tmp, path)
+    return path
+
+
+def read_arrow(path, columns=None):
+    """Lê o arquivo como tabela Arrow, apenas com `columns`, via mapeamento em memória."""
+    ext = _extension(path)
+    if ext == '.parquet':
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if ext == '.csv':
+        return pa.Table.from_pandas(pd.read_csv(path, usecols=columns), preserve_index=False)
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def read_table(path, columns=None, dtype=None):
+    """Lê o dataset como DataFrame, apenas com `columns`.
+
+    Arquivos colunares já trazem os tipos do esquema; `dtype` é aplicado por cima (e é
+    o que define os tipos ao ler um CSV).
+    """
+    path = existing_path(path)
+    if _extension(path) == '.csv':
+        df = pd.read_csv(path, usecols=columns, dtype=dtype)
+        return df[columns] if columns is not None else df
+
+    # self_destruct libera os buffers Arrow à medida que as colunas viram pandas
+    df = read_arrow(path, columns).to_pandas(split_blocks=True, self_destruct=True)
+    return df.astype(dtype) if dtype else df
@@ -0,0 +1,81 @@
+"""Paridade do modelo compilado com o `predict_proba` nativo de cada biblioteca."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from compiled_model import CompiledEnsemble, HybridModel, compile_model, verify_parity
+from inference import FEATURES
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.gamma(2.0, 20.0, (3000, len(FEATURES))), columns=list(FEATURES))
+    y = ((X['pageviews'] + rng.normal(0, 20, len(X))) > 40).astype(int)
+    return X, y
+
+
+def assert_parity(model, X, atol=1e-5):
+    compiled = compile_model(model, feature_names=list(FEATURES))
+    expected = model.predict_proba(X)[:, 1]
+    np.testing.assert_allclose(compiled.predict_proba(X.to_numpy())[:, 1], expected, atol=atol)
+    # DataFrame com as colunas fora de ordem é reordenado pelos nomes de treino
+    np.testing.assert_allclose(compiled.predict_proba(X[X.columns[::-1]])[:, 1], expected, atol=atol)
+    return compiled
+
+
+def test_random_forest(data):
+    from sklearn.ensemble import RandomForestClassifier
+    X, y = data
+    # Profundidade padrão (sem limite): folhas em profundidades muito diferentes
+    model = RandomForestClassifier(n_estimators=30, random_state=0).fit(X, y)
+    assert_parity(model, X)
+
+
+def test_xgboost_with_early_stopping(data):
+    xgb = pytest.importorskip('xgboost')
+    X, y = data
+    model = xgb.XGBClassifier(n_estimators=300, max_depth=4, learning_rate=0.3, early_stopping_rounds=5,
+                              eval_metric='logloss', random_state=0)
+    model.fit(X[:2000], y[:2000], eval_set=[(X[2000:], y[2000:])], verbose=False)
+    assert model.best_iteration < 299
+    compiled = assert_parity(model, X)
+    assert compiled.meta['n_trees'] == model.best_iteration + 1
+
+
+def test_lightgbm(data):
+    lgb = pytest.importorskip('lightgbm')
+    X, y = data
+    model = lgb.LGBMClassifier(n_estimators=50, num_leaves=15, random_state=0, verbose=-1).fit(X, y)
+    assert_parity(model, X)
+
+
+def test_save_load_mmap(data, tmp_path):
+    from sklearn.ensemble import RandomForestClassifier
+    X, y = data
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    compile_model(model, feature_names=list(FEATURES)).save(tmp_path)
+    loaded = CompiledEnsemble.load(tmp_path, mmap_mode='r')
+    assert verify_parity(model, loaded, X) <= 1e-5
+
+
+def test_hybrid_uses_native_for_large_batches(data):
+    from sklearn.ensemble import RandomForestClassifier
+    X, y = data
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    compiled = compile_model(model, feature_names=list(FEATURES))
+
+    class Native:
+        calls = 0
+
+        def predict_proba(self, X):
+            Native.calls += 1
+            return model.predict_proba(X)
+
+    hybrid = HybridModel(compiled, Native, max_rows=10)
+    assert hybrid.wait_native(timeout=5)
+    hybrid.predict_proba(X[:10])
+    assert Native.calls == 0
+    np.testing.assert_allclose(hybrid.predict_proba(X)[:, 1], model.predict_proba(X)[:, 1], atol=1e-5)
+    assert Native.calls == 1
@@ -0,0 +1,102 @@
+"""Extração em streaming e particionada contra o cliente falso do BigQuery, sem rede."""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_sessions
+from fake_bigquery import FakeBigQueryClient
+from fetch_data import CHECKPOINT_NAME, fetch_bigquery_stream
+from storage import read_table
+
+
+@pytest.fixture(scope='module')
+def sessions():
+    return make_sessions(2_000, seed=3, start_date='2017-01-01', days=5)
+
+
+def expected_rows(sessions, start, end):
+    mask = sessions['date'].between(start, end) & sessions['pageviews'].notna()
+    return sessions[mask].sort_values('visitId').reset_index(drop=True)
+
+
+def test_stream_resumes_from_checkpoint(tmp_path, sessions):
+    path = str(tmp_path / 'ga_sessions.parquet')
+    client = FakeBigQueryClient(sessions, fail_after_pages=3)
+    with pytest.raises(ConnectionError):
+        fetch_bigquery_stream(client, path, page_size=200, start='20170101', end='20170105')
+
+    with open(os.path.join(path + '.parts', CHECKPOINT_NAME)) as f:
+        checkpoint = json.load(f)
+    assert checkpoint['rows_written'] == 600 and checkpoint['parts'] == 3
+
+    # A retomada lê as páginas restantes do mesmo job, sem uma nova consulta
+    client.fail_after_pages = None
+    queries = len(client.queries)
+    fetch_bigquery_stream(client, path, page_size=200, start='20170101', end='20170105')
+    assert len(client.queries) == queries
+    assert not os.path.exists(path + '.parts')
+
+    result = read_table(path).sort_values('visitId').reset_index(drop=True)
+    expected = expected_rows(sessions, '20170101', '20170105')
+    assert len(result) == len(expected)
+    pd.testing.assert_series_equal(result['visitId'], expected['visitId'], check_dtype=False)
+
+
+def test_stream_restarts_for_another_date_range(tmp_path, sessions):
+    path = str(tmp_path / 'ga_sessions.parquet')
+    client = FakeBigQueryClient(sessions, fail_after_pages=1)
+    with pytest.raises(ConnectionError):
+        fetch_bigquery_stream(client, path, page_size=200, start='20170101', end='20170105')
+
+    client.fail_after_pages = None
+    fetch_bigquery_stream(client, path, page_size=200, start='20170102', end='20170103')
+    assert len(client.queries) == 2
+    result = read_table(path)
+    assert len(result) == len(expected_rows(sessions, '20170102', '20170103'))
+    assert set(result['date']) == {'20170102', '20170103'}
+
+
+def test_partitioned_fetch_downloads_only_changed_partitions(tmp_path, sessions):
+    from fetch_data import fetch_partitions, load_manifest
+    from process_data import process_partitions
+
+    raw_dir, processed_dir = str(tmp_path / 'raw'), str(tmp_path / 'processed')
+    client = FakeBigQueryClient(sessions)
+    suffixes = ['20170101', '20170102', '20170103', '20170104', '20170105']
+    assert fetch_partitions(client, '20170101', '20170105', out_dir=raw_dir, workers=2) == suffixes
+    assert sorted(load_manifest(raw_dir)) == suffixes
+    assert len(process_partitions(raw_dir, processed_dir, workers=1)) == 5
+
+    # Nada mudou: nenhuma partição é baixada nem reprocessada
+    assert fetch_partitions(client, '20170101', '20170105', out_dir=raw_dir, workers=2) == []
+    processed_mtimes = {name: os.path.getmtime(os.path.join(processed_dir, name))
+                        for name in os.listdir(processed_dir) if name.endswith('.parquet')}
+    process_partitions(raw_dir, processed_dir, workers=1)
+    assert all(os.path.getmtime(os.path.join(processed_dir, name)) == mtime
+               for name, mtime in processed_mtimes.items())
+
+    # Uma partição atualizada na origem (ou apagada localmente) volta a ser baixada
+    client.touch('20170103')
+    os.remove(os.path.join(raw_dir, 'ga_sessions_20170105.parquet'))
+    assert fetch_partitions(client, '20170101', '20170105', out_dir=raw_dir, workers=2) == ['20170103', '20170105']
+    process_partitions(raw_dir, processed_dir, workers=1)
+    changed = {name for name, mtime in processed_mtimes.items()
+               if os.path.getmtime(os.path.join(processed_dir, name)) != mtime}
+    assert changed == {'ga_sessions_20170103.parquet', 'ga_sessions_20170105.parquet'}
+
+    day = read_table(os.path.join(raw_dir, 'ga_sessions_20170103.parquet'))
+    assert len(day) == len(expected_rows(sessions, '20170103', '20170103'))
+
+
+@pytest.mark.parametrize('flags', [['--partitioned', '--csv'], ['--partitioned', '--stream']])
+def test_partitioned_rejects_ignored_flags(flags):
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, os.path.join(root, 'fetch_data.py'), *flags],
+                            capture_output=True, text=True)
+    assert result.returncode == 2 and '--partitioned' in result.stderr
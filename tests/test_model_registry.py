@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+from sklearn.ensemble import RandomForestClassifier
+
+import model_registry as mr
+from compiled_model import compile_model
+from inference import FEATURES
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((200, len(FEATURES))), columns=list(FEATURES))
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, (X.iloc[:, 0] > 0.5).astype(int))
+    return model, compile_model(model, feature_names=list(FEATURES))
+
+
+def test_publish_keeps_last_versions_and_latest(tmp_path, fitted):
+    model, compiled = fitted
+    versions = [mr.publish(model, compiled, tmp_path, transform_path=None, keep=2) for _ in range(4)]
+    assert versions == sorted(versions) and len(set(versions)) == 4
+    assert mr.list_versions(tmp_path) == versions[-2:]
+
+    mr.set_latest(versions[-2], tmp_path)
+    mr.publish(model, compiled, tmp_path, transform_path=None, promote=False, keep=1)
+    assert versions[-2] in mr.list_versions(tmp_path)
+    assert len(mr.list_versions(tmp_path)) == 2
+
+
+def test_verify_only_requested_artifacts(tmp_path, fitted):
+    model, compiled = fitted
+    version = mr.publish(model, compiled, tmp_path, transform_path=None)
+    with open(os.path.join(mr.version_dir(version, tmp_path), mr.MODEL_NAME), 'ab') as f:
+        f.write(b'x')
+
+    assert mr.verify(version, tmp_path, [mr.COMPILED_NAME])
+    with pytest.raises(ValueError, match=mr.MODEL_NAME):
+        mr.verify(version, tmp_path)
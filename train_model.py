@@ -13,8 +13,14 @@ Modelos Utilizados:
 - LightGBM
 
 Técnicas Adicionais:
-- Balanceamento de classes usando SMOTE
-- Avaliação por Cross-Validation (5 folds)
+- Balanceamento de classes usando SMOTE (em process_data.py) ou, com --balance, dentro
+  dos folds do treino (`balancing.py`), sem base sintética em disco
+- Avaliação por Cross-Validation (5 folds), com os jobs candidato x fold em paralelo e
+  resultados em cache em disco (`model_selection.py`)
+- Retreino incremental (--incremental) a partir de novas partições, continuando o modelo
+  atual (`incremental_training.py`)
+- Busca de hiperparâmetros opcional (--search) por successive halving, com early stopping
+  nos boosters, orçamento de tempo e retomada (`hyperparameter_search.py`)
 
 Impacto:
 - Antecipar clientes com risco de abandono.
@@ -23,29 +29,37 @@ Impacto:
 
 Resultado:
 - Modelo salvo em 'models/churn_model.pkl' pronto para ser usado em produção via API.
+- Relatório de tempos por modelo em 'models/training_report.json'.
+- Nova versão publicada no registro de modelos ('models/registry/', ver model_registry.py),
+  com métricas de teste e checksums, e promovida a LATEST (a API troca o modelo sozinha).
+- Versão compilada (tabelas de nós + avaliador NumPy) salva em 'models/churn_model_compiled/',
+  validada contra as previsões do modelo original no conjunto de teste.
 """
 
 
 
-import pandas as pd
+import argparse
+import json
 import joblib
 import os
+import time
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
-from sklearn.ensemble import RandomForestClassifier
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
-from sklearn.metrics import classification_report, confusion_matrix
-
-def evaluate_model(model, X, y):
-    """Avalia o modelo usando cross-validation."""
-    skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    scores = cross_val_score(model, X, y, cv=skf, scoring='f1')
-    return scores.mean()
-
-def train_models():
-    # Carregar o dataset
-    df = pd.read_csv('data/processed_sessions.csv')
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, f1_score, precision_score, recall_score
+from compiled_model import compile_model, verify_parity
+from model_selection import CACHE_DIR, make_estimator, print_report, select_model
+import hyperparameter_search
+from balancing import STRATEGIES, estimator_params, resample
+from incremental_training import N_NEW_ESTIMATORS, retrain_incremental
+from model_registry import KEEP_VERSIONS, publish
+from storage import PROCESSED_PATH, read_table
+
+REPORT_PATH = 'models/training_report.json'
+
+def train_models(n_jobs=-1, cache_dir=CACHE_DIR, search=False, search_budget=3600.0, search_configs=9, balance='none',
+                 keep_versions=KEEP_VERSIONS):
+    # Carregar o dataset (Parquet com esquema explícito; CSV antigo como alternativa)
+    df = read_table(PROCESSED_PATH)
     print("Dados carregados para treinamento! Shape:", df.shape)
 
     # Separar features e target
@@ -57,28 +71,27 @@ def train_models():
         X, y, stratify=y, test_size=0.2, random_state=42
     )
 
-    # Definir os modelos que vamos testar
-    models = {
-        "RandomForest": RandomForestClassifier(random_state=42),
-        "XGBoost": XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42),
-        "LightGBM": LGBMClassifier(random_state=42)
-    }
-
-    model_scores = {}
-
-    # Avaliar todos os modelos
-    for name, model in models.items():
-        score = evaluate_model(model, X_train, y_train)
-        model_scores[name] = score
-        print(f"{name} - F1-Score (Cross-Validation 5 folds): {score:.4f}")
-
-    # Escolher o melhor modelo
-    best_model_name = max(model_scores, key=model_scores.get)
-    best_model = models[best_model_name]
+    if search:
+        # Busca de hiperparâmetros (successive halving) sobre os três candidatos
+        best_model_name, best_params, report = hyperparameter_search.search(
+            X_train, y_train, n_configs=search_configs, budget_s=search_budget, n_jobs=n_jobs, balance=balance
+        )
+        hyperparameter_search.print_report(report)
+    else:
+        # Avaliar todos os modelos (candidato x fold em paralelo, folds já calculados vêm do cache)
+        best_model_name, report = select_model(X_train, y_train, n_jobs=n_jobs, cache_dir=cache_dir, balance=balance)
+        print_report(report)
+        best_params = report['candidates'][best_model_name]['params']
     print(f"\n✅ Melhor modelo: {best_model_name}")
 
-    # Treinar o melhor modelo no conjunto de treino
-    best_model.fit(X_train, y_train)
+    # Treinar o melhor modelo no conjunto de treino, com a mesma configuração e todos os núcleos
+    # (o balanceamento, se houver, vale só para o ajuste; o teste fica com a distribuição real)
+    best_model = make_estimator(best_model_name, {**best_params, **estimator_params(balance, best_model_name, y_train)},
+                                n_jobs=n_jobs)
+    start = time.perf_counter()
+    best_model.fit(*resample(balance, X_train, y_train, n_jobs=n_jobs))
+    report['refit_time'] = time.perf_counter() - start
+    print(f"Ajuste final: {report['refit_time']:.2f} s")
 
     # Avaliar no conjunto de teste
     y_pred = best_model.predict(X_test)
@@ -107,5 +120,60 @@ def train_models():
     joblib.dump(best_model, 'models/churn_model.pkl')
     print("\nModelo salvo em: models/churn_model.pkl")
 
+    # Exportar o modelo achatado (tabelas de nós) para servir sem sklearn/xgboost/lightgbm
+    compiled = compile_model(best_model, feature_names=X.columns)
+    max_diff = verify_parity(best_model, compiled, X_test)
+    compiled.save('models/churn_model_compiled')
+    print(f"Modelo compilado salvo em: models/churn_model_compiled (paridade OK, diferença máxima {max_diff:.2e})")
+
+    # Relatório de tempos por modelo
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Relatório de tempos salvo em: {REPORT_PATH}")
+
+    # Publicar no registro de modelos e promover a versão
+    metrics = {
+        'f1': float(f1_score(y_test, y_pred)),
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'precision': float(precision_score(y_test, y_pred)),
+        'recall': float(recall_score(y_test, y_pred)),
+    }
+    version = publish(best_model, compiled, metrics=metrics,
+                      info={'candidate': best_model_name, 'params': best_params, 'balance': balance},
+                      keep=keep_versions)
+    print(f"Versão {version} publicada no registro de modelos (LATEST).")
+
+def train_incremental(partitions, n_new_estimators=N_NEW_ESTIMATORS, balance='none', n_jobs=-1, promote=False,
+                      keep_versions=KEEP_VERSIONS):
+    """Continua o modelo salvo com as partições novas (ver incremental_training.py)."""
+    full_fit_time = None
+    if os.path.exists(REPORT_PATH):
+        with open(REPORT_PATH) as f:
+            full_fit_time = json.load(f).get('refit_time')
+    return retrain_incremental(partitions, n_new_estimators=n_new_estimators, balance=balance, n_jobs=n_jobs,
+                               promote=promote, full_fit_time=full_fit_time, keep_versions=keep_versions)
+
 if __name__ == "__main__":
-    train_models()
+    parser = argparse.ArgumentParser(description="Treinamento e seleção do modelo de churn.")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Processos da validação cruzada (-1 = todos os núcleos).")
+    parser.add_argument('--no-cache', action='store_true', help="Não lê nem grava o cache de folds em disco.")
+    parser.add_argument('--search', action='store_true', help="Busca de hiperparâmetros por successive halving.")
+    parser.add_argument('--search-budget', type=float, default=3600.0, help="Orçamento da busca, em segundos.")
+    parser.add_argument('--search-configs', type=int, default=9, help="Configurações sorteadas por candidato.")
+    parser.add_argument('--balance', choices=STRATEGIES, default='none',
+                        help="Balanceamento aplicado dentro dos folds e no ajuste final (use com process_data.py --balance none).")
+    parser.add_argument('--incremental', nargs='+', metavar='PARTICAO',
+                        help="Continua o modelo atual só com as partições processadas informadas.")
+    parser.add_argument('--new-estimators', type=int, default=N_NEW_ESTIMATORS,
+                        help="Árvores/rodadas acrescentadas no modo incremental.")
+    parser.add_argument('--promote', action='store_true', help="Modo incremental: promove a nova versão a LATEST no registro.")
+    parser.add_argument('--keep-versions', type=int, default=KEEP_VERSIONS,
+                        help="Versões mantidas no registro após publicar (a LATEST nunca é removida; 0 = todas).")
+    args = parser.parse_args()
+    if args.incremental:
+        train_incremental(args.incremental, n_new_estimators=args.new_estimators, balance=args.balance,
+                          n_jobs=args.n_jobs, promote=args.promote, keep_versions=args.keep_versions)
+    else:
+        train_models(n_jobs=args.n_jobs, cache_dir=None if args.no_cache else CACHE_DIR, search=args.search,
+                     search_budget=args.search_budget, search_configs=args.search_configs, balance=args.balance,
+                     keep_versions=args.keep_versions)
@@ -0,0 +1,399 @@
+"""
+visitor_features.py
+--------------------
+Atributos agregados por visitante (`fullVisitorId`) sobre o histórico de sessões.
+
+Objetivo:
+- Calcular, por visitante: primeira e última visita, recência, tempo de casa, número de
+  sessões (total e nas janelas de WINDOWS dias), frequência semanal, pageviews,
+  transações e receita acumuladas até a data de referência (`as_of`, último dia visto).
+- Cálculo vetorizado com uma única ordenação: as sessões são ordenadas por
+  (visitante, dia) e os grupos viram fatias contíguas, agregadas com `np.add.reduceat`.
+- Estado incremental: cada nova partição diária ('data/raw', ver fetch_data.py
+  --partitioned) é agregada sozinha e mesclada apenas nas linhas dos visitantes que
+  aparecem nela (`searchsorted` + `np.insert` para visitantes novos). As contagens por
+  janela vêm de uma tabela de sessões recentes (visitante, dia, sessões) limitada aos
+  últimos max(WINDOWS) dias, e não do histórico completo.
+- Índice compacto em disco para a API: ids ordenados em uint64 (`ids.npy`) e uma coluna
+  por arquivo `.npy`, abertos com mmap e consultados por `searchsorted`.
+
+Estrutura ('data/visitor_state/', ou CHURN_VISITOR_INDEX):
+    <snapshot>/ids.npy, <coluna>.npy, recent_*.npy, state.json
+    CURRENT                                (snapshot em uso; trocado com `os.replace`)
+
+Uso:
+    python visitor_features.py                 # aplica só as partições novas
+    python visitor_features.py --rebuild       # recalcula todo o histórico
+    python visitor_features.py --lookup <fullVisitorId>
+
+Impacto:
+- O churn passa a poder ser analisado por cliente, e não por sessão isolada, e a chegada
+  de um novo dia custa a agregação desse dia, e não o reprocessamento de todo o histórico.
+
+Escopo:
+- Os agregados são servidos para consulta (`GET /visitors/{fullVisitorId}`) e não entram
+  em FEATURES, no treino nem em /predict/: o modelo continua por sessão, com as 12
+  features do esquema da API.
+- Para virarem features, precisariam ser calculados "até o dia anterior" a cada sessão
+  de treino: o estado guarda transações e receita acumuladas até `as_of`, que incluem a
+  própria sessão, e o alvo é `transactions == 0` (vazamento).
+"""
+
+
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from fileio import file_signature, write_text
+
+# pandas e storage (pyarrow) só são importados na construção do estado e na linha de
+# comando: a API importa este módulo apenas pelo VisitorIndex, que usa somente NumPy
+
+STATE_DIR = 'data/visitor_state'
+CURRENT_NAME = 'CURRENT'
+STATE_NAME = 'state.json'
+KEEP_SNAPSHOTS = 2
+
+# Janelas (em dias, contando o dia de referência) das contagens de sessões
+WINDOWS = (7, 30)
+
+SESSION_COLUMNS = ['fullVisitorId', 'date', 'pageviews', 'transactions', 'transactionRevenue']
+
+# Colunas acumuladas por visitante (nome -> dtype em disco)
+TOTALS = {
+    'first_day': np.int32,
+    'last_day': np.int32,
+    'sessions': np.int32,
+    'pageviews': np.int64,
+    'transactions': np.int64,
+    'revenue': np.float64,
+}
+RECENT = ('recent_ids', 'recent_days', 'recent_sessions')
+
+
+def visitor_ids(values):
+    """`fullVisitorId` (texto numérico) -> uint64, 8 bytes por visitante no índice."""
+    try:
+        return np.asarray(values, dtype=str).astype(np.uint64)
+    except (OverflowError, ValueError) as exc:
+        raise ValueError(f"fullVisitorId deve ser numérico e caber em uint64: {exc}") from exc
+
+
+def day_numbers(dates):
+    """Datas YYYYMMDD -> dias desde 1970-01-01 (int32), só com aritmética de datetime64."""
+    try:
+        ymd = np.asarray(dates, dtype=str).astype(np.int64)
+    except ValueError as exc:
+        raise ValueError(f"Datas devem estar no formato YYYYMMDD: {exc}") from exc
+    year, month, day = ymd // 10000, ymd // 100 % 100, ymd % 100
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    # Mês ou dia fora do calendário (ex.: 20160231) cairia no mês seguinte
+    invalid = (month < 1) | (month > 12) | (day < 1) | (days.astype('datetime64[M]') != months)
+    if invalid.any():
+        raise ValueError(f"Data inválida no formato YYYYMMDD: {ymd[invalid][0]}")
+    return days.astype(np.int32)
+
+
+def day_string(day):
+    return str(np.datetime64(int(day), 'D')).replace('-', '')
+
+
+def load_sessions(paths):
+    """Colunas de sessão necessárias das partições (ou do arquivo bruto completo)."""
+    import pandas as pd
+
+    from storage import read_table
+    return pd.concat([read_table(path, columns=SESSION_COLUMNS) for path in paths], ignore_index=True)
+
+
+def _group_starts(*keys):
+    """Início de cada grupo em chaves já ordenadas (muda qualquer uma das chaves)."""
+    change = np.zeros(len(keys[0]), dtype=bool)
+    if len(change):
+        change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+def _reduce(values, starts):
+    return np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+
+class VisitorState:
+    """Agregados por visitante (ordenados por id) e a tabela de sessões recentes."""
+
+    def __init__(self, ids, totals, recent, as_of, applied=None):
+        self.ids = ids
+        self.totals = totals
+        self.recent = recent
+        self.as_of = as_of
+        self.applied = dict(applied or {})
+
+    @classmethod
+    def from_sessions(cls, sessions, applied=None):
+        """Agrega sessões brutas com uma única ordenação por (visitante, dia)."""
+        ids = visitor_ids(sessions['fullVisitorId'])
+        days = day_numbers(sessions['date'])
+        order = np.lexsort((days, ids))
+        ids, days = ids[order], days[order]
+
+        def column(name):
+            return np.nan_to_num(sessions[name].to_numpy(dtype=np.float64)[order])
+
+        starts = _group_starts(ids)
+        ends = np.r_[starts[1:], len(ids)]
+        totals = {
+            'first_day': days[starts],
+            'last_day': days[ends - 1],
+            'sessions': ends - starts,
+            'pageviews': _reduce(column('pageviews'), starts),
+            'transactions': _reduce(column('transactions'), starts),
+            'revenue': _reduce(column('transactionRevenue'), starts),
+        }
+        totals = {name: values.astype(TOTALS[name]) for name, values in totals.items()}
+
+        day_starts = _group_starts(ids, days)
+        recent = {
+            'recent_ids': ids[day_starts],
+            'recent_days': days[day_starts],
+            'recent_sessions': np.diff(np.r_[day_starts, len(ids)]).astype(np.int32),
+        }
+        as_of = int(days.max()) if len(days) else 0
+        state = cls(ids[starts], totals, recent, as_of, applied)
+        state._trim_recent()
+        return state
+
+    def update(self, sessions, applied=None):
+        """Mescla novas sessões apenas nos visitantes afetados; retorna quantos foram tocados."""
+        new = VisitorState.from_sessions(sessions)
+        pos = np.searchsorted(self.ids, new.ids)
+        found = np.zeros(len(new.ids), dtype=bool)
+        inside = pos < len(self.ids)
+        found[inside] = self.ids[pos[inside]] == new.ids[inside]
+
+        # Visitantes existentes: soma das contagens e extremos das datas, no lugar
+        rows = pos[found]
+        for name in ('sessions', 'pageviews', 'transactions', 'revenue'):
+            self.totals[name][rows] += new.totals[name][found]
+        self.totals['first_day'][rows] = np.minimum(self.totals['first_day'][rows], new.totals['first_day'][found])
+        self.totals['last_day'][rows] = np.maximum(self.totals['last_day'][rows], new.totals['last_day'][found])
+
+        # Visitantes novos: inseridos nas posições que mantêm os ids ordenados
+        missing = ~found
+        self.ids = np.insert(self.ids, pos[missing], new.ids[missing])
+        for name in TOTALS:
+            self.totals[name] = np.insert(self.totals[name], pos[missing], new.totals[name][missing])
+
+        # Sessões recentes: tabela pequena, reordenada e reagrupada por (visitante, dia)
+        ids = np.concatenate([self.recent['recent_ids'], new.recent['recent_ids']])
+        days = np.concatenate([self.recent['recent_days'], new.recent['recent_days']])
+        counts = np.concatenate([self.recent['recent_sessions'], new.recent['recent_sessions']])
+        order = np.lexsort((days, ids))
+        ids, days, counts = ids[order], days[order], counts[order]
+        starts = _group_starts(ids, days)
+        self.recent = {
+            'recent_ids': ids[starts],
+            'recent_days': days[starts],
+            'recent_sessions': _reduce(counts, starts).astype(np.int32),
+        }
+        self.as_of = max(self.as_of, new.as_of)
+        self.applied.update(applied or {})
+        self._trim_recent()
+        return int(len(new.ids))
+
+    def _trim_recent(self):
+        keep = self.recent['recent_days'] > self.as_of - max(WINDOWS)
+        self.recent = {name: values[keep] for name, values in self.recent.items()}
+
+    def window_counts(self):
+        """Sessões de cada visitante nos últimos `w` dias (inclusive `as_of`), por janela."""
+        rows = np.searchsorted(self.ids, self.recent['recent_ids'])
+        counts = {}
+        for window in WINDOWS:
+            inside = self.recent['recent_days'] > self.as_of - window
+            counts[f'sessions_{window}d'] = np.bincount(
+                rows[inside], weights=self.recent['recent_sessions'][inside], minlength=len(self.ids)
+            ).astype(np.int32)
+        return counts
+
+    def save(self, state_dir=STATE_DIR):
+        """Grava um novo snapshot e aponta CURRENT para ele (leitores nunca veem um pela metade)."""
+        os.makedirs(state_dir, exist_ok=True)
+        name = f"{day_string(self.as_of)}-{time.strftime('%Y%m%dT%H%M%S')}"
+        suffix = 1
+        while os.path.exists(os.path.join(state_dir, name)):
+            name = f"{day_string(self.as_of)}-{time.strftime('%Y%m%dT%H%M%S')}-{suffix}"
+            suffix += 1
+        tmp = os.path.join(state_dir, f'.tmp-{name}')
+        os.makedirs(tmp)
+
+        arrays = {'ids': self.ids, **self.totals, **self.window_counts(), **self.recent}
+        for array_name, values in arrays.items():
+            np.save(os.path.join(tmp, f'{array_name}.npy'), values)
+        with open(os.path.join(tmp, STATE_NAME), 'w') as f:
+            json.dump({'as_of': day_string(self.as_of), 'visitors': int(len(self.ids)),
+                       'windows': list(WINDOWS), 'applied': self.applied}, f, indent=2, sort_keys=True)
+        os.rename(tmp, os.path.join(state_dir, name))
+
+        write_text(os.path.join(state_dir, CURRENT_NAME), name + '\n')
+
+        # Snapshots antigos: mantém os mais recentes (leitores com mmap aberto não são afetados)
+        snapshots = sorted(d for d in os.listdir(state_dir) if os.path.exists(os.path.join(state_dir, d, STATE_NAME)))
+        for old in snapshots[:-KEEP_SNAPSHOTS]:
+            if old != name:
+                shutil.rmtree(os.path.join(state_dir, old), ignore_errors=True)
+        return name
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR):
+        """Estado do snapshot atual (em memória, pronto para `update`), ou None."""
+        snapshot = current_snapshot(state_dir)
+        if snapshot is None:
+            return None
+        with open(os.path.join(snapshot, STATE_NAME)) as f:
+            meta = json.load(f)
+        if meta['windows'] != list(WINDOWS):
+            return None
+
+        def load_array(name):
+            return np.load(os.path.join(snapshot, f'{name}.npy'))
+
+        return cls(load_array('ids'), {name: load_array(name) for name in TOTALS},
+                   {name: load_array(name) for name in RECENT},
+                   int(day_numbers([meta['as_of']])[0]), meta['applied'])
+
+
+def current_snapshot(state_dir=STATE_DIR):
+    """Diretório do snapshot apontado por CURRENT, ou None."""
+    try:
+        with open(os.path.join(state_dir, CURRENT_NAME)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(state_dir, name) if name else None
+
+
+def build_visitor_state(raw_dir, state_dir=STATE_DIR, rebuild=False, raw_path=None):
+    """Atualiza o estado com as partições novas de `raw_dir`; recalcula tudo se preciso.
+
+    O recálculo completo acontece sem estado salvo, com `rebuild=True` ou quando uma
+    partição já aplicada mudou ou sumiu da origem. Sem partições (ou `raw_dir=None`),
+    usa o arquivo bruto completo `raw_path` (padrão: `storage.RAW_PATH`).
+    """
+    if raw_path is None:
+        from storage import RAW_PATH
+        raw_path = RAW_PATH
+    paths = sorted(glob.glob(os.path.join(raw_dir, 'ga_sessions_*.parquet'))) if raw_dir else []
+    if not paths:
+        paths = [raw_path]
+    signatures = {os.path.basename(p): file_signature(p) for p in paths}
+
+    state = None if rebuild else VisitorState.load(state_dir)
+    if state is not None and any(signatures.get(name) != sig for name, sig in state.applied.items()):
+        print("Partições já aplicadas mudaram na origem; recalculando o histórico.")
+        state = None
+
+    start = time.perf_counter()
+    if state is None:
+        state = VisitorState.from_sessions(load_sessions(paths), applied=signatures)
+        print(f"Histórico completo: {len(paths)} partições | visitantes: {len(state.ids)}")
+    else:
+        new = [p for p in paths if os.path.basename(p) not in state.applied]
+        if not new:
+            print("Nenhuma partição nova para os atributos por visitante.")
+            return state
+        touched = state.update(load_sessions(new), applied={os.path.basename(p): signatures[os.path.basename(p)] for p in new})
+        print(f"Partições novas: {len(new)} | visitantes afetados: {touched} de {len(state.ids)}")
+
+    name = state.save(state_dir)
+    print(f"Atributos por visitante (até {day_string(state.as_of)}) salvos em: "
+          f"{os.path.join(state_dir, name)} ({time.perf_counter() - start:.2f} s)")
+    return state
+
+
+class VisitorIndex:
+    """Consulta somente leitura do snapshot atual, por `searchsorted` nos ids mapeados em memória."""
+
+    COLUMNS = tuple(TOTALS) + tuple(f'sessions_{w}d' for w in WINDOWS)
+
+    def __init__(self, state_dir=STATE_DIR, mmap_mode='r'):
+        self.state_dir = state_dir
+        self.mmap_mode = mmap_mode
+        self.snapshot = None
+        self._current = None
+        self.refresh()
+
+    def refresh(self):
+        """Reabre o índice se CURRENT apontar para outro snapshot; retorna True se trocou."""
+        snapshot = current_snapshot(self.state_dir)
+        if snapshot is None or snapshot == self.snapshot:
+            return False
+        with open(os.path.join(snapshot, STATE_NAME)) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(snapshot, f'{name}.npy'), mmap_mode=self.mmap_mode)
+                  for name in ('ids',) + self.COLUMNS}
+        # Troca de uma vez: consultas em andamento continuam com os arrays anteriores
+        self._current = (arrays, int(day_numbers([meta['as_of']])[0]))
+        self.snapshot = snapshot
+        return True
+
+    @property
+    def ready(self):
+        return self._current is not None
+
+    @property
+    def as_of(self):
+        return day_string(self._current[1]) if self.ready else None
+
+    def __len__(self):
+        return len(self._current[0]['ids']) if self.ready else 0
+
+    def lookup(self, visitor_id):
+        """Atributos de um visitante, ou None se ele não estiver no índice."""
+        try:
+            key = visitor_ids([visitor_id])
+        except ValueError:
+            return None
+        arrays, as_of = self._current
+        ids = arrays['ids']
+        row = int(np.searchsorted(ids, key[0]))
+        if row >= len(ids) or ids[row] != key[0]:
+            return None
+
+        values = {name: arrays[name][row].item() for name in self.COLUMNS}
+        first_day, last_day = values.pop('first_day'), values.pop('last_day')
+        tenure_days = as_of - first_day
+        return {
+            'fullVisitorId': str(visitor_id),
+            'as_of': day_string(as_of),
+            'first_visit': day_string(first_day),
+            'last_visit': day_string(last_day),
+            'recency_days': as_of - last_day,
+            'tenure_days': tenure_days,
+            # Frequência: sessões por semana desde a primeira visita
+            'sessions_per_week': values['sessions'] * 7.0 / (tenure_days + 1),
+            **values,
+        }
+
+
+if __name__ == "__main__":
+    from storage import RAW_DIR
+
+    parser = argparse.ArgumentParser(description="Atributos agregados por visitante.")
+    parser.add_argument('--raw-dir', default=RAW_DIR, help="Partições brutas (fetch_data.py --partitioned).")
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--rebuild', action='store_true', help="Recalcula todo o histórico.")
+    parser.add_argument('--lookup', metavar='FULLVISITORID', help="Consulta um visitante no índice atual.")
+    args = parser.parse_args()
+    if args.lookup:
+        print(json.dumps(VisitorIndex(args.state_dir).lookup(args.lookup), indent=2))
+    else:
+        build_visitor_state(args.raw_dir, args.state_dir, rebuild=args.rebuild)